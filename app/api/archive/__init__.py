@@ -0,0 +1 @@
+# This file makes the archive directory a Python package
@@ -0,0 +1,140 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import aliased, selectinload
+from app.core.db import get_db, get_read_db
+from app.core.cache import invalidate
+from app.core.errors import constraint_errors
+from app.core.push import balance_deltas, entry_event, stage
+from app.models.archive import JournalEntryArchive, LedgerAccountArchive
+from app.models.journal_entry import JournalEntry
+from app.models.ledger_account import LedgerAccount
+from app.schemas.archive import JournalEntryArchiveRead, LedgerAccountArchiveRead
+from app.schemas.journal_entry import JournalEntryWithLinesRead
+from app.schemas.ledger_account import LedgerAccountRead
+from app.schemas.response import Response
+from app.services.account_tree import move_account
+from app.services.archive import archive_deleted, restore_entry, restore_account
+from app.services.account_usage import apply_entry_usage
+from app.services.category_spend import apply_entry_spend
+from app.services.entry_fingerprint import refresh_entry_fingerprints
+from app.services.ledger_events import lines_payload, record_event
+from uuid import UUID
+
+router = APIRouter(prefix="/archive", tags=["archive"])
+
+# OBTENER LOS ASIENTOS ARCHIVADOS DE UN USUARIO
+@router.get("/user/{user_id}/entries", response_model=Response[list[JournalEntryArchiveRead]])
+async def get_archived_entries(user_id: UUID, db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(
+        select(JournalEntryArchive)
+        .where(JournalEntryArchive.user_id == user_id)
+        .order_by(JournalEntryArchive.occurred_at.desc())
+    )
+    entries = result.scalars().all()
+
+    return Response(
+        status="200", 
+        data=entries, 
+        message="Archived journal entries fetched successfully"
+    )
+
+# OBTENER LAS CUENTAS ARCHIVADAS DE UN USUARIO
+@router.get("/user/{user_id}/accounts", response_model=Response[list[LedgerAccountArchiveRead]])
+async def get_archived_accounts(user_id: UUID, db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(
+        select(LedgerAccountArchive)
+        .where(LedgerAccountArchive.user_id == user_id)
+        .order_by(LedgerAccountArchive.name)
+    )
+    accounts = result.scalars().all()
+
+    return Response(
+        status="200", 
+        data=accounts, 
+        message="Archived accounts fetched successfully"
+    )
+
+# RESTAURAR UN ASIENTO (archivado o solo eliminado) CON SUS LÍNEAS
+@router.post("/entry/{entry_id}/restore", response_model=Response[JournalEntryWithLinesRead])
+async def restore_archived_entry(entry_id: UUID, db: AsyncSession = Depends(get_db)):
+    if not await restore_entry(db, entry_id):
+        # Todavía no archivado: basta con quitar la marca de eliminado
+        result = await db.execute(
+            update(JournalEntry)
+            .where(
+                JournalEntry.id == entry_id,
+                JournalEntry.deleted_at.is_not(None)
+            )
+            .values(deleted_at=None)
+            .returning(JournalEntry.id)
+        )
+
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deleted journal entry not found")
+
+    # Vigente otra vez: sus líneas vuelven al agregado por categoría y a los saldos.
+    # El archivo no guarda la huella: se recalcula
+    await apply_entry_spend(db, [entry_id], 1)
+    await apply_entry_usage(db, [entry_id], 1)
+    await refresh_entry_fingerprints(db, [entry_id])
+
+    result = await db.execute(
+        select(JournalEntry)
+        .options(selectinload(JournalEntry.lines))
+        .where(JournalEntry.id == entry_id)
+    )
+    entry = result.scalar_one()
+    stage(db, entry.user_id, entry_event("restored", [entry_id], balance_deltas(entry.lines)))
+    invalidate(db, entry.user_id, "entry", entry_id)
+    record_event(db, entry.user_id, "entry", entry_id, "restored", {"lines": lines_payload(entry.lines)})
+
+    await db.commit()
+
+    return Response(status="200", data=entry, message="Journal entry restored successfully")
+
+# RESTAURAR UNA CUENTA (archivada o solo eliminada)
+@router.post("/account/{account_id}/restore", response_model=Response[LedgerAccountRead])
+async def restore_archived_account(account_id: UUID, db: AsyncSession = Depends(get_db)):
+    # Si ya existe otra cuenta vigente con el mismo nombre lo rechaza el índice único
+    with constraint_errors():
+        if not await restore_account(db, account_id):
+            # Solo conserva el padre si este sigue vigente; si no, la cuenta vuelve como raíz
+            parent = aliased(LedgerAccount)
+            result = await db.execute(
+                update(LedgerAccount)
+                .where(
+                    LedgerAccount.id == account_id,
+                    LedgerAccount.deleted_at.is_not(None)
+                )
+                .values(
+                    deleted_at=None,
+                    updated_at=func.now(),
+                    parent_id=select(parent.id)
+                    .where(parent.id == LedgerAccount.parent_id, parent.deleted_at.is_(None))
+                    .scalar_subquery()
+                )
+                .returning(LedgerAccount.id, LedgerAccount.parent_id)
+            )
+            restored = result.one_or_none()
+
+            if restored is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deleted account not found")
+            if restored.parent_id is None:
+                await move_account(db, account_id, None)
+
+        result = await db.execute(select(LedgerAccount).where(LedgerAccount.id == account_id))
+        account = result.scalar_one()
+        invalidate(db, account.user_id, "account", account_id)
+        record_event(db, account.user_id, "account", account_id, "restored", {"parent_id": account.parent_id})
+
+        await db.commit()
+
+    return Response(status="200", data=account, message="Account restored successfully")
+
+# EJECUTAR EL ARCHIVADO DE FILAS ELIMINADAS (todas las que superan la retención)
+@router.post("/run", response_model=Response[dict])
+async def run_archive():
+    totals = await archive_deleted()
+
+    return Response(status="200", data=totals, message="Soft-deleted rows archived successfully")
@@ -0,0 +1 @@
+# This file makes the category directory a Python package
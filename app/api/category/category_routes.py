@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete
+from app.core.db import get_db, get_read_db
+from app.core.errors import constraint_errors
+from app.models.category import Category
+from app.schemas.category import CategoryCreate, CategoryRead, CategoryUpdate
+from app.schemas.response import Response
+from uuid import UUID
+
+router = APIRouter(prefix="/category", tags=["category"])
+
+# OBTENER LAS CATEGORÍAS DE UN USUARIO
+@router.get("/user/{user_id}", response_model=Response[list[CategoryRead]])
+async def get_user_categories(user_id: UUID, db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(
+        select(Category)
+        .where(Category.user_id == user_id)
+        .order_by(Category.name)
+    )
+    categories = result.scalars().all()
+
+    return Response(
+        status="200",
+        data=categories,
+        message="User categories fetched successfully"
+    )
+
+# CREAR UNA CATEGORÍA
+@router.post("/create", response_model=Response[CategoryRead])
+async def create_category(payload: CategoryCreate, db: AsyncSession = Depends(get_db)):
+    # Usuario inexistente (FK) y nombre repetido (restricción única) los detecta la base de datos
+    with constraint_errors():
+        result = await db.execute(
+            insert(Category)
+            .values(user_id=payload.user_id, name=payload.name)
+            .returning(Category)
+        )
+        new_category = result.scalar_one()
+        await db.commit()
+
+    return Response(
+        status="201",
+        data=new_category,
+        message="Category created successfully"
+    )
+
+# RENOMBRAR UNA CATEGORÍA
+@router.put("/{category_id}", response_model=Response[CategoryRead])
+async def update_category(category_id: UUID, payload: CategoryUpdate, db: AsyncSession = Depends(get_db)):
+    if payload.name is not None:
+        stmt = update(Category).values(name=payload.name).returning(Category)
+    else:
+        stmt = select(Category)
+
+    with constraint_errors():
+        result = await db.execute(stmt.where(Category.id == category_id))
+    category = result.scalar_one_or_none()
+
+    if not category:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+
+    await db.commit()
+
+    return Response(status="200", data=category, message="Category updated successfully")
+
+# ELIMINAR UNA CATEGORÍA
+# Sus líneas quedan sin categoría (ON DELETE SET NULL) y sus filas del agregado se borran en cascada
+@router.delete("/{category_id}", response_model=Response[dict])
+async def delete_category(category_id: UUID, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        delete(Category)
+        .where(Category.id == category_id)
+        .returning(Category.id)
+    )
+
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+
+    await db.commit()
+
+    return Response(status="200", data={"id": str(category_id)}, message="Category deleted successfully")
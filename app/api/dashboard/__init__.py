@@ -0,0 +1 @@
+# This file makes the dashboard directory a Python package
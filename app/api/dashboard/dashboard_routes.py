@@ -0,0 +1,102 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.orm import noload
+from app.api.journal_entry.journal_entry_routes import user_entries_query
+from app.api.reports.reports_routes import balance_sheet_query, income_statement_query
+from app.core.db import get_read_sessions
+from app.models.journal_entry import JournalEntry
+from app.models.ledger_account import AccountKind
+from app.models.user import User
+from app.schemas.journal_entry import JournalEntryRead
+from app.schemas.response import Response
+from uuid import UUID
+from decimal import Decimal
+from datetime import datetime, timezone
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+# Consultas del tablero: cada una corre en su propia conexión
+DASHBOARD_QUERIES = 4
+RECENT_ENTRIES = 10
+TOP_EXPENSES = 5
+
+async def fetch_all(session: AsyncSession, stmt):
+    return (await session.execute(stmt)).all()
+
+async def fetch_scalars(session: AsyncSession, stmt):
+    return (await session.execute(stmt)).scalars().all()
+
+# TABLERO DE INICIO: saldos, asientos recientes, ingresos/gastos del mes y principales gastos
+@router.get("/{user_id}", response_model=Response[dict])
+async def get_dashboard(user_id: UUID, sessions: list[AsyncSession] = Depends(get_read_sessions(DASHBOARD_QUERIES))):
+    now = datetime.now(timezone.utc)
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    # En paralelo: el tiempo total es el de la consulta más lenta, no la suma
+    user_session, balances_session, month_session, entries_session = sessions
+    users, balances, month, entries = await asyncio.gather(
+        fetch_all(user_session, select(User.id, User.display_name).where(User.id == user_id)),
+        fetch_all(balances_session, balance_sheet_query(user_id)),
+        fetch_all(month_session, income_statement_query(user_id, month_start, now)),
+        fetch_scalars(entries_session, user_entries_query(user_id).limit(RECENT_ENTRIES).options(noload(JournalEntry.lines))),
+    )
+
+    if not users:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    user = users[0]
+
+    # Saldos propios de cada cuenta de balance y patrimonio neto (activos menos pasivos)
+    accounts = []
+    net_worth = Decimal('0')
+    for account in balances:
+        if account.kind not in (AccountKind.asset, AccountKind.liability, AccountKind.equity):
+            continue
+        balance = account.debits - account.credits
+        accounts.append({
+            "id": str(account.id),
+            "parent_id": str(account.parent_id) if account.parent_id else None,
+            "name": account.name,
+            "kind": account.kind.value,
+            "balance": float(balance)
+        })
+        # Los saldos son débitos - créditos: los pasivos ya vienen en negativo
+        if account.kind in (AccountKind.asset, AccountKind.liability):
+            net_worth += balance
+
+    # Ingresos y gastos del mes; los principales gastos salen de la misma consulta
+    total_income = Decimal('0')
+    total_expenses = Decimal('0')
+    expenses = []
+    for account in month:
+        if account.kind == AccountKind.income:
+            total_income += account.credits - account.debits
+        elif account.kind == AccountKind.expense:
+            amount = account.debits - account.credits
+            total_expenses += amount
+            expenses.append({"id": str(account.id), "name": account.name, "amount": amount})
+
+    top_expenses = sorted(expenses, key=lambda expense: expense["amount"], reverse=True)[:TOP_EXPENSES]
+    for expense in top_expenses:
+        expense["amount"] = float(expense["amount"])
+
+    return Response(
+        status="200",
+        data={
+            "user": {"id": str(user.id), "display_name": user.display_name},
+            "balances": {
+                "accounts": accounts,
+                "net_worth": float(net_worth)
+            },
+            "month": {
+                "start_date": month_start.isoformat(),
+                "total_income": float(total_income),
+                "total_expenses": float(total_expenses),
+                "net_income": float(total_income - total_expenses)
+            },
+            "top_expenses": top_expenses,
+            "recent_entries": [JournalEntryRead.model_validate(entry).model_dump(mode="json") for entry in entries]
+        },
+        message="Dashboard generated successfully"
+    )
@@ -1,24 +1,44 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload
-from app.core.db import get_db
+from sqlalchemy import select, insert, update, func, values, column, literal, cast, and_, or_, CHAR, NUMERIC
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import selectinload, noload
+from sqlalchemy.orm.attributes import set_committed_value
+from app.core.db import get_db, get_read_db, register_warmup, WARMUP_ID
+from app.core.cache import invalidate
+from app.core.errors import constraint_errors
+from app.core.push import balance_deltas, entry_event, stage
+from app.models.category import Category
 from app.models.journal_entry import JournalEntry
 from app.models.journal_line import JournalLine
 from app.models.ledger_account import LedgerAccount
 from app.models.user import User
-from app.schemas.journal_entry import JournalEntryBase, JournalEntryCreate, JournalEntryRead, JournalEntryUpdate, JournalEntryWithLinesCreate, JournalEntryWithLinesRead
+from app.schemas.journal_entry import JournalEntryBase, JournalEntryCreate, JournalEntryCreatedRead, JournalEntryDuplicateGroup, JournalEntryRead, JournalEntryUpdate, JournalEntryWithLinesCreate, JournalEntryWithLinesRead
 from app.schemas.journal_line import JournalLineRead
 from app.schemas.response import Response
-from uuid import UUID
+from app.services.account_usage import apply_entry_usage
+from app.services.category_spend import apply_entry_spend, lock_entries
+from app.services.entry_fingerprint import ON_DUPLICATE, duplicate_groups, payload_fingerprint, refresh_entry_fingerprints
+from app.services.ledger_events import lines_payload, record_event
+from uuid import UUID, uuid4
 from decimal import Decimal
 from typing import List
 
 router = APIRouter(prefix="/journal-entry", tags=["journal-entry"])
 
+# CONSULTA DE ASIENTOS DE UN USUARIO
+def user_entries_query(user_id: UUID):
+    return select(JournalEntry).where(
+        JournalEntry.user_id == user_id,
+        JournalEntry.deleted_at.is_(None)
+    ).order_by(JournalEntry.occurred_at.desc())
+
+# Sentencias que se precompilan al arrancar (ver app/core/db.py)
+register_warmup(lambda: user_entries_query(WARMUP_ID))
+
 # OBTENER TODOS LOS ASIENTOS DE UN USUARIO
 @router.get("/user/{user_id}", response_model=Response[list[JournalEntryRead]])
-async def get_user_entries(user_id: UUID, db: AsyncSession = Depends(get_db)):
+async def get_user_entries(user_id: UUID, db: AsyncSession = Depends(get_read_db)):
     # Verificar que el usuario existe
     user_result = await db.execute(select(User).where(User.id == user_id))
     user = user_result.scalar_one_or_none()
@@ -27,12 +47,7 @@ async def get_user_entries(user_id: UUID, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
     # Obtener asientos del usuario (solo los no eliminados)
-    result = await db.execute(
-        select(JournalEntry).where(
-            JournalEntry.user_id == user_id,
-            JournalEntry.deleted_at.is_(None)
-        ).order_by(JournalEntry.occurred_at.desc())
-    )
+    result = await db.execute(user_entries_query(user_id))
     entries = result.scalars().all()
 
     return Response(
@@ -41,6 +56,34 @@ async def get_user_entries(user_id: UUID, db: AsyncSession = Depends(get_db)):
         message="User journal entries fetched successfully"
     )
 
+# OBTENER GRUPOS DE ASIENTOS SOSPECHOSOS DE ESTAR DUPLICADOS
+@router.get("/user/{user_id}/duplicates", response_model=Response[list[JournalEntryDuplicateGroup]])
+async def get_duplicate_entries(user_id: UUID, limit: int = 100, db: AsyncSession = Depends(get_read_db)):
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="limit must be between 1 and 1000")
+
+    # Verificar que el usuario existe
+    user_result = await db.execute(select(User).where(User.id == user_id))
+    user = user_result.scalar_one_or_none()
+
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    # Huellas repetidas (sobre el índice de huellas) y después sus asientos
+    groups = await duplicate_groups(db, user_id, limit)
+    entry_ids = [entry_id for group in groups for entry_id in group.entry_ids]
+    result = await db.execute(select(JournalEntry).where(JournalEntry.id.in_(entry_ids)).options(noload("*")))
+    entries = {entry.id: entry for entry in result.scalars()}
+
+    data = [
+        JournalEntryDuplicateGroup(
+            fingerprint=group.fingerprint.hex(),
+            entries=[entries[entry_id] for entry_id in group.entry_ids if entry_id in entries]
+        )
+        for group in groups
+    ]
+    return Response(status="200", data=data, message="Duplicate journal entries fetched successfully")
+
 # OBTENER UN ASIENTO POR ID CON SUS LÍNEAS
 @router.get("/{entry_id}", response_model=Response[JournalEntryWithLinesRead])
 async def get_entry_by_id(entry_id: UUID, db: AsyncSession = Depends(get_db)):
@@ -62,33 +105,19 @@ async def get_entry_by_id(entry_id: UUID, db: AsyncSession = Depends(get_db)):
     return Response(status="200", data=entry, message="Journal entry fetched successfully")
 
 # CREAR UN ASIENTO COMPLETO CON LÍNEAS
-@router.post("/create-with-lines", response_model=Response[JournalEntryWithLinesRead])
-async def create_entry_with_lines(payload: JournalEntryWithLinesCreate, db: AsyncSession = Depends(get_db)):
-    # Verificar que el usuario existe
-    user_result = await db.execute(select(User).where(User.id == payload.user_id))
-    user = user_result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
+@router.post("/create-with-lines", response_model=Response[JournalEntryCreatedRead])
+async def create_entry_with_lines(
+    payload: JournalEntryWithLinesCreate,
+    on_duplicate: str = "warn",
+    db: AsyncSession = Depends(get_db)
+):
+    if on_duplicate not in ON_DUPLICATE:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"on_duplicate must be one of: {', '.join(ON_DUPLICATE)}")
+
     # Validar que hay al menos 2 líneas
     if len(payload.lines) < 2:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Journal entry must have at least 2 lines")
     
-    # Validar que las cuentas existen y pertenecen al usuario
-    account_ids = [line.account_id for line in payload.lines]
-    accounts_result = await db.execute(
-        select(LedgerAccount).where(
-            LedgerAccount.id.in_(account_ids),
-            LedgerAccount.user_id == payload.user_id,
-            LedgerAccount.deleted_at.is_(None)
-        )
-    )
-    accounts = accounts_result.scalars().all()
-    
-    if len(accounts) != len(account_ids):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="One or more accounts not found or do not belong to user")
-    
     # Validar balance (débitos = créditos)
     total_debits = Decimal('0')
     total_credits = Decimal('0')
@@ -104,64 +133,122 @@ async def create_entry_with_lines(payload: JournalEntryWithLinesCreate, db: Asyn
             status_code=status.HTTP_400_BAD_REQUEST, 
             detail=f"Journal entry is not balanced. Debits: {total_debits}, Credits: {total_credits}"
         )
-    
-    # Crear el asiento
-    new_entry = JournalEntry(
-        user_id=payload.user_id,
-        occurred_at=payload.occurred_at,
-        description=payload.description
-    )
-    
-    db.add(new_entry)
-    await db.flush()  # Para obtener el ID del asiento
-    
-    # Crear las líneas
-    for line_data in payload.lines:
-        new_line = JournalLine(
-            entry_id=new_entry.id,
-            account_id=line_data.account_id,
-            amount=line_data.amount,
-            side=line_data.side
+
+    # Mismo usuario, día y líneas que un asiento vigente: se avisa en la respuesta o se rechaza
+    fingerprint, duplicate_of = await payload_fingerprint(db, payload.user_id, payload.occurred_at, payload.lines)
+    if duplicate_of and on_duplicate == "reject":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Journal entry looks like a duplicate", "duplicate_of": str(duplicate_of)}
         )
-        db.add(new_line)
     
-    await db.commit()
-    await db.refresh(new_entry)
+    # Crear el asiento con INSERT ... RETURNING (el id se genera aquí para no esperar al servidor).
+    # Si el usuario no existe lo rechaza la FK
+    entry_id = uuid4()
+    with constraint_errors():
+        entry_result = await db.execute(
+            insert(JournalEntry)
+            .values(
+                id=entry_id,
+                user_id=payload.user_id,
+                occurred_at=payload.occurred_at,
+                description=payload.description,
+                fingerprint=fingerprint
+            )
+            .returning(JournalEntry)
+            .options(noload("*"))
+        )
+    new_entry = entry_result.scalar_one()
     
-    # Obtener las líneas creadas
-    lines_result = await db.execute(
-        select(JournalLine).where(JournalLine.entry_id == new_entry.id)
+    # Crear las líneas con un solo INSERT ... SELECT que solo toma las cuentas vigentes del usuario
+    # (y sus categorías); las filas creadas vuelven del propio insert
+    payload_lines = values(
+        column("account_id", PG_UUID),
+        column("amount", NUMERIC(18, 2)),
+        column("side", CHAR(1)),
+        column("category_id", PG_UUID),
+        name="payload_lines"
+    ).data([(line_data.account_id, line_data.amount, line_data.side, line_data.category_id) for line_data in payload.lines])
+    # Si todas las líneas vienen sin categoría, PostgreSQL tipa la columna del VALUES como texto
+    category_id = cast(payload_lines.c.category_id, PG_UUID)
+
+    lines_result = await db.scalars(
+        insert(JournalLine)
+        .from_select(
+            ["entry_id", "account_id", "amount", "side", "category_id"],
+            select(
+                literal(entry_id, PG_UUID),
+                payload_lines.c.account_id,
+                payload_lines.c.amount,
+                payload_lines.c.side,
+                category_id
+            )
+            .join(LedgerAccount, LedgerAccount.id == payload_lines.c.account_id)
+            .outerjoin(
+                Category,
+                and_(Category.id == category_id, Category.user_id == payload.user_id)
+            )
+            .where(
+                LedgerAccount.user_id == payload.user_id,
+                LedgerAccount.deleted_at.is_(None),
+                or_(category_id.is_(None), Category.id.is_not(None))
+            )
+        )
+        .returning(JournalLine)
+        .options(noload("*"))
     )
-    lines = lines_result.scalars().all()
-    
-    # Asignar las líneas al asiento
-    new_entry.lines = lines
+    lines = lines_result.all()
+
+    # Faltan líneas: alguna cuenta o categoría no existe o no es del usuario (el asiento se descarta con el rollback)
+    if len(lines) != len(payload.lines):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="One or more accounts or categories not found or do not belong to user")
+
+    await apply_entry_spend(db, [entry_id], 1)
+    await apply_entry_usage(db, [entry_id], 1)
+    stage(db, payload.user_id, entry_event("created", [entry_id], balance_deltas(lines)))
+    invalidate(db, payload.user_id, "entry", entry_id)
+    record_event(db, payload.user_id, "entry", entry_id, "created", {
+        "occurred_at": payload.occurred_at,
+        "description": payload.description,
+        "lines": lines_payload(lines),
+    })
 
+    set_committed_value(new_entry, "lines", lines)
+
+    await db.commit()
+
+    data = JournalEntryCreatedRead.model_validate(new_entry)
+    data.duplicate_of = duplicate_of
     return Response(
         status="201", 
-        data=new_entry, 
-        message="Journal entry created successfully"
+        data=data, 
+        message="Journal entry created successfully (possible duplicate)" if duplicate_of else "Journal entry created successfully"
     )
 
 # CREAR UN ASIENTO SIMPLE
 @router.post("/create", response_model=Response[JournalEntryRead])
 async def create_entry(payload: JournalEntryCreate, db: AsyncSession = Depends(get_db)):
-    # Verificar que el usuario existe
-    user_result = await db.execute(select(User).where(User.id == payload.user_id))
-    user = user_result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
-    new_entry = JournalEntry(
-        user_id=payload.user_id,
-        occurred_at=payload.occurred_at,
-        description=payload.description
-    )
-
-    db.add(new_entry)
-    await db.commit()
-    await db.refresh(new_entry)
+    # Si el usuario no existe lo rechaza la FK
+    with constraint_errors():
+        result = await db.execute(
+            insert(JournalEntry)
+            .values(
+                user_id=payload.user_id,
+                occurred_at=payload.occurred_at,
+                description=payload.description
+            )
+            .returning(JournalEntry)
+            .options(noload("*"))
+        )
+        new_entry = result.scalar_one()
+        stage(db, new_entry.user_id, entry_event("created", [new_entry.id]))
+        invalidate(db, new_entry.user_id, "entry", new_entry.id)
+        record_event(db, new_entry.user_id, "entry", new_entry.id, "created", {
+            "occurred_at": new_entry.occurred_at,
+            "description": new_entry.description,
+            "lines": [],
+        })
+        await db.commit()
 
     return Response(
         status="201", 
@@ -172,45 +259,75 @@ async def create_entry(payload: JournalEntryCreate, db: AsyncSession = Depends(g
 # ACTUALIZAR UN ASIENTO
 @router.put("/{entry_id}", response_model=Response[JournalEntryRead])
 async def update_entry(entry_id: UUID, payload: JournalEntryUpdate, db: AsyncSession = Depends(get_db)):
+    # Actualizar campos
+    changes = {}
+    if payload.occurred_at is not None:
+        changes["occurred_at"] = payload.occurred_at
+    if payload.description is not None:
+        changes["description"] = payload.description
+
+    # UPDATE ... RETURNING: si no devuelve fila, el asiento no existe o está eliminado
+    if changes:
+        stmt = update(JournalEntry).values(**changes).returning(JournalEntry)
+    else:
+        stmt = select(JournalEntry)
+    # Cambiar la fecha puede cambiar el mes de sus líneas en el agregado por categoría;
+    # la fecha y la descripción son parte de la clave del uso de cuentas
+    if changes:
+        await lock_entries(db, [entry_id])
+        await apply_entry_usage(db, [entry_id], -1)
+    if "occurred_at" in changes:
+        await apply_entry_spend(db, [entry_id], -1)
     result = await db.execute(
-        select(JournalEntry).where(
+        stmt.where(
             JournalEntry.id == entry_id,
             JournalEntry.deleted_at.is_(None)
-        )
+        ).options(noload("*"))
     )
     entry = result.scalar_one_or_none()
 
     if not entry:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal entry not found")
-    
-    # Actualizar campos
-    if payload.occurred_at is not None:
-        entry.occurred_at = payload.occurred_at
-    if payload.description is not None:
-        entry.description = payload.description
+
+    if "occurred_at" in changes:
+        await apply_entry_spend(db, [entry_id], 1)
+        await refresh_entry_fingerprints(db, [entry_id])
+    if changes:
+        await apply_entry_usage(db, [entry_id], 1)
+        stage(db, entry.user_id, entry_event("updated", [entry_id]))
+        invalidate(db, entry.user_id, "entry", entry_id)
+        record_event(db, entry.user_id, "entry", entry_id, "updated", {"changes": changes})
 
     await db.commit()
-    await db.refresh(entry)
 
     return Response(status="200", data=entry, message="Journal entry updated successfully")
 
 # ELIMINAR UN ASIENTO (soft delete)
 @router.delete("/{entry_id}", response_model=Response[dict])
 async def delete_entry(entry_id: UUID, db: AsyncSession = Depends(get_db)):
+    # Sus líneas salen del agregado por categoría; sin asiento vigente, la resta no toca nada
+    locked = await lock_entries(db, [entry_id])
+    await apply_entry_spend(db, [entry_id], -1)
+    await apply_entry_usage(db, [entry_id], -1)
+
+    # Soft delete en una sola sentencia
     result = await db.execute(
-        select(JournalEntry).where(
+        update(JournalEntry)
+        .where(
             JournalEntry.id == entry_id,
             JournalEntry.deleted_at.is_(None)
         )
+        .values(deleted_at=func.now())
+        .returning(JournalEntry.id)
     )
-    entry = result.scalar_one_or_none()
 
-    if not entry:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal entry not found")
-    
-    # Soft delete
-    from datetime import datetime
-    entry.deleted_at = datetime.utcnow()
+
+    # Sus líneas dejan de contar en los saldos
+    stage(db, locked[0].user_id, entry_event("deleted", [entry_id], balance_deltas(locked, -1)))
+    invalidate(db, locked[0].user_id, "entry", entry_id)
+    record_event(db, locked[0].user_id, "entry", entry_id, "deleted", {"lines": lines_payload(locked)})
 
     await db.commit()
 
@@ -222,7 +339,7 @@ async def get_entries_by_date_range(
     user_id: UUID, 
     start_date: str, 
     end_date: str, 
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     from datetime import datetime
     
@@ -1,20 +1,77 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from app.core.db import get_db
+from sqlalchemy import select, insert, update, delete, func, literal, CHAR, NUMERIC
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import noload
+from app.core.db import get_db, get_read_db
+from app.core.cache import invalidate
+from app.core.push import balance_deltas, entry_event, stage
+from app.models.category import Category
 from app.models.journal_line import JournalLine
 from app.models.journal_entry import JournalEntry
 from app.models.ledger_account import LedgerAccount
 from app.schemas.journal_line import JournalLineBase, JournalLineCreate, JournalLineRead, JournalLineUpdate
 from app.schemas.response import Response
+from app.services.account_usage import apply_entry_usage, apply_line_entries_usage
+from app.services.category_spend import apply_line_spend, lock_entries, lock_line_entries
+from app.services.entry_fingerprint import refresh_entry_fingerprints
+from app.services.ledger_events import line_payload, record_event
 from uuid import UUID
 from decimal import Decimal
 
 router = APIRouter(prefix="/journal-line", tags=["journal-line"])
 
+def live_entry(entry_id):
+    return select(JournalEntry.id).where(
+        JournalEntry.id == entry_id,
+        JournalEntry.deleted_at.is_(None)
+    ).exists()
+
+def live_account(account_id):
+    return select(LedgerAccount.id).where(
+        LedgerAccount.id == account_id,
+        LedgerAccount.deleted_at.is_(None)
+    ).exists()
+
+# La categoría debe ser del mismo usuario que el asiento de la línea.
+# entry_id puede ser JournalLine.entry_id: se correlaciona con la línea del UPDATE que la contiene
+def owned_category(category_id, entry_id):
+    entry_user = select(JournalEntry.user_id).where(JournalEntry.id == entry_id).correlate(JournalLine)
+    return select(Category.id).where(
+        Category.id == category_id,
+        Category.user_id == entry_user.scalar_subquery()
+    ).exists()
+
+# Solo en el camino de error: averigua qué referencia falló para responder el 404 correcto
+async def raise_missing_reference(
+    db: AsyncSession,
+    line_id: UUID | None = None,
+    entry_id: UUID | None = None,
+    account_id: UUID | None = None,
+    category_id: UUID | None = None
+):
+    line_entry = select(JournalLine.entry_id).where(JournalLine.id == line_id).scalar_subquery()
+    checks = {
+        "line": select(JournalLine.id).where(JournalLine.id == line_id).exists() if line_id else None,
+        "entry": live_entry(entry_id) if entry_id else None,
+        "account": live_account(account_id) if account_id else None,
+        "category": owned_category(category_id, entry_id or line_entry) if category_id else None,
+    }
+    checks = {name: check for name, check in checks.items() if check is not None}
+    result = await db.execute(select(*(check.label(name) for name, check in checks.items())))
+    found = result.one()._asdict()
+
+    if not found.get("line", True):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal line not found")
+    if not found.get("entry", True):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal entry not found")
+    if not found.get("account", True):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+
 # OBTENER TODAS LAS LÍNEAS DE UN ASIENTO
 @router.get("/entry/{entry_id}", response_model=Response[list[JournalLineRead]])
-async def get_entry_lines(entry_id: UUID, db: AsyncSession = Depends(get_db)):
+async def get_entry_lines(entry_id: UUID, db: AsyncSession = Depends(get_read_db)):
     # Verificar que el asiento existe
     entry_result = await db.execute(
         select(JournalEntry).where(
@@ -57,40 +114,42 @@ async def get_line_by_id(line_id: UUID, db: AsyncSession = Depends(get_db)):
 # CREAR UNA NUEVA LÍNEA
 @router.post("/create", response_model=Response[JournalLineRead])
 async def create_line(payload: JournalLineCreate, db: AsyncSession = Depends(get_db)):
-    # Verificar que el asiento existe
-    entry_result = await db.execute(
-        select(JournalEntry).where(
-            JournalEntry.id == payload.entry_id,
-            JournalEntry.deleted_at.is_(None)
-        )
-    )
-    entry = entry_result.scalar_one_or_none()
-    
-    if not entry:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal entry not found")
-    
-    # Verificar que la cuenta existe
-    account_result = await db.execute(
-        select(LedgerAccount).where(
-            LedgerAccount.id == payload.account_id,
-            LedgerAccount.deleted_at.is_(None)
+    # INSERT ... SELECT: solo inserta si el asiento y la cuenta siguen vigentes (y la categoría es del usuario)
+    conditions = [live_entry(payload.entry_id), live_account(payload.account_id)]
+    if payload.category_id:
+        conditions.append(owned_category(payload.category_id, payload.entry_id))
+
+    locked = await lock_entries(db, [payload.entry_id])
+    # El uso de cuentas se calcula por asiento completo: sale sin la línea nueva y vuelve con ella
+    await apply_entry_usage(db, [payload.entry_id], -1)
+    result = await db.execute(
+        insert(JournalLine)
+        .from_select(
+            ["entry_id", "account_id", "amount", "side", "category_id"],
+            select(
+                literal(payload.entry_id, PG_UUID),
+                literal(payload.account_id, PG_UUID),
+                literal(payload.amount, NUMERIC(18, 2)),
+                literal(payload.side, CHAR(1)),
+                literal(payload.category_id, PG_UUID)
+            ).where(*conditions)
         )
+        .returning(JournalLine)
+        .options(noload("*"))
     )
-    account = account_result.scalar_one_or_none()
-    
-    if not account:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
-    
-    new_line = JournalLine(
-        entry_id=payload.entry_id,
-        account_id=payload.account_id,
-        amount=payload.amount,
-        side=payload.side
-    )
+    new_line = result.scalar_one_or_none()
+
+    if new_line is None:
+        await raise_missing_reference(db, entry_id=payload.entry_id, account_id=payload.account_id, category_id=payload.category_id)
+
+    await apply_line_spend(db, [new_line.id], 1)
+    await apply_entry_usage(db, [new_line.entry_id], 1)
+    await refresh_entry_fingerprints(db, [new_line.entry_id])
+    stage(db, locked[0].user_id, entry_event("updated", [new_line.entry_id], balance_deltas([new_line])))
+    invalidate(db, locked[0].user_id, "entry", new_line.entry_id)
+    record_event(db, locked[0].user_id, "line", new_line.id, "created", line_payload(new_line))
 
-    db.add(new_line)
     await db.commit()
-    await db.refresh(new_line)
 
     return Response(
         status="201", 
@@ -101,67 +160,105 @@ async def create_line(payload: JournalLineCreate, db: AsyncSession = Depends(get
 # ACTUALIZAR UNA LÍNEA
 @router.put("/{line_id}", response_model=Response[JournalLineRead])
 async def update_line(line_id: UUID, payload: JournalLineUpdate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(JournalLine).where(JournalLine.id == line_id))
-    line = result.scalar_one_or_none()
-
-    if not line:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal line not found")
-    
-    # Si se está actualizando la cuenta, verificar que existe
-    if payload.account_id:
-        account_result = await db.execute(
-            select(LedgerAccount).where(
-                LedgerAccount.id == payload.account_id,
-                LedgerAccount.deleted_at.is_(None)
-            )
-        )
-        account = account_result.scalar_one_or_none()
-        
-        if not account:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
-    
     # Actualizar campos
+    changes = {}
     if payload.account_id is not None:
-        line.account_id = payload.account_id
+        changes["account_id"] = payload.account_id
     if payload.amount is not None:
-        line.amount = payload.amount
+        changes["amount"] = payload.amount
     if payload.side is not None:
-        line.side = payload.side
+        changes["side"] = payload.side
+    # category_id enviado (aunque sea null) = cambiar la categoría
+    if "category_id" in payload.model_fields_set:
+        changes["category_id"] = payload.category_id
+    # Cambiar cuenta, monto o lado invalida la conciliación contra el extracto
+    if changes.keys() & {"account_id", "amount", "side"}:
+        changes["reconciled_at"] = None
+
+    # La línea sale del agregado por categoría con sus valores actuales y vuelve con los nuevos
+    if changes:
+        locked = await lock_line_entries(db, [line_id])
+        await apply_line_spend(db, [line_id], -1)
+        if changes.keys() & {"account_id", "amount", "side"}:
+            await apply_line_entries_usage(db, [line_id], -1)
+
+    # UPDATE ... RETURNING: si no devuelve fila, la línea no existe, su asiento está eliminado o la nueva cuenta
+    # no está vigente. Como al borrarla, no se editan líneas de asientos eliminados: al restaurarlo volverían a sumar
+    if changes:
+        stmt = update(JournalLine).values(**changes).where(live_entry(JournalLine.entry_id)).returning(JournalLine)
+    else:
+        stmt = select(JournalLine)
+    stmt = stmt.where(JournalLine.id == line_id)
+    if payload.account_id:
+        stmt = stmt.where(live_account(payload.account_id))
+    if payload.category_id:
+        stmt = stmt.where(owned_category(payload.category_id, JournalLine.entry_id))
+    result = await db.execute(stmt.options(noload("*")))
+    line = result.scalar_one_or_none()
+
+    if not line:
+        # Solo en el camino de error: distinguir el asiento eliminado de las referencias que faltan
+        if changes and locked and not (await db.execute(select(live_entry(locked[0].entry_id)))).scalar():
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot update line from deleted journal entry")
+        await raise_missing_reference(db, line_id=line_id, account_id=payload.account_id, category_id=payload.category_id)
+
+    if changes:
+        await apply_line_spend(db, [line_id], 1)
+        if changes.keys() & {"account_id", "amount", "side"}:
+            await apply_line_entries_usage(db, [line_id], 1)
+            await refresh_entry_fingerprints(db, [line.entry_id])
+        # Saldo: sale la línea con sus valores anteriores y entra con los nuevos
+        deltas = balance_deltas(locked, -1)
+        stage(db, locked[0].user_id, entry_event("updated", [line.entry_id], balance_deltas([line], into=deltas)))
+        invalidate(db, locked[0].user_id, "entry", line.entry_id)
+        record_event(db, locked[0].user_id, "line", line_id, "updated", {
+            "before": line_payload(locked[0]),
+            "after": line_payload(line),
+        })
 
     await db.commit()
-    await db.refresh(line)
 
     return Response(status="200", data=line, message="Journal line updated successfully")
 
 # ELIMINAR UNA LÍNEA
 @router.delete("/{line_id}", response_model=Response[dict])
 async def delete_line(line_id: UUID, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(JournalLine).where(JournalLine.id == line_id))
-    line = result.scalar_one_or_none()
-
-    if not line:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal line not found")
-    
-    # Verificar que el asiento no esté eliminado
-    entry_result = await db.execute(
-        select(JournalEntry).where(
-            JournalEntry.id == line.entry_id,
-            JournalEntry.deleted_at.is_(None)
+    # Solo se borran líneas de asientos vigentes; antes salen del agregado por categoría
+    locked = await lock_line_entries(db, [line_id])
+    await apply_line_spend(db, [line_id], -1)
+    await apply_line_entries_usage(db, [line_id], -1)
+    result = await db.execute(
+        delete(JournalLine)
+        .where(
+            JournalLine.id == line_id,
+            select(JournalEntry.id).where(
+                JournalEntry.id == JournalLine.entry_id,
+                JournalEntry.deleted_at.is_(None)
+            ).exists()
         )
+        .returning(JournalLine.id)
     )
-    entry = entry_result.scalar_one_or_none()
-    
-    if not entry:
+
+    if result.scalar_one_or_none() is None:
+        # Solo en el camino de error: distinguir línea inexistente de asiento eliminado
+        exists = await db.execute(select(JournalLine.id).where(JournalLine.id == line_id))
+        if exists.scalar_one_or_none() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal line not found")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot delete line from deleted journal entry")
-    
-    await db.delete(line)
+
+    await apply_entry_usage(db, [locked[0].entry_id], 1)
+    await refresh_entry_fingerprints(db, [locked[0].entry_id])
+    stage(db, locked[0].user_id, entry_event("updated", [locked[0].entry_id], balance_deltas(locked, -1)))
+    invalidate(db, locked[0].user_id, "entry", locked[0].entry_id)
+    record_event(db, locked[0].user_id, "line", line_id, "deleted", line_payload(locked[0]))
+
     await db.commit()
 
     return Response(status="200", data={"id": str(line_id)}, message="Journal line deleted successfully")
 
 # OBTENER LÍNEAS DE UNA CUENTA
 @router.get("/account/{account_id}", response_model=Response[list[JournalLineRead]])
-async def get_account_lines(account_id: UUID, db: AsyncSession = Depends(get_db)):
+async def get_account_lines(account_id: UUID, db: AsyncSession = Depends(get_read_db)):
     # Verificar que la cuenta existe
     account_result = await db.execute(
         select(LedgerAccount).where(
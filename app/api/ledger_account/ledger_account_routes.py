@@ -1,33 +1,106 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from app.core.db import get_db
+from sqlalchemy import select, insert, update, func, exists, case
+from sqlalchemy.orm import aliased, noload
+from app.core.cache import cache, invalidate
+from app.core.db import get_db, get_read_db, register_warmup, WARMUP_ID
+from app.core.errors import constraint_errors
+from app.models.journal_entry import JournalEntry
+from app.models.journal_line import JournalLine
 from app.models.ledger_account import LedgerAccount, AccountKind
 from app.models.user import User
-from app.schemas.ledger_account import LedgerAccountBase, LedgerAccountCreate, LedgerAccountRead, LedgerAccountUpdate
+from app.schemas.ledger_account import AccountSuggestionsRead, LedgerAccountBalanceRead, LedgerAccountBase, LedgerAccountCreate, LedgerAccountRead, LedgerAccountUpdate
 from app.schemas.response import Response
+from app.services.account_tree import AccountTreeError, check_account_kind, insert_account_paths, move_account
+from app.services.account_usage import load_usage
+from app.services.ledger_events import record_event
 from uuid import UUID
 
 router = APIRouter(prefix="/ledger-account", tags=["ledger-account"])
 
-# OBTENER TODAS LAS CUENTAS DE UN USUARIO
-@router.get("/user/{user_id}", response_model=Response[list[LedgerAccountRead]])
-async def get_user_accounts(user_id: UUID, db: AsyncSession = Depends(get_db)):
-    # Verificar que el usuario existe
-    user_result = await db.execute(select(User).where(User.id == user_id))
-    user = user_result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
-    # Obtener cuentas del usuario (solo las no eliminadas)
-    result = await db.execute(
-        select(LedgerAccount).where(
-            LedgerAccount.user_id == user_id,
-            LedgerAccount.deleted_at.is_(None)
-        )
+# CONSULTA DE CUENTAS DE UN USUARIO
+def user_accounts_query(user_id: UUID):
+    return select(LedgerAccount).where(
+        LedgerAccount.user_id == user_id,
+        LedgerAccount.deleted_at.is_(None)
+    )
+
+# CONSULTA DE CUENTAS DE UN USUARIO CON SU SALDO
+# Un solo SUM agrupado por cuenta sobre los asientos vigentes del usuario, unido al listado:
+# una consulta sin importar cuántas cuentas tenga
+def user_account_balances_query(user_id: UUID, kind: AccountKind | None = None):
+    totals = select(
+        JournalLine.account_id,
+        func.sum(case((JournalLine.side == 'D', JournalLine.amount), else_=0)).label('debits'),
+        func.sum(case((JournalLine.side == 'C', JournalLine.amount), else_=0)).label('credits')
+    ).join(
+        JournalEntry, JournalLine.entry_id == JournalEntry.id
+    ).where(
+        JournalEntry.user_id == user_id,
+        JournalEntry.deleted_at.is_(None)
+    ).group_by(JournalLine.account_id).subquery()
+
+    debits = func.coalesce(totals.c.debits, 0)
+    credits = func.coalesce(totals.c.credits, 0)
+    stmt = select(
+        *LedgerAccount.__table__.c,
+        debits.label('debits'),
+        credits.label('credits'),
+        (debits - credits).label('balance')
+    ).outerjoin(
+        totals, totals.c.account_id == LedgerAccount.id
+    ).where(
+        LedgerAccount.user_id == user_id,
+        LedgerAccount.deleted_at.is_(None)
     )
-    accounts = result.scalars().all()
+    if kind is not None:
+        stmt = stmt.where(LedgerAccount.kind == kind)
+    return stmt
+
+# Listado con saldos: depende de los asientos, así que se guarda con los reportes del usuario
+async def fetch_account_balances(db: AsyncSession, user_id: UUID, kind: AccountKind | None = None) -> list[LedgerAccountBalanceRead]:
+    key = ("accounts", kind.value if kind else None)
+    accounts = cache.get(user_id, "report", key)
+    if accounts is None:
+        token = cache.token(db)
+        result = await db.execute(user_account_balances_query(user_id, kind))
+        accounts = [LedgerAccountBalanceRead.model_validate(dict(row)) for row in result.mappings()]
+        cache.set(user_id, "report", key, accounts, token)
+    return accounts
+
+# Listado vacío: solo entonces se averigua si el usuario existe
+async def ensure_user_exists(db: AsyncSession, user_id: UUID) -> None:
+    if await db.scalar(select(User.id).where(User.id == user_id)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+# Sentencias que se precompilan al arrancar (ver app/core/db.py)
+register_warmup(lambda: user_accounts_query(WARMUP_ID))
+register_warmup(lambda: user_account_balances_query(WARMUP_ID))
+
+# OBTENER TODAS LAS CUENTAS DE UN USUARIO
+@router.get("/user/{user_id}", response_model=Response[list[LedgerAccountBalanceRead] | list[LedgerAccountRead]])
+async def get_user_accounts(user_id: UUID, with_balances: bool = False, db: AsyncSession = Depends(get_read_db)):
+    # Con saldos: una sola consulta en lugar de pedir los movimientos de cada cuenta
+    if with_balances:
+        accounts = await fetch_account_balances(db, user_id)
+        if not accounts:
+            await ensure_user_exists(db, user_id)
+        return Response(status="200", data=accounts, message="User accounts fetched successfully")
+
+    accounts = cache.get(user_id, "account", ("all",))
+    if accounts is None:
+        token = cache.token(db)
+        # Verificar que el usuario existe
+        user_result = await db.execute(select(User).where(User.id == user_id))
+        user = user_result.scalar_one_or_none()
+
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+        # Obtener cuentas del usuario (solo las no eliminadas)
+        result = await db.execute(user_accounts_query(user_id))
+        accounts = [LedgerAccountRead.model_validate(account) for account in result.scalars().all()]
+        cache.set(user_id, "account", ("all",), accounts, token)
 
     return Response(
         status="200", 
@@ -58,35 +131,31 @@ async def get_account_by_id(account_id: UUID, db: AsyncSession = Depends(get_db)
 # CREAR UNA NUEVA CUENTA
 @router.post("/create", response_model=Response[LedgerAccountRead])
 async def create_account(payload: LedgerAccountCreate, db: AsyncSession = Depends(get_db)):
-    # Verificar que el usuario existe
-    user_result = await db.execute(select(User).where(User.id == payload.user_id))
-    user = user_result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
-    # Verificar que no existe una cuenta con el mismo nombre para el usuario
-    existing_account = await db.execute(
-        select(LedgerAccount).where(
-            LedgerAccount.user_id == payload.user_id,
-            LedgerAccount.name == payload.name,
-            LedgerAccount.deleted_at.is_(None)
+    # INSERT ... RETURNING: id y fechas por defecto vuelven en la misma sentencia.
+    # Usuario o padre inexistente (FK) y nombre repetido (índice único parcial) los detecta la base de datos
+    with constraint_errors():
+        result = await db.execute(
+            insert(LedgerAccount)
+            .values(
+                user_id=payload.user_id,
+                parent_id=payload.parent_id,
+                name=payload.name,
+                kind=payload.kind,
+                last4=payload.last4
+            )
+            .returning(LedgerAccount)
+            .options(noload("*"))
         )
-    )
-    
-    if existing_account.scalar_one_or_none():
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Account with this name already exists for this user")
-    
-    new_account = LedgerAccount(
-        user_id=payload.user_id,
-        name=payload.name,
-        kind=payload.kind,
-        last4=payload.last4
-    )
+        new_account = result.scalar_one()
 
-    db.add(new_account)
-    await db.commit()
-    await db.refresh(new_account)
+        # Caminos de la jerarquía en la misma transacción
+        try:
+            await insert_account_paths(db, new_account.id, payload.user_id, payload.kind, payload.parent_id)
+        except AccountTreeError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+        invalidate(db, payload.user_id, "account", new_account.id)
+        record_event(db, payload.user_id, "account", new_account.id, "created", payload.model_dump(exclude={"user_id"}))
+        await db.commit()
 
     return Response(
         status="201", 
@@ -97,69 +166,109 @@ async def create_account(payload: LedgerAccountCreate, db: AsyncSession = Depend
 # ACTUALIZAR UNA CUENTA
 @router.put("/{account_id}", response_model=Response[LedgerAccountRead])
 async def update_account(account_id: UUID, payload: LedgerAccountUpdate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(LedgerAccount).where(
-            LedgerAccount.id == account_id,
-            LedgerAccount.deleted_at.is_(None)
+    # Actualizar campos
+    changes = {}
+    if payload.name is not None:
+        changes["name"] = payload.name
+    if payload.kind is not None:
+        changes["kind"] = payload.kind
+    if payload.last4 is not None:
+        changes["last4"] = payload.last4
+    # parent_id enviado (aunque sea null) = mover la cuenta con todo su subárbol
+    moved = "parent_id" in payload.model_fields_set
+    if moved:
+        changes["parent_id"] = payload.parent_id
+
+    # UPDATE ... RETURNING: si no devuelve fila, la cuenta no existe o está eliminada.
+    # Un nombre repetido lo rechaza el índice único parcial y un padre inexistente su FK
+    with constraint_errors():
+        result = await db.execute(
+            update(LedgerAccount)
+            .where(
+                LedgerAccount.id == account_id,
+                LedgerAccount.deleted_at.is_(None)
+            )
+            .values(**changes, updated_at=func.now())
+            .returning(LedgerAccount)
+            .options(noload("*"))
         )
-    )
     account = result.scalar_one_or_none()
 
     if not account:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
-    
-    # Si se está actualizando el nombre, verificar que no exista otro con el mismo nombre
-    if payload.name and payload.name != account.name:
-        existing_account = await db.execute(
-            select(LedgerAccount).where(
-                LedgerAccount.user_id == account.user_id,
-                LedgerAccount.name == payload.name,
-                LedgerAccount.id != account_id,
-                LedgerAccount.deleted_at.is_(None)
-            )
-        )
-        
-        if existing_account.scalar_one_or_none():
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Account with this name already exists for this user")
-    
-    # Actualizar campos
-    if payload.name is not None:
-        account.name = payload.name
-    if payload.kind is not None:
-        account.kind = payload.kind
-    if payload.last4 is not None:
-        account.last4 = payload.last4
 
+    try:
+        if moved:
+            await move_account(db, account_id, payload.parent_id)
+        elif "kind" in changes:
+            await check_account_kind(db, account_id)
+    except AccountTreeError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    invalidate(db, account.user_id, "account", account_id)
+    record_event(db, account.user_id, "account", account_id, "updated", {"changes": changes})
     await db.commit()
-    await db.refresh(account)
 
     return Response(status="200", data=account, message="Account updated successfully")
 
 # ELIMINAR UNA CUENTA (soft delete)
 @router.delete("/{account_id}", response_model=Response[dict])
 async def delete_account(account_id: UUID, db: AsyncSession = Depends(get_db)):
+    # Soft delete en una sola sentencia; una cuenta con subcuentas vigentes no se elimina
+    child = aliased(LedgerAccount)
     result = await db.execute(
-        select(LedgerAccount).where(
+        update(LedgerAccount)
+        .where(
             LedgerAccount.id == account_id,
-            LedgerAccount.deleted_at.is_(None)
+            LedgerAccount.deleted_at.is_(None),
+            ~exists().where(child.parent_id == LedgerAccount.id, child.deleted_at.is_(None))
         )
+        .values(deleted_at=func.now())
+        .returning(LedgerAccount.user_id)
     )
-    account = result.scalar_one_or_none()
+    user_id = result.scalar_one_or_none()
 
-    if not account:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
-    
-    # Soft delete
-    from datetime import datetime
-    account.deleted_at = datetime.utcnow()
+    if user_id is None:
+        # Diagnóstico solo en el camino de error
+        live = await db.scalar(
+            select(LedgerAccount.id).where(LedgerAccount.id == account_id, LedgerAccount.deleted_at.is_(None))
+        )
+        if live is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Account has child accounts")
 
+    invalidate(db, user_id, "account", account_id)
+    record_event(db, user_id, "account", account_id, "deleted")
     await db.commit()
 
     return Response(status="200", data={"id": str(account_id)}, message="Account deleted successfully")
 
+# OBTENER SUGERENCIAS DE CUENTAS PARA LA CAPTURA RÁPIDA
+# El uso del usuario se carga una vez (tabla account_usage_daily) y queda en memoria con sus reportes hasta
+# la próxima escritura de sus asientos o cuentas: cada tecla solo filtra y ordena en memoria
+@router.get("/user/{user_id}/suggestions", response_model=Response[AccountSuggestionsRead])
+async def get_account_suggestions(
+    user_id: UUID,
+    prefix: str | None = None,
+    limit: int = 10,
+    db: AsyncSession = Depends(get_read_db)
+):
+    if not 1 <= limit <= 50:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="limit must be between 1 and 50")
+
+    usage = cache.get(user_id, "report", ("suggestions",))
+    if usage is None:
+        token = cache.token(db)
+        usage = await load_usage(db, user_id)
+        if not usage.accounts:
+            await ensure_user_exists(db, user_id)
+        cache.set(user_id, "report", ("suggestions",), usage, token)
+
+    return Response(status="200", data=usage.suggest(prefix, limit), message="Account suggestions fetched successfully")
+
 # OBTENER CUENTAS POR TIPO
-@router.get("/user/{user_id}/kind/{kind}", response_model=Response[list[LedgerAccountRead]])
-async def get_accounts_by_kind(user_id: UUID, kind: str, db: AsyncSession = Depends(get_db)):
+@router.get("/user/{user_id}/kind/{kind}", response_model=Response[list[LedgerAccountBalanceRead] | list[LedgerAccountRead]])
+async def get_accounts_by_kind(user_id: UUID, kind: str, with_balances: bool = False, db: AsyncSession = Depends(get_read_db)):
     # Mapear valores de entrada a valores del enum
     kind_mapping = {
         "asset": AccountKind.asset,
@@ -173,22 +282,32 @@ async def get_accounts_by_kind(user_id: UUID, kind: str, db: AsyncSession = Depe
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid account kind")
     
     account_kind = kind_mapping[kind.lower()]
-    
-    # Verificar que el usuario existe
-    user_result = await db.execute(select(User).where(User.id == user_id))
-    user = user_result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
-    result = await db.execute(
-        select(LedgerAccount).where(
-            LedgerAccount.user_id == user_id,
-            LedgerAccount.kind == account_kind,
-            LedgerAccount.deleted_at.is_(None)
+
+    if with_balances:
+        accounts = await fetch_account_balances(db, user_id, account_kind)
+        if not accounts:
+            await ensure_user_exists(db, user_id)
+        return Response(status="200", data=accounts, message=f"User {kind} accounts fetched successfully")
+
+    accounts = cache.get(user_id, "account", ("kind", account_kind.value))
+    if accounts is None:
+        token = cache.token(db)
+        # Verificar que el usuario existe
+        user_result = await db.execute(select(User).where(User.id == user_id))
+        user = user_result.scalar_one_or_none()
+
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+        result = await db.execute(
+            select(LedgerAccount).where(
+                LedgerAccount.user_id == user_id,
+                LedgerAccount.kind == account_kind,
+                LedgerAccount.deleted_at.is_(None)
+            )
         )
-    )
-    accounts = result.scalars().all()
+        accounts = [LedgerAccountRead.model_validate(account) for account in result.scalars().all()]
+        cache.set(user_id, "account", ("kind", account_kind.value), accounts, token)
 
     return Response(
         status="200", 
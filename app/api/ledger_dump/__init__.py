@@ -0,0 +1 @@
+# This file makes the ledger_dump directory a Python package
@@ -0,0 +1,53 @@
+from contextlib import AsyncExitStack
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from app.core.admission import admit
+from app.core.db import streaming_session, user_email_claim, user_session
+from app.schemas.response import Response
+from app.services.ledger_dump import DumpError, export_user, import_dump, open_dump
+from uuid import UUID
+
+router = APIRouter(prefix="/ledger-dump", tags=["ledger-dump"])
+
+# DESCARGAR EL VOLCADO COMPLETO DE UN USUARIO (FORMATO COLUMNAR COMPRIMIDO)
+@router.get("/user/{user_id}")
+async def dump_user(user_id: UUID, request: Request):
+    # La sesión se abre aquí y la cierra el generador: debe seguir abierta mientras se envía el cuerpo
+    stack = AsyncExitStack()
+    db = await stack.enter_async_context(streaming_session(request))
+    try:
+        frames = await export_user(db, user_id)
+        if frames is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    except BaseException:
+        await stack.aclose()
+        raise
+
+    async def chunks():
+        async with stack:
+            async for chunk in frames:
+                yield chunk
+
+    return StreamingResponse(
+        chunks(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{user_id}.nxdump"'},
+    )
+
+# IMPORTAR EL VOLCADO DE UN USUARIO (EL CUERPO ES EL ARCHIVO, SE LEE EN STREAMING)
+@router.post("/import", response_model=Response[dict])
+async def import_user_dump(request: Request):
+    # El shard se decide por el usuario del volcado: la sesión se abre después de leer su primer bloque
+    try:
+        async with admit(request) as ticket:
+            user_id, email, frames = await open_dump(request.stream())
+            async with user_email_claim(user_id, email), user_session(request, ticket, user_id, new=True) as db:
+                result = await import_dump(db, user_id, frames)
+    except DumpError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    return Response(
+        status="201",
+        data=result,
+        message="Ledger dump imported successfully"
+    )
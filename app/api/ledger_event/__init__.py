@@ -0,0 +1 @@
+# This file makes the ledger_event directory a Python package
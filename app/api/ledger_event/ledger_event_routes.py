@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.core.db import get_read_db
+from app.models.ledger_event import LedgerEvent
+from app.models.projection import AccountBalanceProjection
+from app.schemas.ledger_event import AccountBalanceProjectionRead, LedgerEventRead
+from app.schemas.response import Response
+from app.services.projections import ProjectionError, rebuild_projection
+from uuid import UUID
+
+router = APIRouter(prefix="/ledger-event", tags=["ledger-event"])
+
+# OBTENER LOS EVENTOS DE UN USUARIO (paginados por id: after_id es el último id recibido)
+@router.get("/user/{user_id}", response_model=Response[list[LedgerEventRead]])
+async def get_user_events(
+    user_id: UUID,
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db),
+):
+    result = await db.execute(
+        select(LedgerEvent)
+        .where(LedgerEvent.user_id == user_id, LedgerEvent.id > after_id)
+        .order_by(LedgerEvent.id)
+        .limit(limit)
+    )
+    events = result.scalars().all()
+
+    return Response(
+        status="200",
+        data=events,
+        message="Ledger events fetched successfully"
+    )
+
+# OBTENER LA PROYECCIÓN DE SALDOS POR CUENTA DE UN USUARIO
+@router.get("/projections/account-balances/{user_id}", response_model=Response[list[AccountBalanceProjectionRead]])
+async def get_account_balances_projection(user_id: UUID, db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(
+        select(AccountBalanceProjection)
+        .where(AccountBalanceProjection.user_id == user_id)
+        .order_by(AccountBalanceProjection.account_id)
+    )
+    rows = result.scalars().all()
+
+    return Response(
+        status="200",
+        data=rows,
+        message="Account balances projection fetched successfully"
+    )
+
+# RECONSTRUIR UNA PROYECCIÓN REPRODUCIENDO TODO EL REGISTRO (en paralelo por usuario)
+@router.post("/projections/{name}/rebuild", response_model=Response[dict])
+async def rebuild(name: str):
+    try:
+        totals = await rebuild_projection(name)
+    except ProjectionError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc))
+
+    return Response(status="200", data=totals, message="Projection rebuilt successfully")
@@ -0,0 +1 @@
+# This file makes the reconciliation directory a Python package
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.core.config import get_settings
+from app.core.db import get_db
+from app.models.ledger_account import LedgerAccount
+from app.schemas.reconciliation import ReconciliationRequest
+from app.schemas.response import Response
+from app.services.reconciliation import StatementItem, reconcile_account, to_cents
+from uuid import UUID
+
+router = APIRouter(prefix="/reconciliation", tags=["reconciliation"])
+
+# CONCILIAR UN EXTRACTO CONTRA LAS LÍNEAS SIN CONCILIAR DE UNA CUENTA
+@router.post("/{account_id}", response_model=Response[dict])
+async def reconcile(account_id: UUID, payload: ReconciliationRequest, dry_run: bool = False, db: AsyncSession = Depends(get_db)):
+    account_result = await db.execute(
+        select(LedgerAccount.user_id).where(
+            LedgerAccount.id == account_id,
+            LedgerAccount.deleted_at.is_(None)
+        )
+    )
+    user_id = account_result.scalar_one_or_none()
+
+    if not user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+
+    statement = [
+        StatementItem(index=i, occurred_on=line.occurred_on, cents=to_cents(line.amount), description=line.description)
+        for i, line in enumerate(payload.lines)
+    ]
+    tolerance_days = payload.tolerance_days if payload.tolerance_days is not None else get_settings().RECONCILIATION_TOLERANCE_DAYS
+    result = await reconcile_account(db, user_id, account_id, statement, tolerance_days, dry_run)
+
+    return Response(
+        status="200",
+        data=result,
+        message="Statement reconciliation previewed successfully" if dry_run else "Statement reconciled successfully"
+    )
@@ -0,0 +1 @@
+# This file makes the recurring directory a Python package
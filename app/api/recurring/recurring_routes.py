@@ -0,0 +1,150 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, func, literal, values, column, CHAR, NUMERIC
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import noload
+from sqlalchemy.orm.attributes import set_committed_value
+from app.core.db import get_db, get_read_db
+from app.core.errors import constraint_errors
+from app.models.recurring_template import RecurringTemplate, RecurringTemplateLine
+from app.models.ledger_account import LedgerAccount
+from app.models.user import User
+from app.schemas.recurring_template import RecurringTemplateCreate, RecurringTemplateRead
+from app.schemas.response import Response
+from app.services.recurring import materialize_due_occurrences
+from uuid import UUID, uuid4
+from decimal import Decimal
+from datetime import date
+
+router = APIRouter(prefix="/recurring", tags=["recurring"])
+
+# OBTENER LAS PLANTILLAS RECURRENTES DE UN USUARIO
+@router.get("/user/{user_id}", response_model=Response[list[RecurringTemplateRead]])
+async def get_user_templates(user_id: UUID, db: AsyncSession = Depends(get_read_db)):
+    # Verificar que el usuario existe
+    user_result = await db.execute(select(User).where(User.id == user_id))
+    user = user_result.scalar_one_or_none()
+    
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    
+    result = await db.execute(
+        select(RecurringTemplate).where(
+            RecurringTemplate.user_id == user_id,
+            RecurringTemplate.deleted_at.is_(None)
+        ).order_by(RecurringTemplate.start_date)
+    )
+    templates = result.scalars().all()
+
+    return Response(
+        status="200", 
+        data=templates, 
+        message="User recurring templates fetched successfully"
+    )
+
+# CREAR UNA PLANTILLA RECURRENTE CON LÍNEAS
+@router.post("/create", response_model=Response[RecurringTemplateRead])
+async def create_template(payload: RecurringTemplateCreate, db: AsyncSession = Depends(get_db)):
+    if payload.end_date and payload.end_date < payload.start_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end_date must be on or after start_date")
+    
+    # Validar que hay al menos 2 líneas
+    if len(payload.lines) < 2:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Recurring template must have at least 2 lines")
+    
+    # Validar balance (débitos = créditos)
+    total_debits = sum((line.amount for line in payload.lines if line.side == 'D'), Decimal('0'))
+    total_credits = sum((line.amount for line in payload.lines if line.side == 'C'), Decimal('0'))
+    
+    if total_debits != total_credits:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, 
+            detail=f"Recurring template is not balanced. Debits: {total_debits}, Credits: {total_credits}"
+        )
+    
+    # Plantilla con INSERT ... RETURNING, sin releer después del commit. Si el usuario no existe lo rechaza la FK
+    with constraint_errors():
+        template_result = await db.execute(
+            insert(RecurringTemplate)
+            .values(
+                id=uuid4(),
+                user_id=payload.user_id,
+                description=payload.description,
+                frequency=payload.frequency,
+                interval_count=payload.interval_count,
+                start_date=payload.start_date,
+                end_date=payload.end_date
+            )
+            .returning(RecurringTemplate)
+            .options(noload("*"))
+        )
+    new_template = template_result.scalar_one()
+
+    # Líneas con un solo INSERT ... SELECT que solo toma las cuentas vigentes del usuario
+    payload_lines = values(
+        column("account_id", PG_UUID),
+        column("amount", NUMERIC(18, 2)),
+        column("side", CHAR(1)),
+        name="payload_lines"
+    ).data([(line.account_id, line.amount, line.side) for line in payload.lines])
+
+    lines_result = await db.scalars(
+        insert(RecurringTemplateLine)
+        .from_select(
+            ["template_id", "account_id", "amount", "side"],
+            select(
+                literal(new_template.id, PG_UUID),
+                payload_lines.c.account_id,
+                payload_lines.c.amount,
+                payload_lines.c.side
+            )
+            .join(LedgerAccount, LedgerAccount.id == payload_lines.c.account_id)
+            .where(
+                LedgerAccount.user_id == payload.user_id,
+                LedgerAccount.deleted_at.is_(None)
+            )
+        )
+        .returning(RecurringTemplateLine)
+        .options(noload("*"))
+    )
+    lines = lines_result.all()
+
+    # Faltan líneas: alguna cuenta no existe o no es del usuario (la plantilla se descarta con el rollback)
+    if len(lines) != len(payload.lines):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="One or more accounts not found or do not belong to user")
+    set_committed_value(new_template, "lines", lines)
+
+    await db.commit()
+
+    return Response(
+        status="201", 
+        data=new_template, 
+        message="Recurring template created successfully"
+    )
+
+# ELIMINAR UNA PLANTILLA (soft delete). Los asientos ya generados se conservan
+@router.delete("/{template_id}", response_model=Response[dict])
+async def delete_template(template_id: UUID, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        update(RecurringTemplate)
+        .where(
+            RecurringTemplate.id == template_id,
+            RecurringTemplate.deleted_at.is_(None)
+        )
+        .values(deleted_at=func.now())
+        .returning(RecurringTemplate.id)
+    )
+
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Recurring template not found")
+
+    await db.commit()
+
+    return Response(status="200", data={"id": str(template_id)}, message="Recurring template deleted successfully")
+
+# EJECUTAR LA MATERIALIZACIÓN DE OCURRENCIAS VENCIDAS (todas las plantillas de todos los usuarios)
+@router.post("/run", response_model=Response[dict])
+async def run_materialization(run_date: date | None = None):
+    totals = await materialize_due_occurrences(run_date)
+
+    return Response(status="200", data=totals, message="Recurring templates materialized successfully")
@@ -1,38 +1,58 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import Response as DocumentResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, case, text
-from app.core.db import get_db
+from sqlalchemy import select, func, case, cast, text, BigInteger, Date
+from app.core.cache import cache
+from app.core.config import get_settings
+from app.core.db import get_read_db, register_warmup, WARMUP_ID
+from app.models.category import Category, CategorySpendMonthly
 from app.models.journal_line import JournalLine
 from app.models.journal_entry import JournalEntry
 from app.models.ledger_account import LedgerAccount, AccountKind
+from app.models.ledger_account_closure import LedgerAccountClosure
 from app.models.user import User
 from app.schemas.response import Response
 from uuid import UUID
 from decimal import Decimal
 from typing import Dict, List
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+from app.services.forecast import project_balances
+from app.services.balance_series import INTERVALS, MAX_BUCKETS, bucket_count, bucket_start, lttb, next_bucket
+from app.services.report_export import FORMATS, RenderBusy, documents, ledger_version, render
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
-# BALANCE GENERAL
-@router.get("/balance-sheet/{user_id}", response_model=Response[dict])
-async def get_balance_sheet(user_id: UUID, as_of_date: str | None = None, db: AsyncSession = Depends(get_db)):
-    # Verificar que el usuario existe
-    user_result = await db.execute(select(User).where(User.id == user_id))
-    user = user_result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
-    # Parsear fecha si se proporciona
-    filter_date = None
-    if as_of_date:
-        try:
-            filter_date = datetime.fromisoformat(as_of_date.replace('Z', '+00:00'))
-        except ValueError:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)")
-    
-    # Construir la consulta base
+# ROLL-UP POR SUBÁRBOL SOBRE LA TABLA DE CIERRE
+# own: saldos propios por cuenta (id, debits, credits). Cada cuenta vigente suma los de todo su subárbol
+# en una sola consulta agrupada; la fila con profundidad 0 es el saldo propio
+def rollup_query(own):
+    return select(
+        LedgerAccount.id,
+        LedgerAccount.parent_id,
+        LedgerAccount.name,
+        LedgerAccount.kind,
+        func.coalesce(func.sum(own.c.debits).filter(LedgerAccountClosure.depth == 0), 0).label('debits'),
+        func.coalesce(func.sum(own.c.credits).filter(LedgerAccountClosure.depth == 0), 0).label('credits'),
+        func.sum(own.c.debits).label('rollup_debits'),
+        func.sum(own.c.credits).label('rollup_credits')
+    ).select_from(
+        LedgerAccountClosure
+    ).join(
+        own, own.c.id == LedgerAccountClosure.descendant_id
+    ).join(
+        LedgerAccount, LedgerAccount.id == LedgerAccountClosure.ancestor_id
+    ).where(
+        LedgerAccount.deleted_at.is_(None)
+    ).group_by(
+        LedgerAccount.id,
+        LedgerAccount.parent_id,
+        LedgerAccount.name,
+        LedgerAccount.kind
+    )
+
+# CONSULTA DEL BALANCE GENERAL
+def balance_sheet_query(user_id: UUID, filter_date: datetime | None = None):
     base_query = select(
         LedgerAccount.id,
         LedgerAccount.name,
@@ -58,7 +78,7 @@ async def get_balance_sheet(user_id: UUID, as_of_date: str | None = None, db: As
     ).where(
         LedgerAccount.user_id == user_id,
         LedgerAccount.deleted_at.is_(None),
-        JournalEntry.deleted_at.is_(None) if JournalEntry.id is not None else True
+        JournalEntry.deleted_at.is_(None)
     )
     
     # Agregar filtro de fecha si se proporciona
@@ -67,13 +87,192 @@ async def get_balance_sheet(user_id: UUID, as_of_date: str | None = None, db: As
             (JournalEntry.occurred_at <= filter_date) | (JournalEntry.occurred_at.is_(None))
         )
     
-    base_query = base_query.group_by(
+    own = base_query.group_by(
+        LedgerAccount.id,
+        LedgerAccount.name,
+        LedgerAccount.kind
+    ).subquery()
+    
+    return rollup_query(own)
+
+# CONSULTA DEL ESTADO DE RESULTADOS
+# Las cuentas sin movimientos en el periodo aparecen si alguna subcuenta sí los tiene
+def income_statement_query(user_id: UUID, start_dt: datetime, end_dt: datetime):
+    own = select(
+        LedgerAccount.id,
+        LedgerAccount.name,
+        LedgerAccount.kind,
+        func.sum(
+            case(
+                (JournalLine.side == 'C', JournalLine.amount),
+                else_=0
+            )
+        ).label('credits'),
+        func.sum(
+            case(
+                (JournalLine.side == 'D', JournalLine.amount),
+                else_=0
+            )
+        ).label('debits')
+    ).select_from(
+        LedgerAccount
+    ).join(
+        JournalLine, LedgerAccount.id == JournalLine.account_id
+    ).join(
+        JournalEntry, JournalLine.entry_id == JournalEntry.id
+    ).where(
+        LedgerAccount.user_id == user_id,
+        LedgerAccount.kind.in_([AccountKind.income, AccountKind.expense]),
+        LedgerAccount.deleted_at.is_(None),
+        JournalEntry.deleted_at.is_(None),
+        JournalEntry.occurred_at >= start_dt,
+        JournalEntry.occurred_at <= end_dt
+    ).group_by(
         LedgerAccount.id,
         LedgerAccount.name,
         LedgerAccount.kind
+    ).subquery()
+    
+    return rollup_query(own)
+
+# CONSULTA DE MOVIMIENTOS DE UNA CUENTA
+def account_movements_query(account_id: UUID, start_dt: datetime | None = None, end_dt: datetime | None = None):
+    base_query = select(
+        JournalEntry.occurred_at,
+        JournalEntry.description,
+        JournalLine.amount,
+        JournalLine.side
+    ).select_from(
+        JournalLine
+    ).join(
+        JournalEntry, JournalLine.entry_id == JournalEntry.id
+    ).where(
+        JournalLine.account_id == account_id,
+        JournalEntry.deleted_at.is_(None)
     )
     
-    result = await db.execute(base_query)
+    if start_dt:
+        base_query = base_query.where(JournalEntry.occurred_at >= start_dt)
+    
+    if end_dt:
+        base_query = base_query.where(JournalEntry.occurred_at <= end_dt)
+    
+    return base_query.order_by(JournalEntry.occurred_at.desc())
+
+# CONSULTA DE SALDOS AL CIERRE DE CADA PERÍODO DE UNA CUENTA
+# Un período por fila (generate_series) aunque no tenga movimientos; lo anterior al primero se suma en él,
+# así que la suma acumulada (ventana) es el saldo al cierre. Devuelve tantas filas como períodos
+BALANCE_SERIES_SQL = text("""
+WITH buckets AS (
+    SELECT CAST(generate_series(CAST(:start AS date), CAST(:last AS date), CAST(:step AS interval)) AS date) AS bucket
+),
+flows AS (
+    SELECT
+        GREATEST(CAST(date_trunc(:unit, e.occurred_at AT TIME ZONE 'UTC') AS date), CAST(:start AS date)) AS bucket,
+        sum(CAST(CASE WHEN l.side = 'D' THEN l.amount ELSE -l.amount END * 100 AS bigint)) AS cents
+    FROM journal_line l
+    JOIN journal_entry e ON e.id = l.entry_id
+    WHERE l.account_id = :account_id
+      AND e.deleted_at IS NULL
+      AND e.occurred_at < :end
+    GROUP BY 1
+)
+SELECT b.bucket, CAST(sum(COALESCE(f.cents, 0)) OVER (ORDER BY b.bucket) AS bigint) AS cents
+FROM buckets b
+LEFT JOIN flows f ON f.bucket = b.bucket
+ORDER BY b.bucket
+""")
+
+# CONSULTA DE FLUJOS DIARIOS POR CUENTA (PARA EL PRONÓSTICO)
+# Todo lo anterior a window_start se agrupa en el día previo, que hace de saldo inicial
+def forecast_flows_query(user_id: UUID, window_start: date, window_end: date):
+    movements = select(
+        JournalLine.account_id,
+        func.greatest(cast(JournalEntry.occurred_at, Date), window_start - timedelta(days=1)).label('day'),
+        case(
+            (JournalLine.side == 'D', JournalLine.amount),
+            else_=-JournalLine.amount
+        ).label('amount')
+    ).select_from(
+        JournalLine
+    ).join(
+        JournalEntry, JournalLine.entry_id == JournalEntry.id
+    ).where(
+        JournalEntry.user_id == user_id,
+        JournalEntry.deleted_at.is_(None),
+        cast(JournalEntry.occurred_at, Date) <= window_end
+    ).subquery()
+    
+    return select(
+        LedgerAccount.id,
+        LedgerAccount.name,
+        LedgerAccount.kind,
+        movements.c.day,
+        cast(func.sum(movements.c.amount) * 100, BigInteger).label('cents')
+    ).select_from(
+        LedgerAccount
+    ).outerjoin(
+        movements, movements.c.account_id == LedgerAccount.id
+    ).where(
+        LedgerAccount.user_id == user_id,
+        LedgerAccount.deleted_at.is_(None)
+    ).group_by(
+        LedgerAccount.id,
+        LedgerAccount.name,
+        LedgerAccount.kind,
+        movements.c.day
+    )
+
+# CONSULTA DE GASTO POR CATEGORÍA Y MES
+# Lee el agregado mantenido en cada escritura: unas pocas filas por mes, sin recorrer las líneas
+def category_spend_query(user_id: UUID, start_month: date, end_month: date):
+    return select(
+        Category.id,
+        Category.name,
+        CategorySpendMonthly.month,
+        CategorySpendMonthly.debits,
+        CategorySpendMonthly.credits
+    ).select_from(
+        CategorySpendMonthly
+    ).join(
+        Category, Category.id == CategorySpendMonthly.category_id
+    ).where(
+        CategorySpendMonthly.user_id == user_id,
+        CategorySpendMonthly.month >= start_month,
+        CategorySpendMonthly.month <= end_month,
+        CategorySpendMonthly.lines > 0
+    ).order_by(
+        Category.name,
+        CategorySpendMonthly.month
+    )
+
+# Sentencias que se precompilan al arrancar (ver app/core/db.py)
+register_warmup(lambda: select(User).where(User.id == WARMUP_ID))
+register_warmup(lambda: balance_sheet_query(WARMUP_ID))
+register_warmup(lambda: balance_sheet_query(WARMUP_ID, datetime.now(timezone.utc)))
+register_warmup(lambda: income_statement_query(WARMUP_ID, datetime.now(timezone.utc), datetime.now(timezone.utc)))
+register_warmup(lambda: select(LedgerAccount).where(LedgerAccount.id == WARMUP_ID, LedgerAccount.deleted_at.is_(None)))
+register_warmup(lambda: account_movements_query(WARMUP_ID))
+register_warmup(lambda: category_spend_query(WARMUP_ID, date.today(), date.today()))
+
+# Cuentas y totales del balance general (todo salvo la fecha de generación)
+async def build_balance_sheet(user_id: UUID, as_of_date: str | None, db: AsyncSession) -> dict:
+    # Verificar que el usuario existe
+    user_result = await db.execute(select(User).where(User.id == user_id))
+    user = user_result.scalar_one_or_none()
+    
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    
+    # Parsear fecha si se proporciona
+    filter_date = None
+    if as_of_date:
+        try:
+            filter_date = datetime.fromisoformat(as_of_date.replace('Z', '+00:00'))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)")
+    
+    result = await db.execute(balance_sheet_query(user_id, filter_date))
     accounts_data = result.all()
     
     # Organizar por tipo de cuenta
@@ -88,12 +287,15 @@ async def get_balance_sheet(user_id: UUID, as_of_date: str | None = None, db: As
     total_equity = Decimal('0')
     
     for account in accounts_data:
+        # Los totales suman solo saldos propios: el roll-up de un padre ya incluye a sus hijos
         balance = account.debits - account.credits
         
         account_data = {
             "id": str(account.id),
+            "parent_id": str(account.parent_id) if account.parent_id else None,
             "name": account.name,
-            "balance": float(balance)
+            "balance": float(balance),
+            "rollup_balance": float(account.rollup_debits - account.rollup_credits)
         }
         
         if account.kind == AccountKind.asset:
@@ -109,29 +311,75 @@ async def get_balance_sheet(user_id: UUID, as_of_date: str | None = None, db: As
     # Calcular equity total (Assets - Liabilities)
     calculated_equity = total_assets - total_liabilities
     
+    return {
+        "accounts": balance_sheet,
+        "totals": {
+            "total_assets": float(total_assets),
+            "total_liabilities": float(total_liabilities),
+            "total_equity": float(total_equity),
+            "calculated_equity": float(calculated_equity)
+        }
+    }
+
+# Valida el formato pedido (json o uno de FORMATS)
+def check_format(format: str) -> None:
+    if format != "json" and format not in FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="format must be one of: json, xlsx, pdf")
+
+# Documento XLSX/PDF de un reporte. Se genera en el pool de procesos a partir de los datos del reporte
+# y se guarda por (usuario, parámetros, versión del libro): si el libro no cambió, no se vuelve a consultar
+async def export_report(db: AsyncSession, user_id: UUID, name: str, format: str, params: tuple, subtitle: str, build) -> DocumentResponse:
+    key = (str(user_id), name, params, format, await ledger_version(db, user_id))
+    document = documents.get(key)
+    if document is None:
+        report = await build()
+        try:
+            document = await render(name, format, subtitle, report)
+        except RenderBusy:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many reports being rendered, retry later",
+                headers={"Retry-After": str(get_settings().ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+        documents.set(key, document)
+
+    return DocumentResponse(
+        content=document,
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}-{user_id}.{format}"'},
+    )
+
+# BALANCE GENERAL
+@router.get("/balance-sheet/{user_id}", response_model=Response[dict])
+async def get_balance_sheet(
+    user_id: UUID,
+    as_of_date: str | None = None,
+    format: str = "json",
+    db: AsyncSession = Depends(get_read_db)
+):
+    check_format(format)
+    if format != "json":
+        subtitle = f"As of {as_of_date or datetime.utcnow().isoformat(timespec='seconds')}"
+        return await export_report(
+            db, user_id, "balance-sheet", format, (as_of_date,), subtitle,
+            lambda: build_balance_sheet(user_id, as_of_date, db),
+        )
+
+    # Sin fecha de corte, el reporte depende de la hora: el TTL de la caché acota cuánto se reutiliza
+    report = cache.get(user_id, "report", ("balance-sheet", as_of_date))
+    if report is None:
+        token = cache.token(db)
+        report = await build_balance_sheet(user_id, as_of_date, db)
+        cache.set(user_id, "report", ("balance-sheet", as_of_date), report, token)
+
     return Response(
         status="200",
-        data={
-            "as_of_date": as_of_date or datetime.utcnow().isoformat(),
-            "accounts": balance_sheet,
-            "totals": {
-                "total_assets": float(total_assets),
-                "total_liabilities": float(total_liabilities),
-                "total_equity": float(total_equity),
-                "calculated_equity": float(calculated_equity)
-            }
-        },
+        data={"as_of_date": as_of_date or datetime.utcnow().isoformat(), **report},
         message="Balance sheet generated successfully"
     )
 
-# ESTADO DE RESULTADOS (INCOME STATEMENT)
-@router.get("/income-statement/{user_id}", response_model=Response[dict])
-async def get_income_statement(
-    user_id: UUID, 
-    start_date: str, 
-    end_date: str, 
-    db: AsyncSession = Depends(get_db)
-):
+# Cuentas y totales del estado de resultados de un período
+async def build_income_statement(user_id: UUID, start_date: str, end_date: str, db: AsyncSession) -> dict:
     # Verificar que el usuario existe
     user_result = await db.execute(select(User).where(User.id == user_id))
     user = user_result.scalar_one_or_none()
@@ -147,42 +395,7 @@ async def get_income_statement(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)")
     
     # Consultar ingresos y gastos
-    result = await db.execute(
-        select(
-            LedgerAccount.id,
-            LedgerAccount.name,
-            LedgerAccount.kind,
-            func.sum(
-                case(
-                    (JournalLine.side == 'C', JournalLine.amount),
-                    else_=0
-                )
-            ).label('credits'),
-            func.sum(
-                case(
-                    (JournalLine.side == 'D', JournalLine.amount),
-                    else_=0
-                )
-            ).label('debits')
-        ).select_from(
-            LedgerAccount
-        ).join(
-            JournalLine, LedgerAccount.id == JournalLine.account_id
-        ).join(
-            JournalEntry, JournalLine.entry_id == JournalEntry.id
-        ).where(
-            LedgerAccount.user_id == user_id,
-            LedgerAccount.kind.in_([AccountKind.INCOME, AccountKind.EXPENSE]),
-            LedgerAccount.deleted_at.is_(None),
-            JournalEntry.deleted_at.is_(None),
-            JournalEntry.occurred_at >= start_dt,
-            JournalEntry.occurred_at <= end_dt
-        ).group_by(
-            LedgerAccount.id,
-            LedgerAccount.name,
-            LedgerAccount.kind
-        )
-    )
+    result = await db.execute(income_statement_query(user_id, start_dt, end_dt))
     
     accounts_data = result.all()
     
@@ -196,41 +409,63 @@ async def get_income_statement(
     total_expenses = Decimal('0')
     
     for account in accounts_data:
-        if account.kind == AccountKind.INCOME:
+        if account.kind == AccountKind.income:
             # Para ingresos: créditos - débitos
             net_amount = account.credits - account.debits
             income_statement["income"].append({
                 "id": str(account.id),
+                "parent_id": str(account.parent_id) if account.parent_id else None,
                 "name": account.name,
-                "amount": float(net_amount)
+                "amount": float(net_amount),
+                "rollup_amount": float(account.rollup_credits - account.rollup_debits)
             })
             total_income += net_amount
-        elif account.kind == AccountKind.EXPENSE:
+        elif account.kind == AccountKind.expense:
             # Para gastos: débitos - créditos
             net_amount = account.debits - account.credits
             income_statement["expenses"].append({
                 "id": str(account.id),
+                "parent_id": str(account.parent_id) if account.parent_id else None,
                 "name": account.name,
-                "amount": float(net_amount)
+                "amount": float(net_amount),
+                "rollup_amount": float(account.rollup_debits - account.rollup_credits)
             })
             total_expenses += net_amount
     
     net_income = total_income - total_expenses
     
+    return {
+        "period": {
+            "start_date": start_date,
+            "end_date": end_date
+        },
+        "accounts": income_statement,
+        "totals": {
+            "total_income": float(total_income),
+            "total_expenses": float(total_expenses),
+            "net_income": float(net_income)
+        }
+    }
+
+# ESTADO DE RESULTADOS (INCOME STATEMENT)
+@router.get("/income-statement/{user_id}", response_model=Response[dict])
+async def get_income_statement(
+    user_id: UUID, 
+    start_date: str, 
+    end_date: str, 
+    format: str = "json",
+    db: AsyncSession = Depends(get_read_db)
+):
+    check_format(format)
+    if format != "json":
+        return await export_report(
+            db, user_id, "income-statement", format, (start_date, end_date), f"{start_date} to {end_date}",
+            lambda: build_income_statement(user_id, start_date, end_date, db),
+        )
+
     return Response(
         status="200",
-        data={
-            "period": {
-                "start_date": start_date,
-                "end_date": end_date
-            },
-            "accounts": income_statement,
-            "totals": {
-                "total_income": float(total_income),
-                "total_expenses": float(total_expenses),
-                "net_income": float(net_income)
-            }
-        },
+        data=await build_income_statement(user_id, start_date, end_date, db),
         message="Income statement generated successfully"
     )
 
@@ -240,7 +475,7 @@ async def get_account_movements(
     account_id: UUID,
     start_date: str | None = None,
     end_date: str | None = None,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     # Verificar que la cuenta existe
     account_result = await db.execute(
@@ -254,39 +489,22 @@ async def get_account_movements(
     if not account:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
     
-    # Construir consulta base
-    base_query = select(
-        JournalEntry.occurred_at,
-        JournalEntry.description,
-        JournalLine.amount,
-        JournalLine.side
-    ).select_from(
-        JournalLine
-    ).join(
-        JournalEntry, JournalLine.entry_id == JournalEntry.id
-    ).where(
-        JournalLine.account_id == account_id,
-        JournalEntry.deleted_at.is_(None)
-    )
-    
-    # Agregar filtros de fecha si se proporcionan
+    # Parsear filtros de fecha si se proporcionan
+    start_dt = None
     if start_date:
         try:
             start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            base_query = base_query.where(JournalEntry.occurred_at >= start_dt)
         except ValueError:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid start date format")
     
+    end_dt = None
     if end_date:
         try:
             end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            base_query = base_query.where(JournalEntry.occurred_at <= end_dt)
         except ValueError:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid end date format")
     
-    base_query = base_query.order_by(JournalEntry.occurred_at.desc())
-    
-    result = await db.execute(base_query)
+    result = await db.execute(account_movements_query(account_id, start_dt, end_dt))
     movements = result.all()
     
     # Calcular balance
@@ -320,3 +538,216 @@ async def get_account_movements(
         },
         message="Account movements fetched successfully"
     )
+
+# SERIE DE SALDOS DE UNA CUENTA (PARA GRÁFICOS)
+@router.get("/balance-series/{account_id}", response_model=Response[dict])
+async def get_balance_series(
+    account_id: UUID,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    interval: str = "day",
+    points: int | None = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="interval must be one of: day, week, month")
+    if points is not None and not 3 <= points <= MAX_BUCKETS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"points must be between 3 and {MAX_BUCKETS}")
+    
+    # Parsear fechas (por defecto el último año hasta hoy, en días UTC)
+    try:
+        end_day = datetime.fromisoformat(end_date.replace('Z', '+00:00')).date() if end_date else datetime.now(timezone.utc).date()
+        start_day = datetime.fromisoformat(start_date.replace('Z', '+00:00')).date() if start_date else end_day - timedelta(days=365)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)")
+    
+    first = bucket_start(start_day, interval)
+    last = bucket_start(end_day, interval)
+    if last < first:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end_date must not be before start_date")
+    if bucket_count(first, last, interval) > MAX_BUCKETS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Date range cannot exceed {MAX_BUCKETS} {interval}s")
+    
+    # Verificar que la cuenta existe
+    account_result = await db.execute(
+        select(LedgerAccount).where(
+            LedgerAccount.id == account_id,
+            LedgerAccount.deleted_at.is_(None)
+        )
+    )
+    account = account_result.scalar_one_or_none()
+    
+    if not account:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+    
+    # La caché de reportes del usuario se invalida con cada escritura de sus asientos y cuentas:
+    # la serie se reutiliza mientras el libro no cambie
+    key = ("balance-series", account_id, first, last, interval, points)
+    series = cache.get(account.user_id, "report", key)
+    if series is None:
+        token = cache.token(db)
+        result = await db.execute(BALANCE_SERIES_SQL, {
+            "account_id": account_id,
+            "start": first,
+            "last": last,
+            "step": f"1 {interval}",
+            "unit": interval,
+            "end": datetime.combine(next_bucket(last, interval), datetime.min.time(), tzinfo=timezone.utc),
+        })
+        rows = result.all()
+        days = np.array([row.bucket for row in rows], dtype="datetime64[D]")
+        cents = np.fromiter((row.cents for row in rows), dtype=np.int64, count=len(rows))
+        
+        # El tamaño de la respuesta depende de la resolución del gráfico, no de la cantidad de movimientos
+        selected = lttb(days.astype(np.int64), cents.astype(np.float64), points) if points else np.arange(len(rows))
+        series = {
+            "dates": [str(day) for day in days[selected]],
+            "balances": (cents[selected] / 100).tolist(),
+            "downsampled": len(selected) < len(rows)
+        }
+        cache.set(account.user_id, "report", key, series, token)
+    
+    return Response(
+        status="200",
+        data={
+            "account": {
+                "id": str(account.id),
+                "name": account.name,
+                "kind": account.kind.value
+            },
+            "interval": interval,
+            **series
+        },
+        message="Balance series generated successfully"
+    )
+
+# PRONÓSTICO DE FLUJO DE CAJA
+@router.get("/cashflow-forecast/{user_id}", response_model=Response[dict])
+async def get_cashflow_forecast(
+    user_id: UUID,
+    days: int = 30,
+    history_days: int = 180,
+    db: AsyncSession = Depends(get_read_db)
+):
+    if not 1 <= days <= 365:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="days must be between 1 and 365")
+    if not 28 <= history_days <= 730:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="history_days must be between 28 and 730")
+    
+    # Verificar que el usuario existe
+    user_result = await db.execute(select(User).where(User.id == user_id))
+    user = user_result.scalar_one_or_none()
+    
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    
+    today = datetime.now(timezone.utc).date()
+    window_start = today - timedelta(days=history_days - 1)
+    
+    # Una sola consulta con los flujos diarios de todas las cuentas
+    result = await db.execute(forecast_flows_query(user_id, window_start, today))
+    rows = result.all()
+    
+    accounts = {}
+    for row in rows:
+        accounts.setdefault(row.id, row)
+    account_index = {account_id: i for i, account_id in enumerate(accounts)}
+    flows = [row for row in rows if row.day is not None]
+    
+    forecast = project_balances(
+        account_idx=np.fromiter((account_index[row.id] for row in flows), dtype=np.int64, count=len(flows)),
+        day_idx=(np.array([row.day for row in flows], dtype="datetime64[D]") - np.datetime64(window_start, "D")).astype(np.int64),
+        cents=np.fromiter((row.cents for row in flows), dtype=np.int64, count=len(flows)),
+        n_accounts=len(accounts),
+        history_start=window_start,
+        history_days=history_days,
+        horizon_days=days,
+    )
+    
+    dates = [str(d) for d in forecast.dates]
+    min_positions = forecast.balances.argmin(axis=1) if len(accounts) else []
+    
+    accounts_list = []
+    for i, account in enumerate(accounts.values()):
+        series = forecast.balances[i]
+        negative = np.flatnonzero(series < 0)
+        accounts_list.append({
+            "id": str(account.id),
+            "name": account.name,
+            "kind": account.kind.value,
+            "current_balance": float(forecast.current[i]) / 100,
+            "min_balance": float(series[min_positions[i]]) / 100,
+            "min_balance_date": dates[min_positions[i]],
+            # Solo para activos: primer día en que el saldo quedaría en negativo
+            "first_negative_date": dates[negative[0]] if account.kind == AccountKind.asset and negative.size else None,
+            "balances": (series / 100).tolist()
+        })
+    
+    return Response(
+        status="200",
+        data={
+            "history_start": window_start.isoformat(),
+            "dates": dates,
+            "accounts": accounts_list
+        },
+        message="Cashflow forecast generated successfully"
+    )
+
+# GASTO POR CATEGORÍA EN EL TIEMPO
+@router.get("/spending-by-category/{user_id}", response_model=Response[dict])
+async def get_spending_by_category(
+    user_id: UUID,
+    start_date: str,
+    end_date: str,
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Parsear fechas (la granularidad es el mes UTC)
+    try:
+        start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+        end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date format. Use ISO format (YYYY-MM-DDTHH:MM:SS)")
+    
+    start_month = date(start_dt.year, start_dt.month, 1)
+    end_month = date(end_dt.year, end_dt.month, 1)
+    if end_month < start_month:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end_date must not be before start_date")
+    if (end_month.year - start_month.year) * 12 + end_month.month - start_month.month >= 120:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Date range cannot exceed 120 months")
+    
+    months = []
+    month = start_month
+    while month <= end_month:
+        months.append(month)
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    month_index = {month: i for i, month in enumerate(months)}
+    
+    result = await db.execute(category_spend_query(user_id, start_month, end_month))
+    
+    # Una serie alineada con "months" por categoría; el gasto es débitos - créditos
+    categories = {}
+    for row in result.all():
+        category = categories.setdefault(row.id, {
+            "id": str(row.id),
+            "name": row.name,
+            "amounts": [0.0] * len(months),
+            "total": Decimal('0')
+        })
+        amount = row.debits - row.credits
+        category["amounts"][month_index[row.month]] = float(amount)
+        category["total"] += amount
+    
+    categories_list = sorted(categories.values(), key=lambda category: category["total"], reverse=True)
+    total = sum((category["total"] for category in categories_list), Decimal('0'))
+    for category in categories_list:
+        category["total"] = float(category["total"])
+    
+    return Response(
+        status="200",
+        data={
+            "months": [month.strftime("%Y-%m") for month in months],
+            "categories": categories_list,
+            "total": float(total)
+        },
+        message="Spending by category generated successfully"
+    )
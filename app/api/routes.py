@@ -4,6 +4,16 @@ from app.api.ledger_account.ledger_account_routes import router as ledger_accoun
 from app.api.journal_entry.journal_entry_routes import router as journal_entry_router
 from app.api.journal_line.journal_line_routes import router as journal_line_router
 from app.api.reports.reports_routes import router as reports_router
+from app.api.recurring.recurring_routes import router as recurring_router
+from app.api.statement_import.statement_import_routes import router as statement_import_router
+from app.api.archive.archive_routes import router as archive_router
+from app.api.category.category_routes import router as category_router
+from app.api.dashboard.dashboard_routes import router as dashboard_router
+from app.api.stream.stream_routes import router as stream_router
+from app.api.ledger_event.ledger_event_routes import router as ledger_event_router
+from app.api.reconciliation.reconciliation_routes import router as reconciliation_router
+from app.api.ledger_dump.ledger_dump_routes import router as ledger_dump_router
+from app.api.shard.shard_routes import router as shard_router
 
 router = APIRouter()
 
@@ -13,6 +23,16 @@ router.include_router(ledger_account_router)
 router.include_router(journal_entry_router)
 router.include_router(journal_line_router)
 router.include_router(reports_router)
+router.include_router(recurring_router)
+router.include_router(statement_import_router)
+router.include_router(archive_router)
+router.include_router(category_router)
+router.include_router(dashboard_router)
+router.include_router(stream_router)
+router.include_router(ledger_event_router)
+router.include_router(reconciliation_router)
+router.include_router(ledger_dump_router)
+router.include_router(shard_router)
 
 @router.get("/")
 def get_():
@@ -0,0 +1 @@
+# This file makes the shard directory a Python package
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, HTTPException, status
+from sqlalchemy import func, select, text
+from app.core import db
+from app.core.sharding import MAIN_SHARD, shard_names, sharding_enabled
+from app.models.user import User
+from app.schemas.response import Response
+from app.services.shard_move import ShardMoveError, move_user
+from uuid import UUID
+
+router = APIRouter(prefix="/shard", tags=["shard"])
+
+DIRECTORY_COUNTS_SQL = text("SELECT shard, count(*) AS users FROM user_shard GROUP BY shard")
+
+# OBTENER EL SHARD DE UN USUARIO
+@router.get("/user/{user_id}", response_model=Response[dict])
+async def get_user_shard(user_id: UUID):
+    shard, moving = await db.user_location(user_id)
+
+    return Response(
+        status="200",
+        data={"user_id": user_id, "shard": shard, "moving": moving},
+        message="User shard fetched successfully"
+    )
+
+# TRASLADAR UN USUARIO A OTRO SHARD (force retoma un traslado que quedó a medias)
+@router.post("/user/{user_id}/move", response_model=Response[dict])
+async def move_user_shard(user_id: UUID, target: str, force: bool = False):
+    try:
+        result = await move_user(user_id, target, force)
+    except ShardMoveError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    return Response(status="200", data=result, message="User moved successfully")
+
+# OBTENER LOS USUARIOS DE CADA SHARD (filas reales y entradas del directorio)
+@router.get("/stats", response_model=Response[dict])
+async def get_shard_stats():
+    async def count_users(session):
+        return (await session.execute(select(func.count()).select_from(User))).scalar_one()
+
+    users = await db.for_each_shard(count_users)
+    directory = {}
+    if sharding_enabled():
+        async with db.shard_session(MAIN_SHARD) as session:
+            directory = {row.shard: row.users for row in await session.execute(DIRECTORY_COUNTS_SQL)}
+
+    return Response(
+        status="200",
+        data={"shards": [{"name": name, "users": users[name], "directory": directory.get(name, 0)} for name in shard_names()]},
+        message="Shard stats fetched successfully"
+    )
@@ -0,0 +1 @@
+# This file makes the statement_import directory a Python package
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.core.config import get_settings
+from app.core.db import get_db
+from app.models.ledger_account import LedgerAccount
+from app.schemas.response import Response
+from app.services.statement_import import (
+    CsvColumns, Fingerprinter, MAX_REPORTED_ERRORS, StatementParseError,
+    iter_text_lines, parse_csv, parse_ofx, post_batch,
+)
+from uuid import UUID
+
+router = APIRouter(prefix="/import", tags=["import"])
+
+# IMPORTAR UN EXTRACTO BANCARIO (CSV u OFX)
+@router.post("/statement/{account_id}", response_model=Response[dict])
+async def import_statement(
+    account_id: UUID,
+    file: UploadFile = File(...),
+    counter_account_id: UUID = Form(...),
+    format: str | None = Form(None),
+    delimiter: str = Form(","),
+    date_column: str = Form("date"),
+    description_column: str = Form("description"),
+    amount_column: str | None = Form("amount"),
+    debit_column: str | None = Form(None),
+    credit_column: str | None = Form(None),
+    date_format: str | None = Form(None),
+    decimal_separator: str | None = Form(None),
+    db: AsyncSession = Depends(get_db)
+):
+    # Verificar que ambas cuentas existen y pertenecen al mismo usuario
+    accounts_result = await db.execute(
+        select(LedgerAccount).where(
+            LedgerAccount.id.in_([account_id, counter_account_id]),
+            LedgerAccount.deleted_at.is_(None)
+        )
+    )
+    accounts = {account.id: account for account in accounts_result.scalars().all()}
+    account = accounts.get(account_id)
+    counter_account = accounts.get(counter_account_id)
+    
+    if not account:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+    if not counter_account or counter_account.user_id != account.user_id or account_id == counter_account_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Counter account not found or does not belong to the account's user")
+    
+    # Detectar formato por extensión si no se indica
+    statement_format = (format or (file.filename or "").rsplit(".", 1)[-1]).lower()
+    if statement_format not in ("csv", "ofx", "qfx"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported statement format. Use csv or ofx")
+    if decimal_separator not in (None, "", ".", ","):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Decimal separator must be '.' or ','")
+    
+    lines = iter_text_lines(file)
+    if statement_format == "csv":
+        movements = parse_csv(lines, CsvColumns(
+            date=date_column,
+            description=description_column,
+            amount=amount_column or None,
+            debit=debit_column or None,
+            credit=credit_column or None,
+            date_format=date_format,
+            delimiter=delimiter,
+            decimal_separator=decimal_separator or None,
+        ))
+    else:
+        movements = parse_ofx(lines)
+    
+    batch_size = get_settings().IMPORT_BATCH_SIZE
+    fingerprint = Fingerprinter(account_id)
+    batch = []
+    parsed = imported = skipped = 0
+    errors = []
+    
+    try:
+        async for movement in movements:
+            if isinstance(movement, StatementParseError):
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(str(movement))
+                skipped += 1
+                continue
+            
+            parsed += 1
+            batch.append((fingerprint(movement), movement))
+            
+            if len(batch) >= batch_size:
+                imported += await post_batch(db, account.user_id, account_id, counter_account_id, batch)
+                batch = []
+    except StatementParseError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    
+    imported += await post_batch(db, account.user_id, account_id, counter_account_id, batch)
+    
+    return Response(
+        status="201",
+        data={
+            "parsed": parsed,
+            "imported": imported,
+            "duplicates": parsed - imported,
+            "skipped": skipped,
+            "errors": errors
+        },
+        message="Statement imported successfully"
+    )
@@ -0,0 +1,96 @@
+import asyncio
+import json
+from contextlib import ExitStack, suppress
+from fastapi import APIRouter, HTTPException, WebSocket, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from app.core import db
+from app.core.config import get_settings
+from app.core.push import TooManySubscriptions, Subscription, hub
+from app.models.user import User
+from uuid import UUID
+
+router = APIRouter(prefix="/stream", tags=["stream"])
+
+# Las conexiones viven mucho tiempo: no pasan por el control de admisión ni retienen una sesión;
+# solo se consulta (y se suelta) la base de datos para verificar el usuario
+async def user_exists(user_id: UUID) -> bool:
+    shard, _ = await db.user_location(user_id)
+    async with db.session_factories[shard]() as session:
+        result = await session.execute(select(User.id).where(User.id == user_id))
+        return result.scalar_one_or_none() is not None
+
+# Siguiente evento de la suscripción, o None si pasó el intervalo de latido sin eventos
+async def next_event(subscription: Subscription) -> dict | None:
+    try:
+        return await asyncio.wait_for(subscription.get(), get_settings().PUSH_HEARTBEAT_SECONDS)
+    except asyncio.TimeoutError:
+        return None
+
+async def send_events(websocket: WebSocket, subscription: Subscription):
+    while True:
+        event = await next_event(subscription)
+        await websocket.send_json(event or {"type": "heartbeat"})
+
+# El cliente no envía nada: solo se lee para enterarse de que cerró
+async def wait_disconnect(websocket: WebSocket):
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+# SUSCRIBIRSE A LOS CAMBIOS DE UN USUARIO (WebSocket)
+@router.websocket("/{user_id}/ws")
+async def stream_websocket(websocket: WebSocket, user_id: UUID):
+    if not await user_exists(user_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="User not found")
+        return
+
+    try:
+        with hub.subscribe(str(user_id)) as subscription:
+            await websocket.accept()
+            await websocket.send_json({"type": "subscribed"})
+
+            # Enviar y escuchar a la vez: si el cliente se desconecta estando inactivo, se libera la suscripción
+            tasks = [
+                asyncio.create_task(send_events(websocket, subscription)),
+                asyncio.create_task(wait_disconnect(websocket)),
+            ]
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                task.cancel()
+            for task in tasks:
+                with suppress(asyncio.CancelledError, Exception):
+                    await task
+    except TooManySubscriptions:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Too many open streams for this user")
+
+def sse_message(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+# SUSCRIBIRSE A LOS CAMBIOS DE UN USUARIO (Server-Sent Events)
+@router.get("/{user_id}/sse")
+async def stream_sse(user_id: UUID):
+    if not await user_exists(user_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    # La suscripción se abre antes de responder para poder rechazarla con 429
+    stack = ExitStack()
+    try:
+        subscription = stack.enter_context(hub.subscribe(str(user_id)))
+    except TooManySubscriptions:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many open streams for this user")
+
+    # Al desconectarse el cliente se cancela el generador y se cierra la suscripción
+    async def events():
+        with stack:
+            yield sse_message({"type": "subscribed"})
+            while True:
+                event = await next_event(subscription)
+                yield sse_message(event) if event else ": heartbeat\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,20 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.core.db import get_db
+from sqlalchemy import select, insert, update
+from sqlalchemy.orm import noload
+from app.core.cache import cache, invalidate
+from app.core.db import assign_user_id, get_db, get_shard_sessions, user_email_claim, user_shard_claim
+from app.core.errors import constraint_errors
 from app.models.user import User
 from app.schemas.user import UserBase, UserCreate, UserRead, UserUpdate
 from app.schemas.response import Response
 
 from uuid import UUID
+import asyncio
 
 router = APIRouter(prefix="/user", tags=["user"])
 
 # OBTENGO TODOS LOS USUARIOS
 @router.get("/get-all-users", response_model=Response[list[UserRead]])
-async def get_all_users(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.is_active == True))
-    users = result.scalars().all()
+async def get_all_users(sessions: dict[str, AsyncSession] = Depends(get_shard_sessions)):
+    # Cada shard tiene sus usuarios: se consultan todos a la vez
+    results = await asyncio.gather(*(
+        db.execute(select(User).where(User.is_active == True)) for db in sessions.values()
+    ))
+    users = [user for result in results for user in result.scalars().all()]
 
     return Response(
         status="200", 
@@ -25,11 +32,17 @@ async def get_all_users(db: AsyncSession = Depends(get_db)):
 # OBTENGO UN USUARIO POR ID
 @router.get("/get-user-by-id/{user_id}", response_model=Response[UserRead])
 async def get_user_by_id(user_id: UUID, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.id == user_id).where(User.is_active == True))
-    user = result.scalar_one_or_none()
+    user = cache.get(user_id, "user", str(user_id))
+    if user is None:
+        token = cache.token(db)
+        result = await db.execute(select(User).where(User.id == user_id).where(User.is_active == True))
+        user = result.scalar_one_or_none()
 
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+        user = UserRead.model_validate(user)
+        cache.set(user_id, "user", str(user_id), user, token)
         
     return Response(
         status="200", 
@@ -38,17 +51,24 @@ async def get_user_by_id(user_id: UUID, db: AsyncSession = Depends(get_db)):
     )
 
 @router.post("/create-user", response_model=Response[UserCreate])
-async def create_user(payload: UserBase, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.email == payload.email))
-
-    if result.scalar_one_or_none():
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User email already exists")
-    
-    new_user = User(email=payload.email, display_name=payload.display_name)
-
-    db.add(new_user)
-    await db.commit()
-    await db.refresh(new_user)
+async def create_user(
+    payload: UserBase,
+    user_id: UUID = Depends(assign_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    # INSERT ... RETURNING: los valores por defecto del servidor vuelven en la misma sentencia.
+    # El id se asigna antes (decide el shard) y, con shards, el usuario se registra en el directorio. El email
+    # duplicado lo detecta el índice único (users_email_key) y, con shards, el directorio de emails de la base principal
+    async with user_shard_claim(user_id), user_email_claim(user_id, payload.email):
+        with constraint_errors():
+            result = await db.execute(
+                insert(User)
+                .values(id=user_id, email=payload.email, display_name=payload.display_name)
+                .returning(User)
+                .options(noload("*"))
+            )
+            new_user = result.scalar_one()
+            await db.commit()
 
     return Response(
         status="201", 
@@ -58,34 +78,42 @@ async def create_user(payload: UserBase, db: AsyncSession = Depends(get_db)):
 
 @router.put("/update-user/{user_id}", response_model=Response[UserUpdate])
 async def update_user(user_id: UUID, payload: UserUpdate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
+    changes = {}
     if payload.email:
-        user.email = payload.email
+        changes["email"] = payload.email
 
     if payload.display_name:
-        user.display_name = payload.display_name
+        changes["display_name"] = payload.display_name
 
-    await db.commit()
-    await db.refresh(user)
+    # UPDATE ... RETURNING: si no devuelve fila, el usuario no existe
+    if changes:
+        stmt = update(User).where(User.id == user_id).values(**changes).returning(User).options(noload("*"))
+    else:
+        stmt = select(User).where(User.id == user_id)
+    async with user_email_claim(user_id, changes.get("email")):
+        with constraint_errors():
+            result = await db.execute(stmt)
+        user = result.scalar_one_or_none()
+
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+        invalidate(db, user_id, "user", user_id)
+        await db.commit()
 
     return Response(status="200", data=user, message="User updated successfully")
 
 @router.delete("/delete-user/{user_id}", response_model=Response[UserRead])
 async def delete_user(user_id: UUID, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.id == user_id))
+    result = await db.execute(
+        update(User).where(User.id == user_id).values(is_active=False).returning(User).options(noload("*"))
+    )
     user = result.scalar_one_or_none()
 
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
-    user.is_active = False
 
+    invalidate(db, user_id, "user", user_id)
     await db.commit()
-    await db.refresh(user)
 
     return Response(status="200", data=user, message="User deleted successfully")
\ No newline at end of file
@@ -0,0 +1,199 @@
+import asyncio
+from contextlib import asynccontextmanager
+from collections import defaultdict
+from uuid import UUID
+
+from fastapi import HTTPException, Request, status
+
+from app.core.config import get_settings
+from app.core.sharding import MAIN_SHARD, shard_names
+
+# Rutas que se tratan como reportes (consultas pesadas) para el control de admisión
+REPORT_ROUTE_MARKERS = ("/reports/", "/dashboard/", "/ledger-dump/")
+
+REPORT = "report"
+CRUD = "crud"
+
+# Motor de la réplica de lectura en el control de admisión (los demás motores se nombran como su shard)
+REPLICA_ENGINE = "replica"
+
+# Conexiones reservadas en un motor. Cada motor (shard o réplica) tiene su propio pool y se limita por separado
+class EngineLoad:
+    def __init__(self, limit: int, report_limit: int):
+        self.limit = limit
+        # Los reportes nunca ocupan todo el pool: siempre quedan conexiones para el CRUD
+        self.report_limit = report_limit
+        self.in_use = 0
+        self.reports_in_use = 0
+
+# Reserva de una request: el usuario por el que se cuenta y las conexiones que tiene tomadas en cada motor.
+# Sin control de admisión (controller None) no cuenta nada
+class Ticket:
+    def __init__(self, controller: "AdmissionController | None", route_class: str):
+        self.controller = controller
+        self.route_class = route_class
+        self.user_key: str | None = None
+        self.charge: dict[str, tuple[int, int]] = {}
+
+    # Cuenta la request para su usuario, o la rechaza si el usuario ya tiene demasiadas en curso
+    def assign(self, request: Request, user_id: UUID | None) -> None:
+        key = user_key(request, user_id)
+        if self.controller is None or key == self.user_key:
+            return
+        self.controller._take_user(key)
+        if self.user_key is not None:
+            self.controller._release_user(self.user_key)
+        self.user_key = key
+
+    # Pasa la reserva a los motores donde se abrirán las sesiones ({motor: conexiones}). La reserva anterior se
+    # suelta antes de esperar la nueva: una request nunca retiene un motor mientras espera otro
+    async def move(self, weights: dict[str, int]) -> None:
+        if self.controller is None:
+            return
+        charge = self.controller._charge(self.route_class, weights)
+        if charge == self.charge:
+            return
+        previous, self.charge = self.charge, {}
+        await self.controller._release(previous)
+        await self.controller._acquire(self.route_class, charge)
+        self.charge = charge
+
+class AdmissionController:
+    def __init__(
+        self,
+        limits: dict[str, int],
+        report_share: float,
+        per_user_limit: int,
+        queue_budgets: dict[str, int],
+        queue_timeout: float,
+        retry_after: int,
+    ):
+        self.engines = {
+            name: EngineLoad(limit, max(1, int(limit * report_share))) for name, limit in limits.items()
+        }
+        self.per_user_limit = per_user_limit
+        self.queue_budgets = queue_budgets
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.per_user: dict[str, int] = defaultdict(int)
+        self.waiting: dict[str, int] = defaultdict(int)
+        # Una request toma todas sus conexiones de una vez: si las tomara de a una, varias requests con peso
+        # podrían retener parte del pool esperándose entre sí
+        self.available = asyncio.Condition()
+
+    def _reject(self, status_code: int, detail: str) -> HTTPException:
+        return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(self.retry_after)})
+
+    # Conexiones que cobra una request en cada motor: su peso en el total y, si es reporte, también en la cuota
+    # de reportes. Una request más pesada que el límite se cobra como el límite (entra sola, en vez de no entrar nunca)
+    def _charge(self, route_class: str, weights: dict[str, int]) -> dict[str, tuple[int, int]]:
+        charge = {}
+        for name, weight in weights.items():
+            engine = self.engines[name]
+            charge[name] = (min(weight, engine.limit), min(weight, engine.report_limit) if route_class == REPORT else 0)
+        return charge
+
+    def _fits(self, charge: dict[str, tuple[int, int]]) -> bool:
+        return all(
+            self.engines[name].in_use + total <= self.engines[name].limit
+            and self.engines[name].reports_in_use + reports <= self.engines[name].report_limit
+            for name, (total, reports) in charge.items()
+        )
+
+    # Espera cupo en la cola de su clase, o rechaza de inmediato si la cola ya está llena
+    async def _acquire(self, route_class: str, charge: dict[str, tuple[int, int]]) -> None:
+        if not self._fits(charge) and self.waiting[route_class] >= self.queue_budgets[route_class]:
+            raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Server busy, request queue is full")
+
+        self.waiting[route_class] += 1
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                async with self.available:
+                    await self.available.wait_for(lambda: self._fits(charge))
+                    for name, (total, reports) in charge.items():
+                        self.engines[name].in_use += total
+                        self.engines[name].reports_in_use += reports
+        except TimeoutError:
+            raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Server busy, queue wait exceeded")
+        finally:
+            self.waiting[route_class] -= 1
+
+    # Se descuenta antes de esperar el lock: si la tarea se cancela, la cuenta ya quedó bien
+    async def _release(self, charge: dict[str, tuple[int, int]]) -> None:
+        if not charge:
+            return
+        for name, (total, reports) in charge.items():
+            self.engines[name].in_use -= total
+            self.engines[name].reports_in_use -= reports
+        async with self.available:
+            self.available.notify_all()
+
+    def _take_user(self, user_key: str) -> None:
+        if self.per_user[user_key] >= self.per_user_limit:
+            raise self._reject(status.HTTP_429_TOO_MANY_REQUESTS, "Too many concurrent requests for this user")
+        self.per_user[user_key] += 1
+
+    def _release_user(self, user_key: str) -> None:
+        self.per_user[user_key] -= 1
+        if self.per_user[user_key] <= 0:
+            del self.per_user[user_key]
+
+    # Reserva conexiones para la request ({motor: conexiones}) y la cuenta para su usuario al asignarlo
+    @asynccontextmanager
+    async def admit(self, route_class: str, weights: dict[str, int]):
+        ticket = Ticket(self, route_class)
+        try:
+            charge = self._charge(route_class, weights)
+            await self._acquire(route_class, charge)
+            ticket.charge = charge
+            yield ticket
+        finally:
+            await self._release(ticket.charge)
+            if ticket.user_key is not None:
+                self._release_user(ticket.user_key)
+
+controller: AdmissionController | None = None
+
+def init_admission() -> None:
+    global controller
+
+    settings = get_settings()
+    if not settings.ADMISSION_ENABLED:
+        controller = None
+        return
+
+    # El límite de cada motor es el tamaño de su pool: más requests en paralelo solo esperarían pool_timeout
+    limit = settings.PG_POOL_SIZE + settings.PG_MAX_OVERFLOW
+    names = shard_names() + ([REPLICA_ENGINE] if settings.get_replica_db_url else [])
+    controller = AdmissionController(
+        limits={name: limit for name in names},
+        report_share=settings.ADMISSION_REPORT_SHARE,
+        per_user_limit=settings.ADMISSION_PER_USER_LIMIT,
+        queue_budgets={REPORT: settings.ADMISSION_REPORT_QUEUE, CRUD: settings.ADMISSION_CRUD_QUEUE},
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+        retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS,
+    )
+
+def route_class(request: Request) -> str:
+    path = request.url.path
+    return REPORT if any(marker in path for marker in REPORT_ROUTE_MARKERS) else CRUD
+
+def admission_enabled() -> bool:
+    return controller is not None
+
+# Se limita por el usuario dueño de la request (resuelto por db.request_user: ruta, query, body o entidad);
+# solo si no se pudo determinar, por cliente
+def user_key(request: Request, user_id: UUID | None = None) -> str:
+    if user_id is not None:
+        return f"user:{user_id}"
+    return f"client:{request.client.host if request.client else 'unknown'}"
+
+# Admite la request con una reserva inicial (por defecto una conexión de la base principal, donde están el
+# directorio y los usuarios sin shard). La ruta asigna el usuario y mueve la reserva con el ticket
+@asynccontextmanager
+async def admit(request: Request, weights: dict[str, int] | None = None):
+    if controller is None:
+        yield Ticket(None, route_class(request))
+        return
+    async with controller.admit(route_class(request), weights or {MAIN_SHARD: 1}) as ticket:
+        yield ticket
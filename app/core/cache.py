@@ -0,0 +1,148 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.notify import NOTIFY_SQL, WORKER_ID, register_channel
+
+CHANNEL = "nexaris_invalidate"
+# Invalidaciones pendientes de una transacción: se notifican solo si hace commit
+PENDING_KEY = "cache_invalidations"
+# pg_notify admite hasta 8000 bytes por mensaje: las invalidaciones se envían en grupos
+NOTIFY_CHUNK = 50
+# Marca de las sesiones de la réplica (la pone app/core/db.py): lo que leen no se guarda en la caché
+REPLICA_KEY = "replica"
+
+# Lo que cambia una entidad también deja obsoletas las entradas de estas otras (del mismo usuario)
+DEPENDENTS = {
+    "user": (),
+    # Ubicación del usuario en el directorio de shards
+    "shard": (),
+    "account": ("report",),
+    "entry": ("report",),
+}
+
+# Caché en memoria del proceso, agrupada por (usuario, entidad). Dentro de un grupo, las claves
+# str son ids de una fila y las tuplas son listados o reportes que pueden incluir cualquier fila.
+# Quien lee toma un token() antes de consultar: si el grupo se invalidó mientras tanto, set() no guarda
+# el valor (podría ser anterior a la escritura). Con una sesión de la réplica no hay token: la réplica
+# puede no haber reproducido aún la escritura cuya invalidación ya llegó, y se guardaría el valor anterior
+class LocalCache:
+    def __init__(self):
+        self.buckets: OrderedDict[tuple[str, str], dict[Hashable, tuple[float, Any]]] = OrderedDict()
+        self.size = 0
+        self.clock = 0
+        # Momento de la última invalidación de cada grupo; los olvidados cuentan como invalidados en floor
+        self.dropped: OrderedDict[tuple[str, str], int] = OrderedDict()
+        self.floor = 0
+
+    def token(self, session: AsyncSession | None = None) -> int | None:
+        if session is not None and session.info.get(REPLICA_KEY):
+            return None
+        return self.clock
+
+    def get(self, user_id, entity: str, key: Hashable) -> Any | None:
+        if not get_settings().CACHE_ENABLED:
+            return None
+        bucket = self.buckets.get((str(user_id), entity))
+        if not bucket or key not in bucket:
+            return None
+        expires_at, value = bucket[key]
+        if expires_at < time.monotonic():
+            del bucket[key]
+            self.size -= 1
+            return None
+        return value
+
+    def set(self, user_id, entity: str, key: Hashable, value: Any, token: int | None) -> None:
+        settings = get_settings()
+        if not settings.CACHE_ENABLED or token is None:
+            return
+        group = (str(user_id), entity)
+        if self.dropped.get(group, self.floor) > token:
+            return
+        bucket = self.buckets.setdefault(group, {})
+        self.size += key not in bucket
+        bucket[key] = (time.monotonic() + settings.CACHE_TTL_SECONDS, value)
+        # Lleno: se descartan primero los grupos más antiguos
+        while self.size > settings.CACHE_MAX_ENTRIES and len(self.buckets) > 1:
+            _, oldest = self.buckets.popitem(last=False)
+            self.size -= len(oldest)
+
+    def _drop(self, user_id: str, entity: str, entity_id: str | None) -> None:
+        group = (user_id, entity)
+        self.clock += 1
+        self.dropped[group] = self.clock
+        self.dropped.move_to_end(group)
+        while len(self.dropped) > get_settings().CACHE_MAX_ENTRIES:
+            _, dropped_at = self.dropped.popitem(last=False)
+            self.floor = max(self.floor, dropped_at)
+
+        bucket = self.buckets.get(group)
+        if not bucket:
+            return
+        if entity_id is None:
+            stale = list(bucket)
+        else:
+            stale = [key for key in bucket if key == entity_id or isinstance(key, tuple)]
+        for key in stale:
+            del bucket[key]
+        self.size -= len(stale)
+
+    # Saca la fila (o todo el grupo si no hay id), los listados de la entidad y lo que depende de ella
+    def evict(self, user_id, entity: str, entity_id=None) -> None:
+        user_id = str(user_id)
+        self._drop(user_id, entity, str(entity_id) if entity_id is not None else None)
+        for dependent in DEPENDENTS.get(entity, ()):
+            self._drop(user_id, dependent, None)
+
+    def clear(self) -> None:
+        self.buckets.clear()
+        self.size = 0
+        self.clock += 1
+        self.dropped.clear()
+        self.floor = self.clock
+
+cache = LocalCache()
+
+# Marca (usuario, entidad, id) como modificado en la transacción de la sesión
+def invalidate(session: AsyncSession | Session, user_id, entity: str, entity_id=None) -> None:
+    if not get_settings().CACHE_ENABLED:
+        return
+    target = session.sync_session if isinstance(session, AsyncSession) else session
+    target.info.setdefault(PENDING_KEY, []).append(
+        [str(user_id), entity, str(entity_id) if entity_id is not None else None]
+    )
+
+# NOTIFY es transaccional: se envía dentro de la transacción y PostgreSQL lo entrega solo si confirma
+@event.listens_for(Session, "before_commit")
+def _notify_pending(session: Session) -> None:
+    pending = session.info.get(PENDING_KEY)
+    if not pending:
+        return
+    for start in range(0, len(pending), NOTIFY_CHUNK):
+        payload = json.dumps({"origin": WORKER_ID, "items": pending[start:start + NOTIFY_CHUNK]})
+        session.execute(NOTIFY_SQL, {"channel": CHANNEL, "payload": payload})
+
+@event.listens_for(Session, "after_commit")
+def _evict_pending(session: Session) -> None:
+    for user_id, entity, entity_id in session.info.pop(PENDING_KEY, []):
+        cache.evict(user_id, entity, entity_id)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    session.info.pop(PENDING_KEY, None)
+
+def apply_notification(payload: str) -> None:
+    message = json.loads(payload)
+    if message.get("origin") == WORKER_ID:
+        return
+    for user_id, entity, entity_id in message["items"]:
+        cache.evict(user_id, entity, entity_id)
+
+register_channel(CHANNEL, apply_notification, cache.clear)
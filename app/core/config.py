@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pathlib import Path
 from pydantic_settings import BaseSettings
 
@@ -18,6 +19,108 @@ class Settings(BaseSettings):
     PG_PORT: int = 5432
     PG_SCHEMA: str = 'sys'
 
+    # Réplica de solo lectura (opcional). Si no se define, las lecturas van al primario
+    PG_REPLICA_HOST: str | None = None
+    PG_REPLICA_PORT: int | None = None
+    # Retraso máximo tolerado (segundos) antes de volver al primario
+    PG_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    # Cada cuánto (segundos) se vuelve a medir el retraso de la réplica
+    PG_REPLICA_LAG_CHECK_INTERVAL: float = 1.0
+
+    # Pool de conexiones
+    PG_ECHO: bool = True
+    PG_POOL_SIZE: int = 5
+    PG_MAX_OVERFLOW: int = 10
+    PG_POOL_TIMEOUT: float = 30.0
+    # Conexiones que se abren al arrancar (no puede superar PG_POOL_SIZE)
+    PG_POOL_WARMUP: int = 5
+
+    # Control de admisión delante del pool (límite global = PG_POOL_SIZE + PG_MAX_OVERFLOW)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_PER_USER_LIMIT: int = 4
+    # Fracción del límite global que pueden ocupar los reportes
+    ADMISSION_REPORT_SHARE: float = 0.5
+    # Requests que pueden esperar turno por tipo de ruta antes de responder 503
+    ADMISSION_REPORT_QUEUE: int = 10
+    ADMISSION_CRUD_QUEUE: int = 50
+    # Espera máxima en cola (debe ser menor que PG_POOL_TIMEOUT)
+    ADMISSION_QUEUE_TIMEOUT: float = 5.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+
+    # Timeouts de sentencias (ms). El de conexión es el de las requests sin timeout propio
+    STATEMENT_TIMEOUT_MS: int = 5000
+    # Timeouts por ruta (el marcador se busca dentro de la ruta)
+    STATEMENT_TIMEOUT_ROUTES: dict[str, int] = {"/reports/": 20000, "/import/": 30000, "/ledger-dump/": 120000}
+    # Tareas de fondo (materialización de recurrentes, etc.)
+    STATEMENT_TIMEOUT_BACKGROUND_MS: int = 120000
+
+    # Log de sentencias lentas
+    SLOW_QUERY_MS: int = 500
+    # Fracción de sentencias lentas (solo SELECT) de las que se guarda EXPLAIN (ANALYZE, BUFFERS)
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.0
+    SLOW_QUERY_EXPLAIN_FILE: str = "logs/slow_query_plans.jsonl"
+
+    # Transacciones recurrentes
+    RECURRING_SCHEDULER_ENABLED: bool = True
+    RECURRING_INTERVAL_SECONDS: int = 3600
+    RECURRING_BATCH_SIZE: int = 500
+
+    # Archivado de filas eliminadas (soft delete) a las tablas *_archive
+    ARCHIVE_ENABLED: bool = True
+    ARCHIVE_RETENTION_DAYS: int = 90
+    ARCHIVE_BATCH_SIZE: int = 500
+    ARCHIVE_INTERVAL_SECONDS: int = 3600
+
+    # Importación de extractos: movimientos por transacción
+    IMPORT_BATCH_SIZE: int = 500
+
+    # Canal de actualizaciones en vivo (WebSocket/SSE) por usuario
+    # Eventos que puede acumular una conexión lenta antes de descartarlos y pedirle resincronizar
+    PUSH_BUFFER_SIZE: int = 100
+    PUSH_MAX_CONNECTIONS_PER_USER: int = 5
+    # Cada cuánto se envía un latido a una conexión sin eventos
+    PUSH_HEARTBEAT_SECONDS: float = 15.0
+
+    # Caché en memoria por proceso (usuarios, cuentas, reportes), invalidada entre workers con LISTEN/NOTIFY
+    CACHE_ENABLED: bool = True
+    # Tope de vida de una entrada (también cubre reportes que dependen de la hora actual)
+    CACHE_TTL_SECONDS: float = 60.0
+    CACHE_MAX_ENTRIES: int = 10000
+
+    # Perfilado por request (pyinstrument): archivo speedscope con el desglose base de datos / Python
+    PROFILING_ENABLED: bool = False
+    # Perfila las requests con la cabecera X-Profile igual a este token
+    PROFILING_TOKEN: str | None = None
+    # Perfila todas las requests cuya ruta contenga alguno de estos marcadores (solo para desarrollo)
+    PROFILING_ROUTES: list[str] = []
+    PROFILING_INTERVAL_MS: float = 1.0
+    PROFILING_DIR: str = "logs/profiles"
+
+    # Reconstrucción de proyecciones desde ledger_event: procesos del pool (0 = núcleos disponibles)
+    PROJECTION_WORKERS: int = 0
+    # Particiones de usuarios (por hash de user_id); cada una se reconstruye en su propia transacción
+    PROJECTION_PARTITIONS: int = 32
+
+    # Conciliación bancaria: días de diferencia tolerados entre el extracto y el asiento
+    RECONCILIATION_TOLERANCE_DAYS: int = 3
+
+    # Volcado/importación de un usuario: filas por bloque comprimido (acota la memoria de ambos lados)
+    DUMP_ROW_GROUP_SIZE: int = 10000
+
+    # Exportación de reportes a XLSX/PDF: procesos que los generan y documentos en espera antes de responder 503
+    REPORT_RENDER_WORKERS: int = 2
+    REPORT_RENDER_MAX_PENDING: int = 8
+    # Memoria para los documentos ya generados (por versión del libro del usuario)
+    REPORT_DOCUMENT_CACHE_MB: int = 64
+
+    # Sugerencias de cuentas: cada uso pesa la mitad cada SUGGESTION_HALF_LIFE_DAYS; los anteriores a la ventana no cuentan
+    SUGGESTION_HALF_LIFE_DAYS: float = 30.0
+    SUGGESTION_WINDOW_DAYS: int = 365
+
+    # Shards adicionales por usuario (nombre -> "host:puerto/base", mismas credenciales que PG_HOST).
+    # La base principal es el shard "main" y guarda el directorio usuario -> shard. Vacío: sin shards
+    PG_SHARDS: dict[str, str] = {}
+
     class Config:
         env_file = Path(__file__).resolve().parent.parent.parent / ".env"
 
@@ -28,6 +131,17 @@ class Settings(BaseSettings):
             f"@{self.PG_HOST}:{self.PG_PORT}/{self.PG_DATABASE}"
         )
 
+    @property
+    def get_replica_db_url(self) -> str | None:
+        if not self.PG_REPLICA_HOST:
+            return None
+        return (
+            f"postgresql+psycopg://{self.PG_USER}:{self.PG_PASSWORD}"
+            f"@{self.PG_REPLICA_HOST}:{self.PG_REPLICA_PORT or self.PG_PORT}/{self.PG_DATABASE}"
+        )
+
 
-settings = Settings()
-# print(settings.APP_NAME)
\ No newline at end of file
+# La configuración se lee la primera vez que se necesita, no al importar el módulo
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
@@ -1,16 +1,509 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Awaitable, Callable, TypeVar
+from uuid import UUID, uuid4
 
-from app.core.config import settings
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Executable
 
-engine = create_async_engine(settings.get_db_url, echo=True)
+from app.core.admission import REPLICA_ENGINE, Ticket, admission_enabled, admit
+from app.core.cache import REPLICA_KEY, cache, invalidate
+from app.core.config import get_settings
+from app.core.query_log import current_route, instrument, route_statement_timeout
+from app.core.errors import CONSTRAINT_ERRORS
+from app.core.sharding import (
+    CLAIM_EMAIL_SQL,
+    DIRECTORY_SQL,
+    ENTITY_OWNER_SQL,
+    MAIN_SHARD,
+    MOVE_LOCK_SQL,
+    MOVED_USER_SQL,
+    PRUNE_EMAILS_SQL,
+    REGISTER_SQL,
+    RELEASE_EMAIL_SQL,
+    SHARD_LOCK_CLASS,
+    UNREGISTER_SQL,
+    USER_LOCK_CLASS,
+    UserMovedError,
+    entity_owners,
+    hash_shard,
+    shard_names,
+    shard_url,
+    sharding_enabled,
+)
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# Los motores y sesiones se crean en el lifespan de la app (init_engines), no al importar
+engine: AsyncEngine | None = None
+# Motor de la réplica de solo lectura (si está configurada)
+replica_engine: AsyncEngine | None = None
+
+AsyncSessionLocal: async_sessionmaker[AsyncSession] | None = None
+ReadSessionLocal: async_sessionmaker[AsyncSession] | None = None
 
-AsyncSessionLocal = async_sessionmaker(
-    bind=engine,
-    expire_on_commit=False,
-    class_=AsyncSession,
+# Un motor (y su pool) por shard; el de MAIN_SHARD es `engine`
+engines: dict[str, AsyncEngine] = {}
+session_factories: dict[str, async_sessionmaker[AsyncSession]] = {}
+
+# Marca de la última escritura del cliente (read-your-writes)
+LAST_WRITE_HEADER = "X-Last-Write"
+LAST_WRITE_COOKIE = "nx_last_write"
+
+# Retraso de la réplica en segundos. Cero cuando ya reprodujo todo el WAL recibido
+REPLICA_LAG_SQL = text(
+    "SELECT CASE "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
 )
 
-# Funcion para obtener la session de la base de datos
-async def get_db():
+_replica_lag = {"checked_at": float("-inf"), "seconds": 0.0}
+
+# Id que no existe, usado para ejecutar las sentencias de precalentamiento
+WARMUP_ID = UUID(int=0)
+
+# Sentencias calientes que se compilan (y ejecutan en vacío) al arrancar
+_warmup_statements: list[Callable[[], Executable]] = []
+
+def register_warmup(factory: Callable[[], Executable]) -> None:
+    _warmup_statements.append(factory)
+
+def _create_engine(url: str) -> AsyncEngine:
+    settings = get_settings()
+    created = create_async_engine(
+        url,
+        echo=settings.PG_ECHO,
+        pool_size=settings.PG_POOL_SIZE,
+        max_overflow=settings.PG_MAX_OVERFLOW,
+        pool_timeout=settings.PG_POOL_TIMEOUT,
+        # Las tablas se resuelven por search_path, así los modelos no dependen de la configuración.
+        # statement_timeout de conexión: las rutas con el timeout por defecto no pagan un SET extra
+        connect_args={
+            "options": f"-csearch_path={settings.PG_SCHEMA},public -cstatement_timeout={settings.STATEMENT_TIMEOUT_MS}"
+        },
+    )
+    instrument(created)
+    return created
+
+# Aplica el timeout propio de la sesión (si difiere del de conexión) al empezar cada transacción.
+# SET LOCAL y no SET: el rollback al devolver la conexión al pool desharía un SET de sesión
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    timeout = session.info.get("statement_timeout")
+    if timeout and timeout != get_settings().STATEMENT_TIMEOUT_MS:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+# Con shards, cada transacción toma compartido el lock de traslado de su usuario (o del shard, en las
+# tareas de fondo): un traslado lo toma exclusivo y espera a las escrituras en curso. Si al obtenerlo
+# el usuario ya se fue de este shard, la transacción no sigue (el cliente reintenta y llega al nuevo)
+@event.listens_for(Session, "after_begin")
+def _take_move_lock(session, transaction, connection):
+    lock = session.info.get("move_lock")
+    if lock is None:
+        return
+    lock_class, lock_key = lock
+    connection.execute(MOVE_LOCK_SQL, {"lock_class": lock_class, "lock_key": lock_key})
+    if lock_class == USER_LOCK_CLASS and connection.execute(MOVED_USER_SQL, {"user_id": lock_key}).scalar():
+        raise UserMovedError(lock_key)
+
+def _session_info(statement_timeout: int, user_id: UUID | None = None, background: bool = False) -> dict:
+    info = {"statement_timeout": statement_timeout}
+    if sharding_enabled():
+        if background:
+            info["move_lock"] = (SHARD_LOCK_CLASS, "")
+        elif user_id is not None:
+            info["move_lock"] = (USER_LOCK_CLASS, str(user_id))
+    return info
+
+# Sesión de una request: guarda la ruta para el log de lentas y su statement_timeout
+def _request_session(
+    factory: async_sessionmaker[AsyncSession], request: Request, user_id: UUID | None = None
+) -> AsyncSession:
+    route = getattr(request.scope.get("route"), "path", request.url.path)
+    current_route.set(route)
+    info = _session_info(route_statement_timeout(route), user_id)
+    if factory is ReadSessionLocal and replica_engine is not None:
+        info[REPLICA_KEY] = True
+    return factory(info=info)
+
+def init_engines() -> None:
+    global engine, replica_engine, AsyncSessionLocal, ReadSessionLocal
+
+    settings = get_settings()
+    engine = _create_engine(settings.get_db_url)
+    replica_engine = _create_engine(settings.get_replica_db_url) if settings.get_replica_db_url else None
+
+    AsyncSessionLocal = async_sessionmaker(
+        bind=engine,
+        expire_on_commit=False,
+        class_=AsyncSession,
+    )
+
+    engines[MAIN_SHARD] = engine
+    session_factories[MAIN_SHARD] = AsyncSessionLocal
+    for name in shard_names()[1:]:
+        engines[name] = _create_engine(shard_url(name))
+        session_factories[name] = async_sessionmaker(
+            bind=engines[name],
+            expire_on_commit=False,
+            class_=AsyncSession,
+        )
+
+    ReadSessionLocal = async_sessionmaker(
+        bind=replica_engine or engine,
+        expire_on_commit=False,
+        class_=AsyncSession,
+    )
+
+async def dispose_engines() -> None:
+    global engine, replica_engine, AsyncSessionLocal, ReadSessionLocal
+
+    for current in (*engines.values(), replica_engine):
+        if current is not None:
+            await current.dispose()
+
+    engine = replica_engine = None
+    AsyncSessionLocal = ReadSessionLocal = None
+    engines.clear()
+    session_factories.clear()
+
+async def _warm_connection(target: AsyncEngine, statements: list[Executable]) -> None:
+    async with target.connect() as conn:
+        # La primera conexión compila las sentencias; el resto solo abre el socket (TLS/SCRAM)
+        for stmt in statements:
+            await conn.execute(stmt)
+        await conn.rollback()
+
+# Abre conexiones del pool en paralelo y deja compiladas las sentencias calientes
+async def warm_up_engines() -> None:
+    settings = get_settings()
+    statements = [factory() for factory in _warmup_statements]
+    size = max(1, min(settings.PG_POOL_WARMUP, settings.PG_POOL_SIZE))
+
+    async def warm(target: AsyncEngine) -> None:
+        # Checkouts concurrentes para que cada uno abra una conexión distinta
+        await asyncio.gather(
+            _warm_connection(target, statements),
+            *(_warm_connection(target, []) for _ in range(size - 1)),
+        )
+
+    for target in engines.values():
+        await warm(target)
+    # Una réplica caída no bloquea el arranque: las lecturas caen al primario hasta que vuelva
+    if replica_engine is not None:
+        try:
+            await warm(replica_engine)
+        except (DBAPIError, OSError) as exc:
+            logger.warning("Replica warm-up failed, reads will use the primary: %s", exc)
+
+# Sesión para tareas de fondo (de un shard), con su propio statement_timeout
+def background_session(shard: str = MAIN_SHARD) -> AsyncSession:
+    return session_factories[shard](
+        info=_session_info(get_settings().STATEMENT_TIMEOUT_BACKGROUND_MS, background=True)
+    )
+
+# Sesión en un shard sin lock de traslado (la usa el propio traslado, que toma los suyos)
+def shard_session(shard: str) -> AsyncSession:
+    return session_factories[shard](info={"statement_timeout": get_settings().STATEMENT_TIMEOUT_BACKGROUND_MS})
+
+# Ejecuta fn(session) en cada shard a la vez (tareas de fondo y de administración). Devuelve {shard: resultado}
+async def for_each_shard(fn: Callable[[AsyncSession], Awaitable[T]]) -> dict[str, T]:
+    async def run(shard: str) -> T:
+        async with background_session(shard) as session:
+            return await fn(session)
+
+    names = shard_names()
+    return dict(zip(names, await asyncio.gather(*(run(name) for name in names))))
+
+# Ubicación de un usuario según el directorio: (shard, se está trasladando).
+# Sin shards, o si el usuario no figura (anterior al directorio), es la base principal
+async def user_location(user_id: UUID) -> tuple[str, bool]:
+    if not sharding_enabled():
+        return MAIN_SHARD, False
+    location = cache.get(user_id, "shard", "location")
+    if location is None:
+        token = cache.token()
+        async with AsyncSessionLocal() as session:
+            row = (await session.execute(DIRECTORY_SQL, {"user_id": user_id})).one_or_none()
+        location = (row.shard, row.moving) if row else (MAIN_SHARD, False)
+        cache.set(user_id, "shard", "location", location, token)
+    return location
+
+# Shard en el que se atienden las requests de un usuario; durante su traslado se responde 503
+async def user_shard(user_id: UUID) -> str:
+    shard, moving = await user_location(user_id)
+    if moving:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="User is being moved to another shard",
+            headers={"Retry-After": str(get_settings().ADMISSION_RETRY_AFTER_SECONDS)},
+        )
+    return shard
+
+async def _unregister_user_shard(user_id: UUID) -> None:
     async with AsyncSessionLocal() as session:
-        yield session
+        await session.execute(UNREGISTER_SQL, {"user_id": user_id})
+        invalidate(session, user_id, "shard")
+        await session.commit()
+
+# Da de alta a un usuario nuevo en el directorio (por hash de su id) y entrega su shard. El directorio se escribe
+# antes que el usuario; si el alta falla, la fila nueva se borra (como la reserva del email)
+@asynccontextmanager
+async def user_shard_claim(user_id: UUID):
+    if not sharding_enabled():
+        yield MAIN_SHARD
+        return
+
+    async with AsyncSessionLocal() as session:
+        row = (await session.execute(REGISTER_SQL, {"user_id": user_id, "shard": hash_shard(user_id)})).one()
+        invalidate(session, user_id, "shard")
+        await session.commit()
+    if row.moving:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="User already exists")
+
+    try:
+        yield row.shard
+    except BaseException:
+        if row.claimed:
+            await _unregister_user_shard(user_id)
+        raise
+
+async def _release_email(user_id: UUID, email: str) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(RELEASE_EMAIL_SQL, {"email": email, "user_id": user_id})
+        await session.commit()
+
+# Con shards, el email de un usuario se reserva en el directorio de la base principal antes de escribirlo en
+# su shard (el índice único de users solo ve los emails de ese shard). Si la escritura falla, la reserva
+# nueva se libera; si sale bien, se liberan los emails anteriores del usuario
+@asynccontextmanager
+async def user_email_claim(user_id: UUID, email: str | None):
+    if not sharding_enabled() or not email:
+        yield
+        return
+
+    async with AsyncSessionLocal() as session:
+        row = (await session.execute(CLAIM_EMAIL_SQL, {"email": email, "user_id": user_id})).one_or_none()
+        await session.commit()
+    if row is None:
+        status_code, detail = CONSTRAINT_ERRORS["users_email_key"]
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    try:
+        yield
+    except BaseException:
+        if row.claimed:
+            await _release_email(user_id, email)
+        raise
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(PRUNE_EMAILS_SQL, {"email": email, "user_id": user_id})
+        await session.commit()
+
+def _parse_uuid(value) -> UUID | None:
+    if value is None:
+        return None
+    try:
+        return UUID(str(value))
+    except ValueError:
+        return None
+
+# Dueño de una entidad: se busca en todos los shards a la vez la primera vez
+async def _entity_owner(param: str, entity_id: UUID) -> UUID | None:
+    owner = entity_owners.get(param, entity_id)
+    if owner is not None:
+        return owner
+
+    async def locate(shard: str) -> UUID | None:
+        async with session_factories[shard]() as session:
+            return (await session.execute(ENTITY_OWNER_SQL[param], {"id": entity_id})).scalar()
+
+    owner = next((found for found in await asyncio.gather(*(locate(name) for name in shard_names())) if found), None)
+    if owner is not None:
+        entity_owners.set(param, entity_id, owner)
+    return owner
+
+# Usuario de una request: el asignado por la propia request, el user_id de la ruta, de la query o del
+# body JSON y, si no hay, el dueño de la entidad de la ruta o del body (cuenta, asiento, línea, ...)
+async def request_user(request: Request) -> UUID | None:
+    user_id = getattr(request.state, "user_id", None)
+    if user_id is not None:
+        return user_id
+
+    body = {}
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = await request.json()
+        except ValueError:
+            body = {}
+        if not isinstance(body, dict):
+            body = {}
+
+    for source in (request.path_params, request.query_params, body):
+        user_id = _parse_uuid(source.get("user_id"))
+        if user_id is not None:
+            return user_id
+
+    for source in (request.path_params, body):
+        for param in ENTITY_OWNER_SQL:
+            entity_id = _parse_uuid(source.get(param))
+            if entity_id is not None:
+                return await _entity_owner(param, entity_id)
+    return None
+
+# Usuario de una request para el control de admisión y para elegir su shard; sin ninguno de los dos no se busca
+async def _admission_user(request: Request) -> UUID | None:
+    if not sharding_enabled() and not admission_enabled():
+        return None
+    return await request_user(request)
+
+# Shard de una request: el del directorio, el que le toca por hash a un usuario que se está dando de alta
+# (todavía no figura en el directorio), o la base principal si no se pudo determinar el usuario
+async def _request_shard(request: Request, user_id: UUID | None) -> str:
+    if not sharding_enabled() or user_id is None:
+        return MAIN_SHARD
+    if getattr(request.state, "new_user", False):
+        return hash_shard(user_id)
+    return await user_shard(user_id)
+
+# Admite la request y resuelve su usuario y su shard. Lo que puede tocar la base para resolverlos (leer el body,
+# el directorio, buscar al dueño de una entidad en todos los shards) corre ya con la reserva inicial del control
+# de admisión; después se aplica el límite del usuario. La ruta mueve la reserva al motor de sus sesiones
+@asynccontextmanager
+async def _admitted(request: Request):
+    async with admit(request) as ticket:
+        user_id = await _admission_user(request)
+        shard = await _request_shard(request, user_id)
+        ticket.assign(request, user_id)
+        yield ticket, user_id, shard
+
+# Funcion para obtener la session de la base de datos (tras pasar el control de admisión), en el shard del usuario
+async def get_db(request: Request):
+    async with _admitted(request) as (ticket, user_id, shard):
+        await ticket.move({shard: 1})
+        async with _request_session(session_factories[shard], request, user_id) as session:
+            yield session
+
+# Sesión en el shard de un usuario que todavía no está en la request (p. ej. el de un volcado a importar),
+# dentro de la admisión que la ruta ya tomó. new: el usuario se da de alta ahora y se registra en el directorio
+@asynccontextmanager
+async def user_session(request: Request, ticket: Ticket, user_id: UUID, new: bool = False):
+    ticket.assign(request, user_id)
+    async with AsyncExitStack() as stack:
+        shard = await stack.enter_async_context(user_shard_claim(user_id)) if new else await user_shard(user_id)
+        await ticket.move({shard: 1})
+        async with _request_session(session_factories[shard], request, user_id) as session:
+            yield session
+
+# Asigna el id de un usuario nuevo antes de abrir la sesión (su shard sale del hash del id). No escribe nada:
+# la ruta lo da de alta en el directorio con user_shard_claim, con el body ya validado y la request admitida
+async def assign_user_id(request: Request) -> UUID:
+    user_id = uuid4()
+    request.state.user_id = user_id
+    request.state.new_user = True
+    return user_id
+
+# Una sesión por shard, para las rutas que recorren a todos los usuarios
+async def get_shard_sessions(request: Request):
+    names = shard_names()
+    async with admit(request, {name: 1 for name in names}) as ticket, AsyncExitStack() as stack:
+        ticket.assign(request, None)
+        yield {name: await stack.enter_async_context(_request_session(session_factories[name], request)) for name in names}
+
+# Sesión para una respuesta en streaming: las dependencias con yield se cierran antes de enviar el cuerpo,
+# así que la ruta la abre (AsyncExitStack) y el generador la cierra al terminar
+@asynccontextmanager
+async def streaming_session(request: Request):
+    async with _admitted(request) as (ticket, user_id, shard):
+        await ticket.move({shard: 1})
+        async with _request_session(session_factories[shard], request, user_id) as session:
+            yield session
+
+# Marca la respuesta de una escritura para que las siguientes lecturas del cliente vayan al primario
+def mark_last_write(response: Response) -> None:
+    now = f"{time.time():.3f}"
+    response.headers[LAST_WRITE_HEADER] = now
+    response.set_cookie(
+        LAST_WRITE_COOKIE,
+        now,
+        max_age=max(1, int(get_settings().PG_REPLICA_MAX_LAG_SECONDS) + 1),
+        httponly=True,
+    )
+
+def _wrote_recently(request: Request) -> bool:
+    raw = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    if not raw:
+        return False
+    try:
+        last_write = float(raw)
+    except ValueError:
+        return False
+    return time.time() - last_write < get_settings().PG_REPLICA_MAX_LAG_SECONDS
+
+async def _replica_is_fresh(session: AsyncSession) -> bool:
+    settings = get_settings()
+    # Se mide el retraso como mucho una vez por intervalo para no sumar una consulta por request
+    now = time.monotonic()
+    if now - _replica_lag["checked_at"] >= settings.PG_REPLICA_LAG_CHECK_INTERVAL:
+        try:
+            result = await session.execute(REPLICA_LAG_SQL)
+            _replica_lag["seconds"] = float(result.scalar() or 0)
+        except DBAPIError:
+            # Réplica caída o inaccesible: se trata como desfasada
+            _replica_lag["seconds"] = float("inf")
+            await session.rollback()
+        _replica_lag["checked_at"] = now
+    return _replica_lag["seconds"] <= settings.PG_REPLICA_MAX_LAG_SECONDS
+
+# Funcion para obtener una session de solo lectura (réplica si está al día, si no el primario).
+# La réplica es la de la base principal: los usuarios de otros shards leen de su primario
+async def get_read_db(request: Request):
+    async with _admitted(request) as (ticket, user_id, shard):
+        if replica_engine is None or shard != MAIN_SHARD or _wrote_recently(request):
+            await ticket.move({shard: 1})
+            async with _request_session(session_factories[shard], request, user_id) as session:
+                yield session
+            return
+
+        await ticket.move({REPLICA_ENGINE: 1})
+        async with _request_session(ReadSessionLocal, request) as session:
+            if await _replica_is_fresh(session):
+                yield session
+                return
+
+        await ticket.move({MAIN_SHARD: 1})
+        async with _request_session(AsyncSessionLocal, request) as session:
+            yield session
+
+# Varias sesiones de lectura para lanzar consultas en paralelo (asyncio.gather), cada una en su conexión.
+# La request reserva `count` conexiones en el control de admisión y todas leen del mismo origen
+def get_read_sessions(count: int):
+    async def dependency(request: Request):
+        async with _admitted(request) as (ticket, user_id, shard), AsyncExitStack() as stack:
+            factory = session_factories[shard]
+            sessions = []
+            if replica_engine is not None and shard == MAIN_SHARD and not _wrote_recently(request):
+                await ticket.move({REPLICA_ENGINE: count})
+                probe = await stack.enter_async_context(_request_session(ReadSessionLocal, request, user_id))
+                if await _replica_is_fresh(probe):
+                    factory = ReadSessionLocal
+                    sessions.append(probe)
+                else:
+                    await probe.close()
+
+            if factory is not ReadSessionLocal:
+                await ticket.move({shard: count})
+            while len(sessions) < count:
+                sessions.append(await stack.enter_async_context(_request_session(factory, request, user_id)))
+            yield sessions
+
+    return dependency
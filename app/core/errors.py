@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+
+# Restricciones de la base de datos -> respuesta de la API.
+# La base de datos valida unicidad y existencia en la misma sentencia de escritura (sin SELECT previos)
+CONSTRAINT_ERRORS: dict[str, tuple[int, str]] = {
+    "users_email_key": (status.HTTP_400_BAD_REQUEST, "User email already exists"),
+    "uq_ledger_account_user_name": (status.HTTP_400_BAD_REQUEST, "Account with this name already exists for this user"),
+    "ledger_account_parent_id_fkey": (status.HTTP_404_NOT_FOUND, "Parent account not found"),
+    "ledger_account_user_id_fkey": (status.HTTP_404_NOT_FOUND, "User not found"),
+    "journal_entry_user_id_fkey": (status.HTTP_404_NOT_FOUND, "User not found"),
+    "recurring_template_user_id_fkey": (status.HTTP_404_NOT_FOUND, "User not found"),
+    "journal_line_entry_id_fkey": (status.HTTP_404_NOT_FOUND, "Journal entry not found"),
+    "journal_line_account_id_fkey": (status.HTTP_404_NOT_FOUND, "Account not found"),
+    "uq_category_user_name": (status.HTTP_400_BAD_REQUEST, "Category with this name already exists for this user"),
+    "category_user_id_fkey": (status.HTTP_404_NOT_FOUND, "User not found"),
+}
+
+def constraint_name(exc: IntegrityError) -> str | None:
+    diag = getattr(exc.orig, "diag", None)
+    return getattr(diag, "constraint_name", None)
+
+# Traduce las violaciones de restricciones conocidas a HTTPException; el resto se propaga tal cual
+@contextmanager
+def constraint_errors():
+    try:
+        yield
+    except IntegrityError as exc:
+        mapped = CONSTRAINT_ERRORS.get(constraint_name(exc))
+        if mapped is None:
+            raise
+        status_code, detail = mapped
+        raise HTTPException(status_code=status_code, detail=detail) from exc
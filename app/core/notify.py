@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import os
+import uuid
+from typing import Callable
+
+import psycopg
+from sqlalchemy import text
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Este proceso ya aplica lo que él mismo notifica al hacer commit: lo ignora al recibirlo
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# pg_notify admite hasta 8000 bytes por mensaje
+NOTIFY_MAX_BYTES = 7900
+# La espera de notificaciones se corta cada tanto para revisar si la tarea fue cancelada (ver run_listener)
+LISTEN_POLL_SECONDS = 1.0
+
+NOTIFY_SQL = text("SELECT pg_notify(:channel, :payload)")
+
+# Un canal que escucha cada worker: cómo se aplica un mensaje y qué hacer cuando pudieron perderse
+# mensajes (al conectar y al caerse la conexión)
+class Channel:
+    def __init__(self, name: str, handler: Callable[[str], None], reset: Callable[[], None]):
+        self.name = name
+        self.handler = handler
+        self.reset = reset
+
+channels: dict[str, Channel] = {}
+
+def register_channel(name: str, handler: Callable[[str], None], reset: Callable[[], None]) -> None:
+    channels[name] = Channel(name, handler, reset)
+
+def _reset_all() -> None:
+    for channel in channels.values():
+        channel.reset()
+
+# Tarea de fondo: escucha los canales registrados (invalidaciones de caché, eventos en vivo) en una conexión
+# propia (fuera del pool). Con shards hay una por base: cada transacción notifica en la base donde confirma
+async def run_listener(url: str | None = None) -> None:
+    conninfo = (url or get_settings().get_db_url).replace("postgresql+psycopg://", "postgresql://", 1)
+    delay = 1
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as connection:
+                for name in channels:
+                    await connection.execute(f"LISTEN {name}")
+                # Lo notificado mientras no se escuchaba se perdió: se empieza de cero
+                _reset_all()
+                delay = 1
+                while True:
+                    async for notification in connection.notifies(timeout=LISTEN_POLL_SECONDS):
+                        channel = channels.get(notification.channel)
+                        if channel is None:
+                            continue
+                        try:
+                            channel.handler(notification.payload)
+                        except (ValueError, KeyError, TypeError):
+                            logger.warning("Ignoring malformed %s notification: %r", notification.channel, notification.payload)
+                    # La espera del driver usa asyncio.wait_for, que en Python 3.11 puede tragarse una cancelación
+                    # que llega justo cuando el socket despierta: sin este corte el apagado quedaría esperando
+                    if asyncio.current_task().cancelling():
+                        raise asyncio.CancelledError
+        except (psycopg.Error, OSError) as exc:
+            logger.warning("Notification listener disconnected, retrying in %ss: %s", delay, exc)
+        # Una cancelación que llega durante una operación del driver puede perderse: se respeta aquí
+        if asyncio.current_task().cancelling():
+            raise asyncio.CancelledError
+        # Sin escuchar no se puede confiar en lo recibido
+        _reset_all()
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30)
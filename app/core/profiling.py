@@ -0,0 +1,97 @@
+import asyncio
+import json
+import logging
+import re
+import secrets
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pyinstrument import Profiler
+from pyinstrument.renderers import SpeedscopeRenderer
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import get_settings
+from app.core.query_log import QueryTimings, current_timings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+
+def _write_profile(path: Path, content: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf-8")
+
+# Perfila con muestreo las requests autorizadas (cabecera X-Profile con PROFILING_TOKEN) o las de
+# PROFILING_ROUTES, y guarda un archivo speedscope por request. Middleware ASGI puro: con
+# PROFILING_ENABLED=false cada request solo paga una comprobación
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def _should_profile(self, scope: Scope) -> bool:
+        settings = get_settings()
+        if not settings.PROFILING_ENABLED or scope["type"] != "http":
+            return False
+        if any(marker in scope["path"] for marker in settings.PROFILING_ROUTES):
+            return True
+        token = Headers(scope=scope).get(PROFILE_HEADER)
+        return bool(token and settings.PROFILING_TOKEN and secrets.compare_digest(token, settings.PROFILING_TOKEN))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        settings = get_settings()
+        profile_id = uuid.uuid4().hex[:12]
+        timings = QueryTimings()
+        reset = current_timings.set(timings)
+        profiler = Profiler(interval=settings.PROFILING_INTERVAL_MS / 1000, async_mode="enabled")
+        started = time.perf_counter()
+
+        # Las cabeceras salen con el desglose medido hasta ese momento (la respuesta ya está calculada)
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - started) * 1000
+                db_ms = timings.seconds * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", f"db;dur={db_ms:.1f}, app;dur={max(total_ms - db_ms, 0):.1f}, total;dur={total_ms:.1f}")
+                headers.append("X-Profile-Id", profile_id)
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            profiler.stop()
+            current_timings.reset(reset)
+            await self._save(scope, profiler, profile_id, time.perf_counter() - started, timings)
+
+    async def _save(self, scope: Scope, profiler: Profiler, profile_id: str, total: float, timings: QueryTimings) -> None:
+        route = getattr(scope.get("route"), "path", scope["path"])
+        breakdown = {
+            "total_ms": round(total * 1000, 1),
+            # Las consultas en paralelo (tablero) suman su tiempo: db_ms puede superar a total_ms
+            "db_ms": round(timings.seconds * 1000, 1),
+            "python_ms": round(max(total - timings.seconds, 0) * 1000, 1),
+            "queries": timings.queries,
+        }
+        try:
+            # Renderizar y escribir es trabajo de CPU y disco: fuera del bucle de eventos
+            profile = json.loads(await asyncio.to_thread(profiler.output, SpeedscopeRenderer()))
+            profile["name"] = (
+                f"{scope['method']} {route} total={breakdown['total_ms']}ms "
+                f"db={breakdown['db_ms']}ms python={breakdown['python_ms']}ms queries={breakdown['queries']}"
+            )
+            profile["nexaris"] = {"id": profile_id, "method": scope["method"], "route": route, **breakdown}
+
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+            slug = re.sub(r"[^A-Za-z0-9]+", "-", route).strip("-") or "root"
+            path = Path(get_settings().PROFILING_DIR) / f"{stamp}_{scope['method']}_{slug}_{profile_id}.speedscope.json"
+            await asyncio.to_thread(_write_profile, path, json.dumps(profile))
+            logger.info("Profile %s for %s %s written to %s: %s", profile_id, scope["method"], route, path, breakdown)
+        except Exception:
+            logger.exception("Could not write profile for %s %s", scope["method"], route)
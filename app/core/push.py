@@ -0,0 +1,153 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Iterable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.notify import NOTIFY_MAX_BYTES, NOTIFY_SQL, WORKER_ID, register_channel
+
+logger = logging.getLogger(__name__)
+
+# Evento que recibe un cliente cuyo buffer se llenó: debe volver a pedir los reportes una vez
+RESYNC = {"type": "resync"}
+
+# Eventos pendientes de una transacción: se publican solo si hace commit
+PENDING_KEY = "push_events"
+# Los eventos llegan a los demás workers por NOTIFY; cada uno los reparte entre sus conexiones
+CHANNEL = "nexaris_push"
+
+class TooManySubscriptions(Exception):
+    pass
+
+# Una conexión WebSocket/SSE de un usuario con su buffer acotado
+class Subscription:
+    def __init__(self, user_id: str, size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=size)
+        self.dropped = 0
+
+    # Nunca bloquea al que publica: si el cliente no da abasto se vacía su buffer y se le pide resincronizar
+    def offer(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+# Reparte los eventos de cada usuario entre sus conexiones abiertas en este proceso
+class PushHub:
+    def __init__(self):
+        self.subscriptions: dict[str, set[Subscription]] = defaultdict(set)
+
+    @contextmanager
+    def subscribe(self, user_id: str):
+        settings = get_settings()
+        if len(self.subscriptions[user_id]) >= settings.PUSH_MAX_CONNECTIONS_PER_USER:
+            raise TooManySubscriptions(user_id)
+
+        subscription = Subscription(user_id, settings.PUSH_BUFFER_SIZE)
+        self.subscriptions[user_id].add(subscription)
+        try:
+            yield subscription
+        finally:
+            self.subscriptions[user_id].discard(subscription)
+            if not self.subscriptions[user_id]:
+                del self.subscriptions[user_id]
+            if subscription.dropped:
+                logger.info("Push subscription for user %s overflowed %s times", user_id, subscription.dropped)
+
+    def publish(self, user_id: str, event: dict) -> None:
+        for subscription in list(self.subscriptions.get(user_id, ())):
+            subscription.offer(event)
+
+    # Sin escuchar a los demás workers pudieron perderse eventos: todos los clientes vuelven a pedir los reportes
+    def resync(self) -> None:
+        for subscriptions in list(self.subscriptions.values()):
+            for subscription in list(subscriptions):
+                subscription.offer(RESYNC)
+
+hub = PushHub()
+
+# Variación de saldo por cuenta (débitos - créditos) de un conjunto de líneas
+def balance_deltas(lines: Iterable, sign: int = 1, into: dict[str, Decimal] | None = None) -> dict[str, Decimal]:
+    deltas = into if into is not None else {}
+    for line in lines:
+        # Las filas de bloqueo de un asiento sin líneas no traen cuenta
+        if line.account_id is None:
+            continue
+        amount = Decimal(line.amount) if line.side == "D" else -Decimal(line.amount)
+        key = str(line.account_id)
+        deltas[key] = deltas.get(key, Decimal("0")) + sign * amount
+    return deltas
+
+def entry_event(action: str, entry_ids: Iterable, deltas: dict[str, Decimal] | None = None) -> dict:
+    return {
+        "type": "entries",
+        "action": action,
+        "entry_ids": [str(entry_id) for entry_id in entry_ids],
+        "deltas": {account_id: float(delta) for account_id, delta in (deltas or {}).items() if delta},
+    }
+
+# Deja el evento pendiente en la sesión; se envía después del commit y se descarta con el rollback
+def stage(session: AsyncSession | Session, user_id, event: dict) -> None:
+    target = session.sync_session if isinstance(session, AsyncSession) else session
+    target.info.setdefault(PENDING_KEY, []).append((str(user_id), event))
+
+# Agrupa los eventos en mensajes que caben en un NOTIFY. Un evento que no cabe solo (p. ej. una importación
+# con miles de asientos) llega a los demás workers como resync: el cliente vuelve a pedir los reportes
+def _payloads(pending: list[tuple[str, dict]]) -> Iterable[str]:
+    envelope = f'{{"origin": {json.dumps(WORKER_ID)}, "items": [{{}}]}}'
+    budget = NOTIFY_MAX_BYTES - len(envelope)
+    items: list[str] = []
+    size = 0
+    for user_id, pending_event in pending:
+        item = json.dumps([user_id, pending_event])
+        if len(item) > budget:
+            item = json.dumps([user_id, RESYNC])
+        if items and size + len(item) + 1 > budget:
+            yield envelope.replace("{}", ",".join(items))
+            items, size = [], 0
+        items.append(item)
+        size += len(item) + 1
+    if items:
+        yield envelope.replace("{}", ",".join(items))
+
+# NOTIFY es transaccional: los demás workers reciben los eventos solo si la transacción confirma
+@event.listens_for(Session, "before_commit")
+def _notify_pending(session: Session) -> None:
+    pending = session.info.get(PENDING_KEY)
+    if not pending:
+        return
+    for payload in _payloads(pending):
+        session.execute(NOTIFY_SQL, {"channel": CHANNEL, "payload": payload})
+
+# El worker que escribe reparte sus eventos al hacer commit, sin esperar la notificación
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    for user_id, pending in session.info.pop(PENDING_KEY, []):
+        hub.publish(user_id, pending)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    session.info.pop(PENDING_KEY, None)
+
+def apply_notification(payload: str) -> None:
+    message = json.loads(payload)
+    if message.get("origin") == WORKER_ID:
+        return
+    for user_id, pending in message["items"]:
+        hub.publish(user_id, pending)
+
+register_channel(CHANNEL, apply_notification, hub.resync)
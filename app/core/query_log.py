@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import get_settings
+
+logger = logging.getLogger("app.slow_query")
+
+# Ruta (plantilla) de la request que está usando la conexión; None en tareas de fondo
+current_route: ContextVar[str | None] = ContextVar("current_route", default=None)
+
+# Tiempo en base de datos de la request que se está perfilando (ver app/core/profiling.py)
+@dataclass
+class QueryTimings:
+    seconds: float = 0.0
+    queries: int = 0
+
+current_timings: ContextVar[QueryTimings | None] = ContextVar("current_timings", default=None)
+
+# Opción de ejecución para que los EXPLAIN de diagnóstico no se registren a sí mismos
+SKIP_OPTION = "skip_query_log"
+
+_explain_tasks: set[asyncio.Task] = set()
+
+# Timeout de la ruta: el marcador más largo que aparezca en la ruta gana
+def route_statement_timeout(route: str) -> int:
+    settings = get_settings()
+    matches = [marker for marker in settings.STATEMENT_TIMEOUT_ROUTES if marker in route]
+    if not matches:
+        return settings.STATEMENT_TIMEOUT_MS
+    return settings.STATEMENT_TIMEOUT_ROUTES[max(matches, key=len)]
+
+# Forma de los parámetros (nombres y tipos), nunca los valores
+def parameters_shape(parameters) -> object:
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return {"rows": len(parameters), "row": parameters_shape(parameters[0])}
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+def _explainable(statement: str) -> bool:
+    # EXPLAIN ANALYZE ejecuta la sentencia: solo se repiten lecturas puras
+    return statement.lstrip().upper().startswith("SELECT")
+
+def _write_plan(path: Path, record: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as file:
+        file.write(json.dumps(record, default=str) + "\n")
+
+# Repite la sentencia con EXPLAIN (ANALYZE, BUFFERS) en otra conexión y guarda el plan.
+# Si la sentencia fue cancelada por timeout, ANALYZE tampoco terminaría: solo se guarda el plan estimado.
+# La conexión nueva trae el timeout por defecto: se aplica el de la ruta de origen (o el de las tareas de
+# fondo), si no las sentencias largas de los reportes se cancelarían justo al capturar su plan
+async def _capture_plan(target: AsyncEngine, statement: str, parameters, record: dict) -> None:
+    settings = get_settings()
+    options = "FORMAT JSON" if record["error"] else "ANALYZE, BUFFERS, FORMAT JSON"
+    route = record["route"]
+    timeout = route_statement_timeout(route) if route else settings.STATEMENT_TIMEOUT_BACKGROUND_MS
+    try:
+        async with target.connect() as conn:
+            await conn.exec_driver_sql(
+                f"SET LOCAL statement_timeout = {int(timeout)}", execution_options={SKIP_OPTION: True}
+            )
+            result = await conn.exec_driver_sql(
+                f"EXPLAIN ({options}) {statement}", parameters, execution_options={SKIP_OPTION: True}
+            )
+            record["plan"] = result.scalar()
+            await conn.rollback()
+        await asyncio.to_thread(_write_plan, Path(settings.SLOW_QUERY_EXPLAIN_FILE), record)
+    except Exception:
+        logger.exception("Could not capture plan for slow query")
+
+# Registra en el motor los eventos de cursor que miden cada sentencia
+def instrument(target: AsyncEngine) -> None:
+    settings = get_settings()
+    threshold = settings.SLOW_QUERY_MS / 1000
+    sample_rate = settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+
+    @event.listens_for(target.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def record_query(conn, statement, parameters, context, executemany, error=None):
+        duration = time.perf_counter() - conn.info["query_started"].pop()
+        timings = current_timings.get()
+        if timings is not None:
+            timings.seconds += duration
+            timings.queries += 1
+        if duration < threshold or (context is not None and context.execution_options.get(SKIP_OPTION)):
+            return
+
+        record = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "route": current_route.get(),
+            "duration_ms": round(duration * 1000, 1),
+            "statement": statement,
+            "parameters": parameters_shape(parameters),
+            "error": error,
+        }
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s params=%s%s",
+            record["duration_ms"], record["route"] or "background", statement, record["parameters"],
+            f" error={error}" if error else "",
+        )
+
+        # Un plan a la vez: el diagnóstico no debe sumar carga a una base de datos que ya va lenta
+        if (
+            sample_rate > 0
+            and not executemany
+            and not _explain_tasks
+            and _explainable(statement)
+            and random.random() < sample_rate
+        ):
+            task = asyncio.get_running_loop().create_task(_capture_plan(target, statement, parameters, record))
+            _explain_tasks.add(task)
+            task.add_done_callback(_explain_tasks.discard)
+
+    @event.listens_for(target.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_query(conn, statement, parameters, context, executemany)
+
+    # Las sentencias canceladas por statement_timeout también son lentas y no pasan por after_cursor_execute
+    @event.listens_for(target.sync_engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is None or not conn.info.get("query_started") or exception_context.statement is None:
+            return
+        record_query(
+            conn,
+            exception_context.statement,
+            exception_context.parameters,
+            exception_context.execution_context,
+            bool(exception_context.execution_context and exception_context.execution_context.executemany),
+            error=type(exception_context.original_exception).__name__,
+        )
@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from uuid import UUID
+
+from sqlalchemy import text
+
+from app.core.config import get_settings
+
+# Shard de la base principal (PG_HOST): guarda el directorio y a los usuarios que no figuran en él
+MAIN_SHARD = "main"
+
+# Locks de asesoría (clase, clave) que coordinan el traslado de un usuario con las escrituras:
+# cada transacción de una request toma el del usuario compartido, y las tareas de fondo el del shard
+USER_LOCK_CLASS = 4701
+SHARD_LOCK_CLASS = 4702
+MOVE_LOCK_SQL = text("SELECT pg_advisory_xact_lock_shared(:lock_class, hashtext(:lock_key))")
+# Marca que deja un traslado en el shard de origen (cada shard tiene la suya)
+MOVED_USER_SQL = text("SELECT EXISTS (SELECT 1 FROM moved_user WHERE user_id = CAST(:user_id AS uuid))")
+
+# Entidades que se pueden ubicar por su id (parámetro de la ruta o campo del body) y cómo hallar su dueño.
+# El dueño de una fila nunca cambia: lo encontrado se recuerda sin invalidación
+ENTITY_OWNER_SQL = {
+    "account_id": text("""
+        SELECT user_id FROM ledger_account WHERE id = :id
+        UNION ALL SELECT user_id FROM ledger_account_archive WHERE id = :id
+        LIMIT 1
+    """),
+    "entry_id": text("""
+        SELECT user_id FROM journal_entry WHERE id = :id
+        UNION ALL SELECT user_id FROM journal_entry_archive WHERE id = :id
+        LIMIT 1
+    """),
+    "line_id": text("""
+        SELECT e.user_id FROM journal_line l JOIN journal_entry e ON e.id = l.entry_id WHERE l.id = :id
+        UNION ALL
+        SELECT e.user_id FROM journal_line_archive l JOIN journal_entry_archive e ON e.id = l.entry_id WHERE l.id = :id
+        LIMIT 1
+    """),
+    "category_id": text("SELECT user_id FROM category WHERE id = :id"),
+    "template_id": text("SELECT user_id FROM recurring_template WHERE id = :id"),
+}
+
+DIRECTORY_SQL = text("SELECT shard, moving FROM user_shard WHERE user_id = :user_id")
+
+# Alta en el directorio; si el usuario ya figura se conserva (y devuelve) su ubicación. claimed: la fila es nueva
+REGISTER_SQL = text("""
+INSERT INTO user_shard (user_id, shard) VALUES (:user_id, :shard)
+ON CONFLICT (user_id) DO UPDATE SET user_id = excluded.user_id
+RETURNING shard, moving, (xmax = 0) AS claimed
+""")
+UNREGISTER_SQL = text("DELETE FROM user_shard WHERE user_id = :user_id")
+
+# Directorio de emails (base principal): con shards, el índice único de users solo ve su propio shard.
+# Reserva el email para el usuario; sin fila si ya es de otro. claimed: la reserva es nueva (no era suya)
+CLAIM_EMAIL_SQL = text("""
+INSERT INTO user_email (email, user_id) VALUES (:email, :user_id)
+ON CONFLICT (email) DO UPDATE SET user_id = excluded.user_id WHERE user_email.user_id = excluded.user_id
+RETURNING (xmax = 0) AS claimed
+""")
+RELEASE_EMAIL_SQL = text("DELETE FROM user_email WHERE email = :email AND user_id = :user_id")
+# Tras cambiar el email, el anterior queda libre
+PRUNE_EMAILS_SQL = text("DELETE FROM user_email WHERE user_id = :user_id AND email <> :email")
+
+SET_LOCATION_SQL = text("""
+INSERT INTO user_shard (user_id, shard, moving) VALUES (:user_id, :shard, :moving)
+ON CONFLICT (user_id) DO UPDATE SET shard = excluded.shard, moving = excluded.moving, updated_at = now()
+""")
+
+class ShardError(ValueError):
+    pass
+
+# El usuario se trasladó a otro shard mientras la request esperaba su turno
+class UserMovedError(Exception):
+    pass
+
+def sharding_enabled() -> bool:
+    return bool(get_settings().PG_SHARDS)
+
+# Orden estable: el shard de un usuario nuevo no depende del orden del .env
+def shard_names() -> list[str]:
+    return [MAIN_SHARD, *sorted(get_settings().PG_SHARDS)]
+
+def shard_url(name: str) -> str:
+    settings = get_settings()
+    if name == MAIN_SHARD:
+        return settings.get_db_url
+    if name not in settings.PG_SHARDS:
+        raise ShardError(f"Unknown shard: {name}")
+    return f"postgresql+psycopg://{settings.PG_USER}:{settings.PG_PASSWORD}@{settings.PG_SHARDS[name]}"
+
+# Shard de un usuario nuevo. Los ids son aleatorios (uuid4): el resto reparte de forma pareja.
+# Se usa una sola vez, al darlo de alta; después manda el directorio (agregar shards no mueve a nadie)
+def hash_shard(user_id: UUID) -> str:
+    names = shard_names()
+    return names[user_id.int % len(names)]
+
+# Dueños de entidades ya ubicadas (LRU acotado)
+class EntityOwners:
+    def __init__(self, max_entries: int = 100000):
+        self.owners: OrderedDict[tuple[str, str], UUID] = OrderedDict()
+        self.max_entries = max_entries
+
+    def get(self, param: str, entity_id) -> UUID | None:
+        key = (param, str(entity_id))
+        owner = self.owners.get(key)
+        if owner is not None:
+            self.owners.move_to_end(key)
+        return owner
+
+    def set(self, param: str, entity_id, owner: UUID) -> None:
+        self.owners[(param, str(entity_id))] = owner
+        while len(self.owners) > self.max_entries:
+            self.owners.popitem(last=False)
+
+entity_owners = EntityOwners()
@@ -1,22 +1,120 @@
-from app.core.config import settings
+from app.core.admission import init_admission
+from app.core.notify import run_listener as run_notify_listener
+from app.core.config import get_settings
+from app.core.db import init_engines, dispose_engines, warm_up_engines, mark_last_write
+from app.core.sharding import UserMovedError, shard_names, shard_url
+from app.core.profiling import ProfilingMiddleware
 from app.api.routes import router as api_router
+from app.services.recurring import run_scheduler as run_recurring_scheduler
+from app.services.archive import run_archiver
+from app.services.report_export import shutdown_render_pool
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Request, Response, status
+from fastapi.responses import JSONResponse
+from psycopg.errors import QueryCanceled
+from sqlalchemy.exc import DBAPIError, OperationalError
+import asyncio
+import logging
 import os
+import time
 
-app = FastAPI(title="Nexaris Finance Back", description="API for the Nexaris Finance Backend")
+logger = logging.getLogger(__name__)
+
+# Precalienta el pool y las sentencias; reintenta hasta que la base de datos responda
+async def warm_up(app: FastAPI, started: float):
+    delay = 1
+    while True:
+        try:
+            await warm_up_engines()
+            break
+        except (DBAPIError, OSError) as exc:
+            logger.warning("Database warm-up failed, retrying in %ss: %s", delay, exc)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    app.state.startup_seconds = time.perf_counter() - started
+    app.state.ready = True
+    logger.info("Application ready in %.3fs", app.state.startup_seconds)
+
+# Crea los motores al arrancar y los libera al apagar
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    app.state.ready = False
+    app.state.startup_seconds = None
+
+    init_engines()
+    init_admission()
+    tasks = [asyncio.create_task(warm_up(app, started))]
+
+    # Tareas de fondo
+    # Invalidaciones de caché y eventos en vivo de los demás workers (una conexión de escucha por base)
+    tasks.extend(asyncio.create_task(run_notify_listener(shard_url(name))) for name in shard_names())
+    if get_settings().RECURRING_SCHEDULER_ENABLED:
+        tasks.append(asyncio.create_task(run_recurring_scheduler()))
+    if get_settings().ARCHIVE_ENABLED:
+        tasks.append(asyncio.create_task(run_archiver()))
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    shutdown_render_pool()
+    await dispose_engines()
+
+app = FastAPI(title="Nexaris Finance Back", description="API for the Nexaris Finance Backend", lifespan=lifespan)
+
+# Las escrituras exitosas marcan al cliente para leer del primario mientras la réplica se pone al día
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    if request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+        mark_last_write(response)
+    return response
+
+# Perfilado opcional: el último middleware añadido es el más externo y mide la request completa
+app.add_middleware(ProfilingMiddleware)
+
+# Sentencias canceladas por statement_timeout: el cliente puede reintentar con un rango menor
+@app.exception_handler(OperationalError)
+async def statement_timeout_handler(request: Request, exc: OperationalError):
+    if not isinstance(exc.orig, QueryCanceled):
+        raise exc
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Query exceeded the statement timeout"},
+    )
+
+# La request esperaba turno en el shard de origen de un usuario que se acaba de trasladar
+@app.exception_handler(UserMovedError)
+async def user_moved_handler(request: Request, exc: UserMovedError):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "User was moved to another shard, retry the request"},
+        headers={"Retry-After": str(get_settings().ADMISSION_RETRY_AFTER_SECONDS)},
+    )
 
 # Incluye el router de la API (que ya incluye todas las rutas)
 app.include_router(api_router, prefix="/api/v1")
 
-# print(settings.model_dump())
-
 # Endpoint de prueba inicial
 @app.get("/")
 def hello_world():
     return {"message": "Hello World"}
 
+# Readiness: 503 hasta que el pool y las sentencias estén precalentados
+@app.get("/ready")
+def ready(response: Response):
+    if not app.state.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "warming_up"}
+    return {"status": "ready", "startup_seconds": round(app.state.startup_seconds, 3)}
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=port)
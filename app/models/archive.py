@@ -0,0 +1,47 @@
+from datetime import datetime
+from sqlalchemy import String, func, CHAR, NUMERIC
+from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+from app.models.ledger_account import AccountKind, pg_account_kind
+
+# Tablas frías: asientos, líneas y cuentas eliminados hace más que la retención (ver app/services/archive.py).
+# Mismas columnas que las tablas calientes más archived_at, sin FKs para poder mover filas en cualquier orden
+
+class JournalEntryArchive(Base):
+    __tablename__ = "journal_entry_archive"
+
+    id: Mapped[str] = mapped_column(UUID, primary_key=True)
+    user_id: Mapped[str] = mapped_column(UUID, nullable=False)
+    occurred_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    description: Mapped[str | None] = mapped_column(String)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    deleted_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=True))
+    archived_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+
+class JournalLineArchive(Base):
+    __tablename__ = "journal_line_archive"
+
+    id: Mapped[str] = mapped_column(UUID, primary_key=True)
+    entry_id: Mapped[str] = mapped_column(UUID, nullable=False)
+    account_id: Mapped[str] = mapped_column(UUID, nullable=False)
+    amount: Mapped[str] = mapped_column(NUMERIC(18, 2), nullable=False)
+    side: Mapped[str] = mapped_column(CHAR(1), nullable=False)
+    category_id: Mapped[str | None] = mapped_column(UUID)
+    reconciled_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=True))
+    archived_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+
+class LedgerAccountArchive(Base):
+    __tablename__ = "ledger_account_archive"
+
+    id: Mapped[str] = mapped_column(UUID, primary_key=True)
+    user_id: Mapped[str] = mapped_column(UUID, nullable=False)
+    parent_id: Mapped[str | None] = mapped_column(UUID)
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    kind: Mapped[AccountKind] = mapped_column(pg_account_kind, nullable=False)
+    last4: Mapped[str | None] = mapped_column(CHAR(4))
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    deleted_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=True))
+    archived_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
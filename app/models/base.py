@@ -1,9 +1,8 @@
 from sqlalchemy import MetaData
 from sqlalchemy.orm import DeclarativeBase
 
-from app.core.config import settings
-
-metadata = MetaData(schema=settings.PG_SCHEMA)
+# Sin schema fijo: el motor define search_path=PG_SCHEMA al conectar (ver app/core/db.py)
+metadata = MetaData()
 
 class Base(DeclarativeBase):
-    metadata = metadata
\ No newline at end of file
+    metadata = metadata
@@ -0,0 +1,32 @@
+from datetime import date, datetime
+from sqlalchemy import String, ForeignKey, UniqueConstraint, Integer, Date, func, text, NUMERIC
+from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+# Categoría (etiqueta) de las líneas de asiento, por usuario
+class Category(Base):
+    __tablename__ = "category"
+    __table_args__ = (
+        UniqueConstraint("user_id", "name", name="uq_category_user_name"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        UUID, primary_key=True, server_default=text("gen_random_uuid()")
+    )
+    user_id: Mapped[str] = mapped_column(UUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+
+# Agregado por (usuario, categoría, mes) de las líneas categorizadas de asientos vigentes.
+# Se mantiene con deltas en cada escritura de líneas o asientos (ver app/services/category_spend.py)
+class CategorySpendMonthly(Base):
+    __tablename__ = "category_spend_monthly"
+
+    user_id: Mapped[str] = mapped_column(UUID, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    category_id: Mapped[str] = mapped_column(UUID, ForeignKey("category.id", ondelete="CASCADE"), primary_key=True)
+    month: Mapped[date] = mapped_column(Date, primary_key=True)
+    debits: Mapped[str] = mapped_column(NUMERIC(18, 2), nullable=False, server_default=text("0"))
+    credits: Mapped[str] = mapped_column(NUMERIC(18, 2), nullable=False, server_default=text("0"))
+    lines: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("0"))
@@ -0,0 +1,19 @@
+from datetime import datetime
+from sqlalchemy import ForeignKey, LargeBinary, func
+from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+# Huella de cada movimiento importado de un extracto, por cuenta.
+# La clave primaria (account_id, fingerprint) es el índice que evita importar dos veces el mismo movimiento
+class ImportFingerprint(Base):
+    __tablename__ = "import_fingerprint"
+
+    account_id: Mapped[str] = mapped_column(UUID, ForeignKey("ledger_account.id", ondelete="CASCADE"), primary_key=True)
+    fingerprint: Mapped[bytes] = mapped_column(LargeBinary, primary_key=True)
+    # Diferida: la huella se inserta antes que el asiento para descartar duplicados en la misma sentencia
+    entry_id: Mapped[str | None] = mapped_column(
+        UUID, ForeignKey("journal_entry.id", ondelete="SET NULL", deferrable=True, initially="DEFERRED")
+    )
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
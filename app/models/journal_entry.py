@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import String, ForeignKey, func, text
+from sqlalchemy import String, ForeignKey, LargeBinary, func, text
 from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -16,6 +16,8 @@ class JournalEntry(Base):
     description: Mapped[str | None] = mapped_column(String)
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
     deleted_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=True))
+    # Huella para detectar asientos registrados dos veces (ver app/services/entry_fingerprint.py)
+    fingerprint: Mapped[bytes | None] = mapped_column(LargeBinary)
 
     user = relationship("User", back_populates="journal_entries")
     lines = relationship("JournalLine", back_populates="entry", lazy="selectin", cascade="all, delete-orphan")
\ No newline at end of file
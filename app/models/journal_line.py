@@ -1,6 +1,7 @@
 # app/models/journal_line.py
+from datetime import datetime
 from sqlalchemy import ForeignKey, CheckConstraint, text, CHAR, NUMERIC
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.models.base import Base
@@ -19,6 +20,10 @@ class JournalLine(Base):
     account_id: Mapped[str] = mapped_column(UUID, ForeignKey("ledger_account.id"), nullable=False)
     amount: Mapped[str] = mapped_column(NUMERIC(18, 2), nullable=False)
     side: Mapped[str] = mapped_column(CHAR(1), nullable=False)
+    # Categoría opcional (del mismo usuario que el asiento); al borrar la categoría la línea queda sin categoría
+    category_id: Mapped[str | None] = mapped_column(UUID, ForeignKey("category.id", ondelete="SET NULL"))
+    # Momento en que se concilió contra un extracto (ver app/services/reconciliation.py); null = sin conciliar
+    reconciled_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=True))
 
     entry = relationship("JournalEntry", back_populates="lines", lazy="selectin")
     account = relationship("LedgerAccount", back_populates="lines", lazy="selectin")
@@ -1,6 +1,6 @@
 from datetime import datetime
 from enum import Enum
-from sqlalchemy import String, ForeignKey, func, text, CHAR
+from sqlalchemy import String, ForeignKey, Index, func, text, CHAR
 from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP, ENUM
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -19,11 +19,17 @@ pg_account_kind = ENUM(AccountKind, name="account_kind", create_type=False)
 
 class LedgerAccount(Base):
     __tablename__ = "ledger_account"
+    __table_args__ = (
+        # Nombre único por usuario entre las cuentas vigentes
+        Index("uq_ledger_account_user_name", "user_id", "name", unique=True, postgresql_where=text("deleted_at IS NULL")),
+    )
 
     id: Mapped[str] = mapped_column(
         UUID, primary_key=True, server_default=text("gen_random_uuid()")
     )
     user_id: Mapped[str] = mapped_column(UUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Cuenta padre (mismo usuario y tipo); NULL en las cuentas raíz
+    parent_id: Mapped[str | None] = mapped_column(UUID, ForeignKey("ledger_account.id"))
     name: Mapped[str] = mapped_column(String, nullable=False)
     kind: Mapped[AccountKind] = mapped_column(pg_account_kind, nullable=False)
     last4: Mapped[str | None] = mapped_column(CHAR(4))
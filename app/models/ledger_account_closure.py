@@ -0,0 +1,17 @@
+from sqlalchemy import ForeignKey, Index, Integer
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+# Tabla de cierre de la jerarquía de cuentas: una fila por cada par (ancestro, descendiente),
+# incluida la propia cuenta con profundidad 0. Se mantiene al crear y mover cuentas (app/services/account_tree.py)
+class LedgerAccountClosure(Base):
+    __tablename__ = "ledger_account_closure"
+    __table_args__ = (
+        Index("idx_ledger_account_closure_descendant", "descendant_id"),
+    )
+
+    ancestor_id: Mapped[str] = mapped_column(UUID, ForeignKey("ledger_account.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id: Mapped[str] = mapped_column(UUID, ForeignKey("ledger_account.id", ondelete="CASCADE"), primary_key=True)
+    depth: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -0,0 +1,23 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, Identity, Index, String, func
+from sqlalchemy.dialects.postgresql import JSONB, UUID, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+# Registro de solo inserción de cada cambio del libro (asientos, líneas y cuentas), escrito en la misma
+# transacción que el cambio. Un trigger rechaza UPDATE, DELETE y TRUNCATE. Sin FK al usuario: el registro
+# sobrevive a las filas que describe
+class LedgerEvent(Base):
+    __tablename__ = "ledger_event"
+    __table_args__ = (
+        Index("idx_ledger_event_user_id", "user_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(always=True), primary_key=True)
+    user_id: Mapped[str] = mapped_column(UUID, nullable=False)
+    entity: Mapped[str] = mapped_column(String, nullable=False)         # entry, line, account
+    entity_id: Mapped[str] = mapped_column(UUID, nullable=False)
+    action: Mapped[str] = mapped_column(String, nullable=False)         # created, updated, deleted, restored
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    recorded_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
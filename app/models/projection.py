@@ -0,0 +1,16 @@
+from sqlalchemy import BigInteger, NUMERIC, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+# Saldo por cuenta reconstruido desde ledger_event (ver app/services/projections.py).
+# last_event_id es el último evento del usuario aplicado en la reconstrucción
+class AccountBalanceProjection(Base):
+    __tablename__ = "account_balance_projection"
+
+    user_id: Mapped[str] = mapped_column(UUID, primary_key=True)
+    account_id: Mapped[str] = mapped_column(UUID, primary_key=True)
+    debits: Mapped[str] = mapped_column(NUMERIC(18, 2), nullable=False, server_default=text("0"))
+    credits: Mapped[str] = mapped_column(NUMERIC(18, 2), nullable=False, server_default=text("0"))
+    last_event_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
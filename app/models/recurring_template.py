@@ -0,0 +1,64 @@
+from datetime import date, datetime
+from enum import Enum
+from sqlalchemy import String, ForeignKey, CheckConstraint, Integer, Date, func, text, CHAR, NUMERIC
+from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP, ENUM
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from app.models.base import Base
+
+class RecurrenceFrequency(str, Enum):
+    daily = "daily"
+    weekly = "weekly"
+    monthly = "monthly"
+    yearly = "yearly"
+
+pg_recurrence_frequency = ENUM(RecurrenceFrequency, name="recurrence_frequency", create_type=False)
+
+class RecurringTemplate(Base):
+    __tablename__ = "recurring_template"
+    __table_args__ = (
+        CheckConstraint("interval_count > 0", name="ck_recurring_template_interval_positive"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        UUID, primary_key=True, server_default=text("gen_random_uuid()")
+    )
+    user_id: Mapped[str] = mapped_column(UUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    description: Mapped[str | None] = mapped_column(String)
+    frequency: Mapped[RecurrenceFrequency] = mapped_column(pg_recurrence_frequency, nullable=False)
+    # Cada cuántas unidades de frecuencia se repite (ej. cada 2 semanas)
+    interval_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("1"))
+    start_date: Mapped[date] = mapped_column(Date, nullable=False)
+    end_date: Mapped[date | None] = mapped_column(Date)
+    # Última fecha hasta la que ya se generaron ocurrencias
+    materialized_through: Mapped[date | None] = mapped_column(Date)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+    deleted_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=True))
+
+    lines = relationship("RecurringTemplateLine", back_populates="template", lazy="selectin", cascade="all, delete-orphan")
+
+class RecurringTemplateLine(Base):
+    __tablename__ = "recurring_template_line"
+    __table_args__ = (
+        CheckConstraint("amount > 0", name="ck_recurring_template_line_amount_positive"),
+        CheckConstraint("side IN ('D','C')", name="ck_recurring_template_line_side_dc"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        UUID, primary_key=True, server_default=text("gen_random_uuid()")
+    )
+    template_id: Mapped[str] = mapped_column(UUID, ForeignKey("recurring_template.id", ondelete="CASCADE"), nullable=False)
+    account_id: Mapped[str] = mapped_column(UUID, ForeignKey("ledger_account.id"), nullable=False)
+    amount: Mapped[str] = mapped_column(NUMERIC(18, 2), nullable=False)
+    side: Mapped[str] = mapped_column(CHAR(1), nullable=False)
+
+    template = relationship("RecurringTemplate", back_populates="lines")
+
+# Una fila por (plantilla, fecha): garantiza que cada ocurrencia se registre una sola vez
+class RecurringOccurrence(Base):
+    __tablename__ = "recurring_occurrence"
+
+    template_id: Mapped[str] = mapped_column(UUID, ForeignKey("recurring_template.id", ondelete="CASCADE"), primary_key=True)
+    occurs_on: Mapped[date] = mapped_column(Date, primary_key=True)
+    entry_id: Mapped[str | None] = mapped_column(UUID, ForeignKey("journal_entry.id", ondelete="SET NULL"))
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,17 @@
+from datetime import datetime
+from app.schemas.journal_entry import JournalEntryRead
+from app.schemas.ledger_account import LedgerAccountRead
+
+# Para lectura (respuesta) de asientos archivados
+class JournalEntryArchiveRead(JournalEntryRead):
+    archived_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# Para lectura (respuesta) de cuentas archivadas
+class LedgerAccountArchiveRead(LedgerAccountRead):
+    archived_at: datetime
+
+    class Config:
+        from_attributes = True
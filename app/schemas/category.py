@@ -0,0 +1,25 @@
+from datetime import datetime
+from uuid import UUID
+from pydantic import BaseModel
+
+# Para lectura/escritura
+class CategoryBase(BaseModel):
+    name: str
+
+# Para crear
+class CategoryCreate(CategoryBase):
+    user_id: UUID
+
+# Para actualizar
+class CategoryUpdate(BaseModel):
+    name: str | None = None
+
+# Para lectura (respuesta)
+class CategoryRead(CategoryBase):
+    id: UUID
+    user_id: UUID
+    name: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
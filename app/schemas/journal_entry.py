@@ -41,3 +41,12 @@ class JournalEntryWithLinesRead(JournalEntryRead):
 
     class Config:
         from_attributes = True
+
+# Para respuesta al crear: asiento vigente con la misma huella, si lo hay
+class JournalEntryCreatedRead(JournalEntryWithLinesRead):
+    duplicate_of: UUID | None = None
+
+# Grupo de asientos que parecen el mismo registrado más de una vez
+class JournalEntryDuplicateGroup(BaseModel):
+    fingerprint: str
+    entries: List[JournalEntryRead]
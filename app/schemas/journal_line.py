@@ -1,3 +1,4 @@
+from datetime import datetime
 from uuid import UUID
 from pydantic import BaseModel, Field
 from decimal import Decimal
@@ -7,6 +8,7 @@ class JournalLineBase(BaseModel):
     account_id: UUID
     amount: Decimal = Field(..., gt=0, decimal_places=2)
     side: str = Field(..., pattern="^[DC]$")  # Solo D o C
+    category_id: UUID | None = None
 
 # Para crear
 class JournalLineCreate(JournalLineBase):
@@ -17,6 +19,8 @@ class JournalLineUpdate(BaseModel):
     account_id: UUID | None = None
     amount: Decimal | None = Field(None, gt=0, decimal_places=2)
     side: str | None = Field(None, pattern="^[DC]$")
+    # Enviar category_id: null quita la categoría; omitirlo la conserva
+    category_id: UUID | None = None
 
 # Para lectura (respuesta)
 class JournalLineRead(JournalLineBase):
@@ -25,6 +29,8 @@ class JournalLineRead(JournalLineBase):
     account_id: UUID
     amount: Decimal
     side: str
+    category_id: UUID | None
+    reconciled_at: datetime | None = None
 
     class Config:
         from_attributes = True
@@ -1,4 +1,5 @@
 from datetime import datetime
+from decimal import Decimal
 from uuid import UUID
 from pydantic import BaseModel
 from app.models.ledger_account import AccountKind
@@ -8,6 +9,7 @@ class LedgerAccountBase(BaseModel):
     name: str
     kind: AccountKind
     last4: str | None = None
+    parent_id: UUID | None = None
 
 # Para crear
 class LedgerAccountCreate(LedgerAccountBase):
@@ -18,6 +20,8 @@ class LedgerAccountUpdate(BaseModel):
     name: str | None = None
     kind: AccountKind | None = None
     last4: str | None = None
+    # Enviar parent_id: null mueve la cuenta a la raíz; omitirlo no la mueve
+    parent_id: UUID | None = None
 
 # Para lectura (respuesta)
 class LedgerAccountRead(LedgerAccountBase):
@@ -26,9 +30,35 @@ class LedgerAccountRead(LedgerAccountBase):
     name: str
     kind: AccountKind
     last4: str | None
+    parent_id: UUID | None
     created_at: datetime
     updated_at: datetime
     deleted_at: datetime | None
 
     class Config:
         from_attributes = True
+
+# Para lectura con saldo (listados con with_balances=true)
+class LedgerAccountBalanceRead(LedgerAccountRead):
+    debits: Decimal
+    credits: Decimal
+    # Débitos - créditos de los asientos vigentes
+    balance: Decimal
+
+# Sugerencias para la captura rápida, ordenadas por uso reciente (score)
+class AccountSuggestion(BaseModel):
+    account_id: UUID
+    name: str
+    kind: AccountKind
+    score: float
+
+class AccountPairSuggestion(BaseModel):
+    debit_account_id: UUID
+    debit_name: str
+    credit_account_id: UUID
+    credit_name: str
+    score: float
+
+class AccountSuggestionsRead(BaseModel):
+    accounts: list[AccountSuggestion]
+    pairs: list[AccountPairSuggestion]
@@ -0,0 +1,27 @@
+from datetime import datetime
+from decimal import Decimal
+from uuid import UUID
+from pydantic import BaseModel
+
+# Para lectura (respuesta) del registro de eventos
+class LedgerEventRead(BaseModel):
+    id: int
+    user_id: UUID
+    entity: str
+    entity_id: UUID
+    action: str
+    payload: dict
+    recorded_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# Para lectura (respuesta) de la proyección de saldos por cuenta
+class AccountBalanceProjectionRead(BaseModel):
+    account_id: UUID
+    debits: Decimal
+    credits: Decimal
+    last_event_id: int
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,15 @@
+from datetime import date
+from decimal import Decimal
+from pydantic import BaseModel, Field
+
+# Una línea del extracto: monto con signo (positivo = entra dinero a la cuenta, como en la importación)
+class StatementLineIn(BaseModel):
+    occurred_on: date
+    amount: Decimal = Field(..., decimal_places=2)
+    description: str | None = None
+
+# Para conciliar
+class ReconciliationRequest(BaseModel):
+    lines: list[StatementLineIn] = Field(..., max_length=50000)
+    # Si se omite se usa RECONCILIATION_TOLERANCE_DAYS
+    tolerance_days: int | None = Field(None, ge=0, le=31)
@@ -0,0 +1,46 @@
+from datetime import date, datetime
+from uuid import UUID
+from pydantic import BaseModel, Field
+from decimal import Decimal
+from typing import List
+from app.models.recurring_template import RecurrenceFrequency
+
+# Línea de una plantilla
+class RecurringTemplateLineBase(BaseModel):
+    account_id: UUID
+    amount: Decimal = Field(..., gt=0, decimal_places=2)
+    side: str = Field(..., pattern="^[DC]$")  # Solo D o C
+
+# Para crear
+class RecurringTemplateCreate(BaseModel):
+    user_id: UUID
+    description: str | None = None
+    frequency: RecurrenceFrequency
+    interval_count: int = Field(1, gt=0)
+    start_date: date
+    end_date: date | None = None
+    lines: List[RecurringTemplateLineBase]
+
+# Para lectura (respuesta)
+class RecurringTemplateLineRead(RecurringTemplateLineBase):
+    id: UUID
+    template_id: UUID
+
+    class Config:
+        from_attributes = True
+
+class RecurringTemplateRead(BaseModel):
+    id: UUID
+    user_id: UUID
+    description: str | None
+    frequency: RecurrenceFrequency
+    interval_count: int
+    start_date: date
+    end_date: date | None
+    materialized_through: date | None
+    created_at: datetime
+    deleted_at: datetime | None
+    lines: List[RecurringTemplateLineRead]
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,90 @@
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.ledger_account import AccountKind
+
+class AccountTreeError(ValueError):
+    pass
+
+# Filas de cierre de una cuenta nueva: ella misma (profundidad 0) más los ancestros de su padre.
+# El padre solo cuenta si está vigente y es del mismo usuario y tipo
+INSERT_PATHS_SQL = text("""
+INSERT INTO ledger_account_closure (ancestor_id, descendant_id, depth)
+SELECT :account_id, :account_id, 0
+UNION ALL
+SELECT c.ancestor_id, :account_id, c.depth + 1
+FROM ledger_account_closure c
+JOIN ledger_account p ON p.id = c.descendant_id
+WHERE c.descendant_id = :parent_id
+  AND p.user_id = :user_id
+  AND p.kind = CAST(:kind AS account_kind)
+  AND p.deleted_at IS NULL
+""")
+
+# Nuevo padre de una cuenta existente: válido y fuera del subárbol que se mueve
+CHECK_MOVE_SQL = text("""
+SELECT
+    p.user_id = a.user_id AND p.kind = a.kind AND p.deleted_at IS NULL AS valid,
+    EXISTS (
+        SELECT 1 FROM ledger_account_closure
+        WHERE ancestor_id = a.id AND descendant_id = p.id
+    ) AS cycle
+FROM ledger_account a, ledger_account p
+WHERE a.id = :account_id AND p.id = :parent_id
+""")
+
+# Mover = soltar los caminos que entran al subárbol desde fuera y colgarlo de los ancestros del nuevo padre
+DETACH_SQL = text("""
+DELETE FROM ledger_account_closure
+WHERE descendant_id IN (SELECT descendant_id FROM ledger_account_closure WHERE ancestor_id = :account_id)
+  AND ancestor_id NOT IN (SELECT descendant_id FROM ledger_account_closure WHERE ancestor_id = :account_id)
+""")
+
+ATTACH_SQL = text("""
+INSERT INTO ledger_account_closure (ancestor_id, descendant_id, depth)
+SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+FROM ledger_account_closure above
+JOIN ledger_account_closure below ON below.ancestor_id = :account_id
+WHERE above.descendant_id = :parent_id
+""")
+
+# Padre o hijos de otro tipo tras cambiar el tipo de una cuenta
+KIND_MISMATCH_SQL = text("""
+SELECT
+    EXISTS (SELECT 1 FROM ledger_account p WHERE p.id = a.parent_id AND p.kind <> a.kind)
+    OR EXISTS (SELECT 1 FROM ledger_account c WHERE c.parent_id = a.id AND c.kind <> a.kind)
+FROM ledger_account a
+WHERE a.id = :account_id
+""")
+
+# Registra la cuenta recién insertada en la tabla de cierre (misma transacción que el INSERT)
+async def insert_account_paths(
+    db: AsyncSession, account_id: UUID, user_id: UUID, kind: AccountKind, parent_id: UUID | None
+) -> None:
+    result = await db.execute(
+        INSERT_PATHS_SQL,
+        {"account_id": account_id, "parent_id": parent_id, "user_id": user_id, "kind": kind.value},
+    )
+    # Sin filas del padre: no existe, está eliminado o es de otro usuario o tipo
+    if parent_id is not None and result.rowcount < 2:
+        raise AccountTreeError("Parent account not found or does not match the account's user and kind")
+
+# Cambia el padre de una cuenta (y con ella todo su subárbol). parent_id None la deja como raíz
+async def move_account(db: AsyncSession, account_id: UUID, parent_id: UUID | None) -> None:
+    if parent_id is not None:
+        check = (await db.execute(CHECK_MOVE_SQL, {"account_id": account_id, "parent_id": parent_id})).one_or_none()
+        if check is None or not check.valid:
+            raise AccountTreeError("Parent account not found or does not match the account's user and kind")
+        if check.cycle:
+            raise AccountTreeError("An account cannot be moved under itself or one of its descendants")
+
+    await db.execute(DETACH_SQL, {"account_id": account_id})
+    if parent_id is not None:
+        await db.execute(ATTACH_SQL, {"account_id": account_id, "parent_id": parent_id})
+
+# Una cuenta comparte tipo con su padre y sus hijos
+async def check_account_kind(db: AsyncSession, account_id: UUID) -> None:
+    if (await db.execute(KIND_MISMATCH_SQL, {"account_id": account_id})).scalar():
+        raise AccountTreeError("Account kind must match its parent and child accounts")
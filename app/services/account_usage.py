@@ -0,0 +1,153 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+
+# Suma al uso de cuentas (sign = 1) o resta de él (sign = -1) las líneas de los asientos vigentes que cumplen
+# el filtro, por (usuario, día UTC, descripción, cuenta, lado, contrapartida). La contrapartida de una línea es
+# la línea más grande del lado opuesto, así que depende de todo el asiento: siempre se resta y se suma el
+# asiento completo. Las filas se bloquean en orden de clave, como en category_spend_monthly
+USAGE_DELTA_SQL = """
+INSERT INTO account_usage_daily AS u (user_id, day, description, account_id, side, counter_account_id, uses)
+SELECT
+    e.user_id,
+    CAST(e.occurred_at AT TIME ZONE 'UTC' AS date),
+    left(COALESCE(e.description, ''), 60),
+    l.account_id,
+    l.side,
+    c.account_id,
+    :sign * count(*)
+FROM journal_entry e
+JOIN journal_line l ON l.entry_id = e.id
+JOIN LATERAL (
+    SELECT o.account_id FROM journal_line o
+    WHERE o.entry_id = l.entry_id AND o.side <> l.side
+    ORDER BY o.amount DESC, o.account_id
+    LIMIT 1
+) c ON true
+WHERE {condition}
+  AND e.deleted_at IS NULL
+GROUP BY 1, 2, 3, 4, 5, 6
+ORDER BY 1, 2, 3, 4, 5, 6
+ON CONFLICT (user_id, day, description, account_id, side, counter_account_id) DO UPDATE SET
+    uses = u.uses + excluded.uses
+"""
+
+ENTRIES_USAGE_SQL = text(USAGE_DELTA_SQL.format(condition="e.id = ANY(:ids)"))
+LINE_ENTRIES_USAGE_SQL = text(USAGE_DELTA_SQL.format(
+    condition="e.id IN (SELECT entry_id FROM journal_line WHERE id = ANY(:ids))"
+))
+USER_USAGE_SQL = text(USAGE_DELTA_SQL.format(condition="e.user_id = :user_id"))
+
+# Uso reciente de un usuario con su peso ya aplicado: cada uso vale la mitad cada SUGGESTION_HALF_LIFE_DAYS.
+# Recorre solo sus filas de la ventana (clave primaria), nunca journal_line
+USAGE_SQL = text("""
+SELECT
+    u.description,
+    u.account_id,
+    a.name,
+    a.kind,
+    u.side,
+    c.id AS counter_account_id,
+    sum(u.uses * power(0.5, GREATEST(CAST(:today AS date) - u.day, 0) / CAST(:half_life AS double precision))) AS score
+FROM account_usage_daily u
+JOIN ledger_account a ON a.id = u.account_id AND a.deleted_at IS NULL
+LEFT JOIN ledger_account c ON c.id = u.counter_account_id AND c.deleted_at IS NULL
+WHERE u.user_id = :user_id
+  AND u.day >= :since
+GROUP BY u.description, u.account_id, a.name, a.kind, u.side, c.id
+HAVING sum(u.uses) > 0
+""")
+
+# Todos los asientos dados. Restar antes de modificar o eliminar, sumar después de crear o restaurar
+async def apply_entry_usage(db: AsyncSession, entry_ids: list[UUID], sign: int) -> None:
+    await db.execute(ENTRIES_USAGE_SQL, {"ids": entry_ids, "sign": sign})
+
+# Los asientos de las líneas dadas (antes de modificar o borrar una línea, después de modificarla)
+async def apply_line_entries_usage(db: AsyncSession, line_ids: list[UUID], sign: int) -> None:
+    await db.execute(LINE_ENTRIES_USAGE_SQL, {"ids": line_ids, "sign": sign})
+
+# Todos los asientos de un usuario (importación de un volcado completo)
+async def apply_user_usage(db: AsyncSession, user_id: UUID, sign: int) -> None:
+    await db.execute(USER_USAGE_SQL, {"user_id": user_id, "sign": sign})
+
+# Clave de búsqueda de una descripción: sin acentos, mayúsculas ni signos. Independiente de la normalización
+# de las huellas de importación, que no puede cambiar sin volver a importar movimientos ya registrados
+def description_key(description: str) -> str:
+    text = unicodedata.normalize("NFKD", description).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+# Uso de un usuario en memoria, ordenado por descripción normalizada: un prefijo es un rango (bisect)
+# y ordenar sus cuentas no vuelve a la base
+class UsageIndex:
+    def __init__(self, rows):
+        merged: dict[tuple, float] = defaultdict(float)
+        self.accounts: dict[UUID, tuple[str, str]] = {}
+        for row in rows:
+            self.accounts[row.account_id] = (row.name, row.kind)
+            key = (description_key(row.description), row.account_id, row.side, row.counter_account_id)
+            merged[key] += row.score
+
+        self.rows = sorted(merged.items(), key=lambda item: item[0][0])
+        self.keys = [key[0] for key, _ in self.rows]
+        self.ranked: dict[int, dict] = {}
+
+    def suggest(self, prefix: str | None, limit: int) -> dict:
+        prefix = description_key(prefix or "")
+        if not prefix and limit in self.ranked:
+            return self.ranked[limit]
+
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + "\uffff", start)
+        accounts: dict[UUID, float] = defaultdict(float)
+        pairs: dict[tuple[UUID, UUID], float] = defaultdict(float)
+        for (_, account_id, side, counter_id), score in self.rows[start:end]:
+            accounts[account_id] += score
+            # Cada par se cuenta una vez, desde su línea de débito
+            if side == "D" and counter_id in self.accounts:
+                pairs[(account_id, counter_id)] += score
+
+        top_accounts = sorted(accounts.items(), key=lambda item: -item[1])[:limit]
+        top_pairs = sorted(pairs.items(), key=lambda item: -item[1])[:limit]
+        suggestions = {
+            "accounts": [
+                {
+                    "account_id": account_id,
+                    "name": self.accounts[account_id][0],
+                    "kind": self.accounts[account_id][1],
+                    "score": round(score, 4),
+                }
+                for account_id, score in top_accounts
+            ],
+            "pairs": [
+                {
+                    "debit_account_id": debit_id,
+                    "debit_name": self.accounts[debit_id][0],
+                    "credit_account_id": credit_id,
+                    "credit_name": self.accounts[credit_id][0],
+                    "score": round(score, 4),
+                }
+                for (debit_id, credit_id), score in top_pairs
+            ],
+        }
+        if not prefix:
+            self.ranked[limit] = suggestions
+        return suggestions
+
+async def load_usage(db: AsyncSession, user_id: UUID) -> UsageIndex:
+    settings = get_settings()
+    today = datetime.now(timezone.utc).date()
+    result = await db.execute(USAGE_SQL, {
+        "user_id": user_id,
+        "today": today,
+        "since": today - timedelta(days=settings.SUGGESTION_WINDOW_DAYS),
+        "half_life": settings.SUGGESTION_HALF_LIFE_DAYS,
+    })
+    return UsageIndex(result.all())
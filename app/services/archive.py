@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import db
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+ENTRY_COLUMNS = "id, user_id, occurred_at, description, created_at, deleted_at"
+LINE_COLUMNS = "id, entry_id, account_id, amount, side, category_id, reconciled_at"
+ACCOUNT_COLUMNS = "id, user_id, parent_id, name, kind, last4, created_at, updated_at, deleted_at"
+
+def _qualified(columns: str, alias: str) -> str:
+    return ", ".join(f"{alias}.{column}" for column in columns.split(", "))
+
+# Mueve un lote de asientos eliminados (y sus líneas) a las tablas de archivo en una sola sentencia
+ARCHIVE_ENTRIES_SQL = text(f"""
+WITH batch AS (
+    SELECT id FROM journal_entry
+    WHERE deleted_at < :cutoff
+    ORDER BY deleted_at
+    LIMIT :batch_size
+    FOR UPDATE SKIP LOCKED
+),
+moved_lines AS (
+    DELETE FROM journal_line l USING batch b
+    WHERE l.entry_id = b.id
+    RETURNING {_qualified(LINE_COLUMNS, "l")}
+),
+archived_lines AS (
+    INSERT INTO journal_line_archive ({LINE_COLUMNS})
+    SELECT {LINE_COLUMNS} FROM moved_lines
+    RETURNING id
+),
+moved_entries AS (
+    DELETE FROM journal_entry e USING batch b
+    WHERE e.id = b.id
+    RETURNING {_qualified(ENTRY_COLUMNS, "e")}
+),
+archived_entries AS (
+    INSERT INTO journal_entry_archive ({ENTRY_COLUMNS})
+    SELECT {ENTRY_COLUMNS} FROM moved_entries
+    RETURNING id
+)
+SELECT
+    (SELECT count(*) FROM archived_entries) AS entries,
+    (SELECT count(*) FROM archived_lines) AS lines
+""")
+
+# Cuentas eliminadas que ya nadie referencia (las líneas de asientos vivos y las subcuentas las mantienen en caliente)
+ARCHIVE_ACCOUNTS_SQL = text(f"""
+WITH batch AS (
+    SELECT a.id FROM ledger_account a
+    WHERE a.deleted_at < :cutoff
+      AND NOT EXISTS (SELECT 1 FROM journal_line l WHERE l.account_id = a.id)
+      AND NOT EXISTS (SELECT 1 FROM recurring_template_line t WHERE t.account_id = a.id)
+      AND NOT EXISTS (SELECT 1 FROM ledger_account c WHERE c.parent_id = a.id)
+    ORDER BY a.deleted_at
+    LIMIT :batch_size
+    FOR UPDATE SKIP LOCKED
+),
+moved AS (
+    DELETE FROM ledger_account a USING batch b
+    WHERE a.id = b.id
+    RETURNING {_qualified(ACCOUNT_COLUMNS, "a")}
+),
+archived AS (
+    INSERT INTO ledger_account_archive ({ACCOUNT_COLUMNS})
+    SELECT {ACCOUNT_COLUMNS} FROM moved
+    RETURNING id
+)
+SELECT (SELECT count(*) FROM archived) AS accounts
+""")
+
+# Caminos de la jerarquía para las cuentas de la CTE restored_accounts (que devuelve id y parent_id)
+RESTORED_PATHS_CTE = """
+restored_paths AS (
+    INSERT INTO ledger_account_closure (ancestor_id, descendant_id, depth)
+    SELECT r.id, r.id, 0 FROM restored_accounts r
+    UNION ALL
+    SELECT c.ancestor_id, r.id, c.depth + 1
+    FROM restored_accounts r
+    JOIN ledger_account_closure c ON c.descendant_id = r.parent_id
+    RETURNING 1
+)"""
+
+# Devuelve un asiento archivado a las tablas calientes (vigente otra vez), con sus líneas
+# y las cuentas archivadas que esas líneas referencian (que vuelven todavía eliminadas).
+# Si el padre de una cuenta ya no está en caliente, vuelve como raíz; si la categoría de una línea
+# se borró mientras tanto, la línea vuelve sin categoría
+RESTORE_ENTRY_SQL = text(f"""
+WITH moved_entry AS (
+    DELETE FROM journal_entry_archive WHERE id = :entry_id
+    RETURNING {ENTRY_COLUMNS}
+),
+moved_lines AS (
+    DELETE FROM journal_line_archive l USING moved_entry e
+    WHERE l.entry_id = e.id
+    RETURNING {_qualified(LINE_COLUMNS, "l")}
+),
+moved_accounts AS (
+    DELETE FROM ledger_account_archive a
+    WHERE a.id IN (SELECT account_id FROM moved_lines)
+    RETURNING {_qualified(ACCOUNT_COLUMNS, "a")}
+),
+restored_accounts AS (
+    INSERT INTO ledger_account ({ACCOUNT_COLUMNS})
+    SELECT
+        m.id, m.user_id,
+        (SELECT p.id FROM ledger_account p WHERE p.id = m.parent_id),
+        m.name, m.kind, m.last4, m.created_at, m.updated_at, m.deleted_at
+    FROM moved_accounts m
+    RETURNING id, parent_id
+),{RESTORED_PATHS_CTE},
+restored_entry AS (
+    INSERT INTO journal_entry ({ENTRY_COLUMNS})
+    SELECT id, user_id, occurred_at, description, created_at, NULL FROM moved_entry
+    RETURNING id
+),
+restored_lines AS (
+    INSERT INTO journal_line ({LINE_COLUMNS})
+    SELECT
+        m.id, m.entry_id, m.account_id, m.amount, m.side,
+        (SELECT c.id FROM category c WHERE c.id = m.category_id),
+        m.reconciled_at
+    FROM moved_lines m
+    RETURNING id
+)
+SELECT
+    (SELECT count(*) FROM restored_entry) AS entries,
+    (SELECT count(*) FROM restored_lines) AS lines,
+    (SELECT count(*) FROM restored_accounts) AS accounts
+""")
+
+# Restaura una cuenta como vigente: solo conserva el padre si este sigue vigente
+RESTORE_ACCOUNT_SQL = text(f"""
+WITH moved AS (
+    DELETE FROM ledger_account_archive WHERE id = :account_id
+    RETURNING {ACCOUNT_COLUMNS}
+),
+restored_accounts AS (
+    INSERT INTO ledger_account ({ACCOUNT_COLUMNS})
+    SELECT
+        m.id, m.user_id,
+        (SELECT p.id FROM ledger_account p WHERE p.id = m.parent_id AND p.deleted_at IS NULL),
+        m.name, m.kind, m.last4, m.created_at, now(), NULL
+    FROM moved m
+    RETURNING id, parent_id
+),{RESTORED_PATHS_CTE}
+SELECT id FROM restored_accounts
+""")
+
+# Archiva lo eliminado antes de la retención en un shard, un lote (y una transacción) a la vez
+async def _archive_shard(session: AsyncSession, params: dict) -> dict:
+    totals = {"entries": 0, "lines": 0, "accounts": 0}
+
+    # Primero los asientos: al salir sus líneas, las cuentas eliminadas quedan libres para archivarse
+    while True:
+        row = (await session.execute(ARCHIVE_ENTRIES_SQL, params)).one()
+        await session.commit()
+        if row.entries == 0:
+            break
+        totals["entries"] += row.entries
+        totals["lines"] += row.lines
+
+    while True:
+        row = (await session.execute(ARCHIVE_ACCOUNTS_SQL, params)).one()
+        await session.commit()
+        if row.accounts == 0:
+            break
+        totals["accounts"] += row.accounts
+
+    return totals
+
+# Archiva todo lo eliminado antes de la retención (todos los shards a la vez)
+async def archive_deleted(now: datetime | None = None, batch_size: int | None = None) -> dict:
+    settings = get_settings()
+    now = now or datetime.now(timezone.utc)
+    params = {
+        "cutoff": now - timedelta(days=settings.ARCHIVE_RETENTION_DAYS),
+        "batch_size": batch_size or settings.ARCHIVE_BATCH_SIZE,
+    }
+
+    results = await db.for_each_shard(lambda session: _archive_shard(session, params))
+    return {key: sum(result[key] for result in results.values()) for key in ("entries", "lines", "accounts")}
+
+# Restaura un asiento archivado. Devuelve False si no estaba en el archivo
+async def restore_entry(session: AsyncSession, entry_id: UUID) -> bool:
+    row = (await session.execute(RESTORE_ENTRY_SQL, {"entry_id": entry_id})).one()
+    return row.entries > 0
+
+# Restaura una cuenta archivada como vigente. Devuelve False si no estaba en el archivo
+async def restore_account(session: AsyncSession, account_id: UUID) -> bool:
+    result = await session.execute(RESTORE_ACCOUNT_SQL, {"account_id": account_id})
+    return result.scalar_one_or_none() is not None
+
+# Tarea de fondo: archiva periódicamente mientras la app está viva
+async def run_archiver() -> None:
+    interval = get_settings().ARCHIVE_INTERVAL_SECONDS
+    while True:
+        try:
+            totals = await archive_deleted()
+            if any(totals.values()):
+                logger.info("Soft-deleted rows archived: %s", totals)
+        except Exception:
+            logger.exception("Archiving soft-deleted rows failed")
+        # Una cancelación que llega durante una operación del driver puede perderse: se respeta aquí
+        if asyncio.current_task().cancelling():
+            raise asyncio.CancelledError
+        await asyncio.sleep(interval)
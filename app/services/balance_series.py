@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+# Tope de períodos de una serie (unos 10 años de saldos diarios)
+MAX_BUCKETS = 3700
+
+INTERVALS = ("day", "week", "month")
+
+# Inicio del período que contiene la fecha (las semanas empiezan el lunes, igual que date_trunc)
+def bucket_start(day: date, interval: str) -> date:
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+def next_bucket(day: date, interval: str) -> date:
+    if interval == "week":
+        return day + timedelta(days=7)
+    if interval == "month":
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return day + timedelta(days=1)
+
+def bucket_count(start: date, end: date, interval: str) -> int:
+    if interval == "week":
+        return (end - start).days // 7 + 1
+    if interval == "month":
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return (end - start).days + 1
+
+# Largest-Triangle-Three-Buckets: conserva el primer y el último punto y, de cada tramo intermedio,
+# el que forma el triángulo más grande con el elegido antes y el promedio del tramo siguiente.
+# Mantiene los picos y los valles de la serie con `threshold` puntos. Devuelve los índices elegidos
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bordes de los threshold - 2 tramos entre el primer y el último punto
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        selected[i + 1] = previous
+    selected[-1] = n - 1
+    return selected
@@ -0,0 +1,72 @@
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Suma al agregado (sign = 1) o resta de él (sign = -1) las líneas categorizadas de asientos vigentes
+# que cumplen el filtro, agrupadas por (usuario, categoría, mes UTC). Las filas se bloquean en orden
+# de clave para que dos escrituras concurrentes no se esperen en orden inverso
+SPEND_DELTA_SQL = """
+INSERT INTO category_spend_monthly AS s (user_id, category_id, month, debits, credits, lines)
+SELECT
+    e.user_id,
+    l.category_id,
+    CAST(date_trunc('month', e.occurred_at AT TIME ZONE 'UTC') AS date),
+    :sign * sum(CASE WHEN l.side = 'D' THEN l.amount ELSE 0 END),
+    :sign * sum(CASE WHEN l.side = 'C' THEN l.amount ELSE 0 END),
+    :sign * count(*)
+FROM journal_line l
+JOIN journal_entry e ON e.id = l.entry_id
+WHERE {condition}
+  AND l.category_id IS NOT NULL
+  AND e.deleted_at IS NULL
+GROUP BY 1, 2, 3
+ORDER BY 1, 2, 3
+ON CONFLICT (user_id, category_id, month) DO UPDATE SET
+    debits = s.debits + excluded.debits,
+    credits = s.credits + excluded.credits,
+    lines = s.lines + excluded.lines
+"""
+
+ENTRIES_DELTA_SQL = text(SPEND_DELTA_SQL.format(condition="l.entry_id = ANY(:ids)"))
+LINES_DELTA_SQL = text(SPEND_DELTA_SQL.format(condition="l.id = ANY(:ids)"))
+USER_DELTA_SQL = text(SPEND_DELTA_SQL.format(condition="e.user_id = :user_id"))
+
+# Quien modifica un asiento o sus líneas bloquea antes el asiento: así la resta previa no lee
+# una versión que otra transacción está cambiando (cada sentencia posterior ve lo ya confirmado).
+# Devuelven las líneas bloqueadas con sus valores actuales (una fila sin línea si el asiento no tiene)
+LOCK_ENTRIES_SQL = text("""
+SELECT e.id AS entry_id, e.user_id, l.account_id, l.amount, l.side, l.category_id
+FROM journal_entry e
+LEFT JOIN journal_line l ON l.entry_id = e.id
+WHERE e.id = ANY(:ids)
+ORDER BY e.id
+FOR NO KEY UPDATE OF e
+""")
+
+LOCK_LINE_ENTRIES_SQL = text("""
+SELECT e.id AS entry_id, e.user_id, l.account_id, l.amount, l.side, l.category_id
+FROM journal_entry e
+JOIN journal_line l ON l.entry_id = e.id
+WHERE l.id = ANY(:ids)
+ORDER BY e.id
+FOR NO KEY UPDATE OF e
+""")
+
+async def lock_entries(db: AsyncSession, entry_ids: list[UUID]) -> list:
+    return (await db.execute(LOCK_ENTRIES_SQL, {"ids": entry_ids})).all()
+
+async def lock_line_entries(db: AsyncSession, line_ids: list[UUID]) -> list:
+    return (await db.execute(LOCK_LINE_ENTRIES_SQL, {"ids": line_ids})).all()
+
+# Todas las líneas de los asientos dados. Restar antes de modificar o eliminar, sumar después de crear o restaurar
+async def apply_entry_spend(db: AsyncSession, entry_ids: list[UUID], sign: int) -> None:
+    await db.execute(ENTRIES_DELTA_SQL, {"ids": entry_ids, "sign": sign})
+
+# Solo las líneas dadas
+async def apply_line_spend(db: AsyncSession, line_ids: list[UUID], sign: int) -> None:
+    await db.execute(LINES_DELTA_SQL, {"ids": line_ids, "sign": sign})
+
+# Todas las líneas de un usuario (importación de un volcado completo)
+async def apply_user_spend(db: AsyncSession, user_id: UUID, sign: int) -> None:
+    await db.execute(USER_DELTA_SQL, {"user_id": user_id, "sign": sign})
@@ -0,0 +1,91 @@
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.schemas.journal_line import JournalLineBase
+
+ON_DUPLICATE = ("warn", "reject")
+
+# La huella de un asiento (usuario, día UTC y sus líneas cuenta:lado:monto ordenadas) la calculan siempre
+# las funciones entry_fingerprint del script de la base: al crear, al editar las líneas y al recalcular
+# sale el mismo valor. Los asientos sin líneas no tienen huella
+
+# Huella de un asiento por crear y el asiento vigente más antiguo con la misma (una búsqueda por índice)
+PAYLOAD_FINGERPRINT_SQL = text("""
+SELECT f.fingerprint, (
+    SELECT e.id FROM journal_entry e
+    WHERE e.user_id = :user_id
+      AND e.fingerprint = f.fingerprint
+      AND e.deleted_at IS NULL
+    ORDER BY e.created_at
+    LIMIT 1
+) AS duplicate_of
+FROM (
+    SELECT entry_fingerprint(
+        CAST(:user_id AS uuid),
+        CAST(:occurred_at AS timestamptz),
+        array_agg(entry_fingerprint_line(l.account_id, l.side, l.amount))
+    ) AS fingerprint
+    FROM unnest(CAST(:account_ids AS uuid[]), CAST(:sides AS text[]), CAST(:amounts AS numeric[]))
+        AS l(account_id, side, amount)
+) f
+""")
+
+# Recalcula la huella de los asientos que cumplen el filtro (solo escribe las que cambian)
+REFRESH_SQL = """
+UPDATE journal_entry e
+SET fingerprint = f.fingerprint
+FROM (
+    SELECT j.id, entry_fingerprint(
+        j.user_id,
+        j.occurred_at,
+        array_agg(entry_fingerprint_line(l.account_id, l.side, l.amount)) FILTER (WHERE l.id IS NOT NULL)
+    ) AS fingerprint
+    FROM journal_entry j
+    LEFT JOIN journal_line l ON l.entry_id = j.id
+    WHERE {condition}
+    GROUP BY j.id
+) f
+WHERE e.id = f.id AND e.fingerprint IS DISTINCT FROM f.fingerprint
+"""
+
+ENTRIES_REFRESH_SQL = text(REFRESH_SQL.format(condition="j.id = ANY(:ids)"))
+USER_REFRESH_SQL = text(REFRESH_SQL.format(condition="j.user_id = :user_id"))
+
+# Grupos de asientos vigentes con la misma huella, del más reciente al más antiguo
+DUPLICATE_GROUPS_SQL = text("""
+SELECT fingerprint, array_agg(id ORDER BY created_at) AS entry_ids
+FROM journal_entry
+WHERE user_id = :user_id
+  AND deleted_at IS NULL
+  AND fingerprint IS NOT NULL
+GROUP BY fingerprint
+HAVING count(*) > 1
+ORDER BY max(occurred_at) DESC
+LIMIT :limit
+""")
+
+async def payload_fingerprint(
+    db: AsyncSession, user_id: UUID, occurred_at: datetime, lines: list[JournalLineBase]
+) -> tuple[bytes, UUID | None]:
+    row = (await db.execute(PAYLOAD_FINGERPRINT_SQL, {
+        "user_id": user_id,
+        "occurred_at": occurred_at,
+        "account_ids": [line.account_id for line in lines],
+        "sides": [line.side for line in lines],
+        "amounts": [line.amount for line in lines],
+    })).one()
+    return row.fingerprint, row.duplicate_of
+
+# Después de crear, modificar o borrar líneas, o de cambiar la fecha de los asientos dados
+async def refresh_entry_fingerprints(db: AsyncSession, entry_ids: list[UUID]) -> None:
+    await db.execute(ENTRIES_REFRESH_SQL, {"ids": entry_ids})
+
+# Todos los asientos de un usuario (importación de un volcado completo)
+async def refresh_user_fingerprints(db: AsyncSession, user_id: UUID) -> None:
+    await db.execute(USER_REFRESH_SQL, {"user_id": user_id})
+
+async def duplicate_groups(db: AsyncSession, user_id: UUID, limit: int) -> list:
+    return (await db.execute(DUPLICATE_GROUPS_SQL, {"user_id": user_id, "limit": limit})).all()
@@ -0,0 +1,89 @@
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+
+# Fracción mínima de meses en que un movimiento debe repetirse el mismo día para tratarlo como recurrente
+RECURRING_MIN_RATIO = 0.6
+# Meses mínimos de historia para buscar patrones mensuales
+RECURRING_MIN_MONTHS = 2
+# Cuentas con movimientos en más de esta fracción de días se proyectan solo con el promedio semanal
+DENSE_ACTIVITY_RATIO = 0.5
+
+@dataclass
+class Forecast:
+    current: np.ndarray     # (cuentas,) saldo actual en centavos
+    dates: np.ndarray       # (días,) datetime64[D] proyectados
+    balances: np.ndarray    # (cuentas, días) saldo proyectado en centavos
+
+def _day_of_month(dates: np.ndarray) -> np.ndarray:
+    # Índice 0..30 del día del mes
+    return (dates - dates.astype("datetime64[M]")).astype(np.int64)
+
+def _weekday(dates: np.ndarray) -> np.ndarray:
+    # 1970-01-01 fue jueves: se desplaza para que lunes = 0
+    return (dates.astype(np.int64) + 3) % 7
+
+def _is_month_end(dates: np.ndarray) -> np.ndarray:
+    return (dates + 1).astype("datetime64[M]") != dates.astype("datetime64[M]")
+
+# Proyecta los saldos diarios de todas las cuentas a la vez.
+# account_idx/day_idx/cents describen los flujos agregados por (cuenta, día); day_idx = -1 es el saldo previo a la ventana
+def project_balances(
+    account_idx: np.ndarray,
+    day_idx: np.ndarray,
+    cents: np.ndarray,
+    n_accounts: int,
+    history_start: date,
+    history_days: int,
+    horizon_days: int,
+) -> Forecast:
+    opening_mask = day_idx < 0
+
+    opening = np.zeros(n_accounts, dtype=np.int64)
+    np.add.at(opening, account_idx[opening_mask], cents[opening_mask])
+
+    flows = np.zeros((n_accounts, history_days), dtype=np.int64)
+    np.add.at(flows, (account_idx[~opening_mask], day_idx[~opening_mask]), cents[~opening_mask])
+
+    current = opening + flows.sum(axis=1)
+
+    history = np.datetime64(history_start, "D") + np.arange(history_days)
+    history_dom = _day_of_month(history)
+
+    # Patrones mensuales: cuántos meses hubo movimiento cada día del mes y por cuánto
+    months_per_dom = np.bincount(history_dom, minlength=31)
+    hits = np.zeros((31, n_accounts), dtype=np.int64)
+    sums = np.zeros((31, n_accounts), dtype=np.int64)
+    np.add.at(hits, history_dom, (flows != 0).T.astype(np.int64))
+    np.add.at(sums, history_dom, flows.T)
+
+    sparse = (flows != 0).mean(axis=1) <= DENSE_ACTIVITY_RATIO
+    recurring = (
+        (months_per_dom[:, None] >= RECURRING_MIN_MONTHS)
+        & (hits >= np.ceil(RECURRING_MIN_RATIO * months_per_dom[:, None]))
+        & sparse[None, :]
+    )
+    # Monto típico por ocurrencia de cada patrón recurrente (31, cuentas)
+    monthly = np.where(recurring, sums // np.maximum(hits, 1), 0)
+    # El último día de un mes corto también recibe los patrones de los días que no existen
+    monthly_tail = np.cumsum(monthly[::-1], axis=0)[::-1]
+
+    # Lo no recurrente se reparte como promedio por día de la semana
+    residual = flows - np.where(recurring[history_dom].T, flows, 0)
+    history_wd = _weekday(history)
+    days_per_wd = np.bincount(history_wd, minlength=7)
+    weekly = np.zeros((7, n_accounts), dtype=np.float64)
+    np.add.at(weekly, history_wd, residual.T)
+    weekly /= np.maximum(days_per_wd, 1)[:, None]
+
+    future = np.datetime64(history_start, "D") + history_days + np.arange(horizon_days)
+    future_dom = _day_of_month(future)
+    month_end = _is_month_end(future)
+
+    projected = np.where(month_end[:, None], monthly_tail[future_dom], monthly[future_dom])
+    projected = projected + np.rint(weekly[_weekday(future)]).astype(np.int64)
+
+    balances = current[:, None] + np.cumsum(projected.T, axis=1)
+
+    return Forecast(current=current, dates=future, balances=balances)
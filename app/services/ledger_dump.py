@@ -0,0 +1,427 @@
+import asyncio
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import AsyncIterator
+from uuid import UUID
+
+import numpy as np
+import psycopg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import invalidate
+from app.core.config import get_settings
+from app.services.account_usage import apply_user_usage
+from app.services.category_spend import apply_user_spend
+from app.services.entry_fingerprint import refresh_user_fingerprints
+
+class DumpError(ValueError):
+    pass
+
+# Formato: MAGIC, después bloques (tabla, tamaño sin comprimir, tamaño comprimido) + zlib(grupo de filas)
+# y un bloque de cierre con tabla 0. Cada grupo guarda sus filas por columnas:
+#   uuid  16 bytes fijos (todo ceros = null)
+#   ts    int64 microsegundos desde 1970 UTC (INT64_MIN = null)
+#   cents int64 centavos
+#   bool  uint8 (2 = null)
+#   str   diccionario del grupo (longitudes int32 + UTF-8) e índices int32 (-1 = null)
+MAGIC = b"NXDUMP\x00\x01"
+FRAME_HEADER = struct.Struct("<BII")
+COUNT = struct.Struct("<I")
+END_FRAME = FRAME_HEADER.pack(0, 0, 0)
+# Un bloque mayor no sale de este servidor: se rechaza antes de descomprimirlo
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+NULL_UUID = bytes(16)
+NULL_INT = np.iinfo(np.int64).min
+
+@dataclass(frozen=True)
+class DumpTable:
+    code: int
+    name: str
+    alias: str
+    columns: tuple[tuple[str, str], ...]    # (columna, tipo)
+    source: str                             # FROM ... WHERE ... (filtrado por :user_id)
+    # Las tablas del usuario no guardan user_id: se completa al importar con el del volcado
+    owned: bool = True
+
+    def select_sql(self) -> str:
+        expressions = []
+        for column, kind in self.columns:
+            expression = f"{self.alias}.{column}"
+            if kind == "ts":
+                expression = f"CAST(EXTRACT(EPOCH FROM {expression}) * 1000000 AS bigint)"
+            elif kind == "cents":
+                expression = f"CAST({expression} * 100 AS bigint)"
+            elif kind == "str":
+                expression = f"CAST({expression} AS text)"
+            expressions.append(expression)
+        return f"SELECT {', '.join(expressions)} {self.source}"
+
+    def copy_columns(self) -> list[str]:
+        return (["user_id"] if self.owned else []) + [column for column, _ in self.columns]
+
+TABLES = (
+    DumpTable(
+        1, "users", "u",
+        (("id", "uuid"), ("email", "str"), ("display_name", "str"), ("is_active", "bool"), ("created_at", "ts")),
+        "FROM users u WHERE u.id = :user_id",
+        owned=False,
+    ),
+    DumpTable(
+        2, "category", "c",
+        (("id", "uuid"), ("name", "str"), ("created_at", "ts")),
+        "FROM category c WHERE c.user_id = :user_id ORDER BY c.id",
+    ),
+    DumpTable(
+        3, "ledger_account", "a",
+        (
+            ("id", "uuid"), ("parent_id", "uuid"), ("name", "str"), ("kind", "str"), ("last4", "str"),
+            ("created_at", "ts"), ("updated_at", "ts"), ("deleted_at", "ts"),
+        ),
+        "FROM ledger_account a WHERE a.user_id = :user_id ORDER BY a.id",
+    ),
+    DumpTable(
+        4, "journal_entry", "e",
+        (("id", "uuid"), ("occurred_at", "ts"), ("description", "str"), ("created_at", "ts"), ("deleted_at", "ts")),
+        "FROM journal_entry e WHERE e.user_id = :user_id ORDER BY e.occurred_at, e.id",
+    ),
+    # Las líneas pasan por una tabla temporal: al importar se verifica que solo referencian filas del volcado
+    DumpTable(
+        5, "journal_line", "l",
+        (
+            ("id", "uuid"), ("entry_id", "uuid"), ("account_id", "uuid"), ("amount", "cents"), ("side", "str"),
+            ("category_id", "uuid"), ("reconciled_at", "ts"),
+        ),
+        "FROM journal_line l JOIN journal_entry e ON e.id = l.entry_id WHERE e.user_id = :user_id",
+        owned=False,
+    ),
+)
+TABLES_BY_CODE = {table.code: table for table in TABLES}
+
+def _encode_column(kind: str, values: tuple) -> bytes:
+    if kind == "uuid":
+        return b"".join(value.bytes if value is not None else NULL_UUID for value in values)
+    if kind in ("ts", "cents"):
+        return np.array([NULL_INT if value is None else value for value in values], dtype="<i8").tobytes()
+    if kind == "bool":
+        return np.array([2 if value is None else int(value) for value in values], dtype=np.uint8).tobytes()
+
+    dictionary: dict[str, int] = {}
+    indices = [-1 if value is None else dictionary.setdefault(value, len(dictionary)) for value in values]
+    encoded = [value.encode("utf-8") for value in dictionary]
+    return b"".join((
+        COUNT.pack(len(encoded)),
+        np.array([len(value) for value in encoded], dtype="<i4").tobytes(),
+        b"".join(encoded),
+        np.array(indices, dtype="<i4").tobytes(),
+    ))
+
+# Al importar, cada columna se convierte directamente en campos de COPY (formato texto): los uuid en
+# hexadecimal, las fechas en ISO 8601 UTC y cada texto del diccionario se escapa una sola vez
+COPY_NULL = "\\N"
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+COPY_BOOLS = {0: "f", 1: "t", 2: COPY_NULL}
+
+def _decode_column(kind: str, data: memoryview, rows: int) -> list[str]:
+    width = {"uuid": 16, "ts": 8, "cents": 8, "bool": 1}.get(kind)
+    if width and len(data) != width * rows:
+        raise DumpError(f"Corrupt {kind} column")
+
+    if kind == "uuid":
+        digits = data.hex()
+        null = NULL_UUID.hex()
+        return [
+            COPY_NULL if digits[i:i + 32] == null else digits[i:i + 32]
+            for i in range(0, len(digits), 32)
+        ]
+    if kind == "ts":
+        # datetime64 usa INT64_MIN como NaT: el null del formato
+        values = np.frombuffer(data, dtype="<i8").astype("datetime64[us]")
+        return [COPY_NULL if value == "NaT" else value for value in np.datetime_as_string(values, timezone="UTC").tolist()]
+    if kind == "cents":
+        return [
+            f"{'-' if value < 0 else ''}{abs(value) // 100}.{abs(value) % 100:02d}"
+            for value in np.frombuffer(data, dtype="<i8").tolist()
+        ]
+    if kind == "bool":
+        return [COPY_BOOLS[value] for value in np.frombuffer(data, dtype=np.uint8).tolist()]
+
+    (size,) = COUNT.unpack_from(data)
+    lengths = np.frombuffer(data, dtype="<i4", count=size, offset=COUNT.size)
+    offset = COUNT.size + 4 * size
+    dictionary = []
+    for length in lengths.tolist():
+        dictionary.append(data[offset:offset + length].tobytes().decode("utf-8").translate(COPY_ESCAPES))
+        offset += length
+    if offset + 4 * rows != len(data):
+        raise DumpError("Corrupt text column")
+    indices = np.frombuffer(data, dtype="<i4", count=rows, offset=offset)
+    return [dictionary[index] if index >= 0 else COPY_NULL for index in indices.tolist()]
+
+# Comprime un grupo de filas (trabajo de CPU: se ejecuta fuera del bucle de eventos)
+def encode_frame(table: DumpTable, rows: list) -> bytes:
+    columns = list(zip(*rows)) or [()] * len(table.columns)
+    parts = [COUNT.pack(len(rows))]
+    for (_, kind), values in zip(table.columns, columns):
+        data = _encode_column(kind, values)
+        parts += [COUNT.pack(len(data)), data]
+    payload = b"".join(parts)
+    compressed = zlib.compress(payload, 6)
+    return FRAME_HEADER.pack(table.code, len(payload), len(compressed)) + compressed
+
+def decode_frame(table: DumpTable, raw_size: int, compressed: bytes) -> list[list[str]]:
+    try:
+        decompressor = zlib.decompressobj()
+        payload = memoryview(decompressor.decompress(compressed, raw_size))
+        if len(payload) != raw_size or not decompressor.eof:
+            raise DumpError("Corrupt dump frame")
+
+        (rows,) = COUNT.unpack_from(payload)
+        offset = COUNT.size
+        columns = []
+        for _, kind in table.columns:
+            (size,) = COUNT.unpack_from(payload, offset)
+            offset += COUNT.size
+            columns.append(_decode_column(kind, payload[offset:offset + size], rows))
+            offset += size
+        if offset != raw_size:
+            raise DumpError("Corrupt dump frame")
+    except (zlib.error, struct.error, ValueError, IndexError, UnicodeDecodeError) as exc:
+        if isinstance(exc, DumpError):
+            raise
+        raise DumpError(f"Corrupt {table.name} frame: {exc}")
+    return columns
+
+# Filas de COPY de un grupo; las tablas del usuario llevan primero su user_id
+def copy_block(columns: list[list[str]], user_field: str | None) -> bytes:
+    if user_field is not None:
+        columns = [[user_field] * len(columns[0]), *columns]
+    return "".join(f"{row}\n" for row in map("\t".join, zip(*columns))).encode("utf-8")
+
+# Volcado de un usuario como flujo de bloques (None si no existe). Todas las tablas se leen en la misma
+# instantánea (REPEATABLE READ) con cursores de servidor: la memoria queda acotada a un grupo de filas
+async def export_user(session: AsyncSession, user_id: UUID) -> AsyncIterator[bytes] | None:
+    await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    exists = await session.execute(text("SELECT 1 FROM users WHERE id = :user_id"), {"user_id": user_id})
+    if exists.scalar() is None:
+        return None
+    return _export_frames(session, user_id)
+
+async def _export_frames(session: AsyncSession, user_id: UUID) -> AsyncIterator[bytes]:
+    group_size = get_settings().DUMP_ROW_GROUP_SIZE
+    yield MAGIC
+    for table in TABLES:
+        result = await session.stream(
+            text(table.select_sql()).execution_options(yield_per=group_size), {"user_id": user_id}
+        )
+        async for rows in result.partitions(group_size):
+            yield await asyncio.to_thread(encode_frame, table, rows)
+    yield END_FRAME
+
+# Separa los bloques a medida que llega el cuerpo de la request; solo retiene el bloque incompleto
+class FrameReader:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.started = False
+        self.finished = False
+
+    def feed(self, chunk: bytes) -> list[tuple[int, int, bytes]]:
+        if self.finished:
+            if chunk:
+                raise DumpError("Unexpected data after the end of the dump")
+            return []
+        self.buffer += chunk
+        if not self.started:
+            if len(self.buffer) < len(MAGIC):
+                return []
+            if self.buffer[:len(MAGIC)] != MAGIC:
+                raise DumpError("Not a ledger dump (bad header or unsupported version)")
+            del self.buffer[:len(MAGIC)]
+            self.started = True
+
+        frames = []
+        while len(self.buffer) >= FRAME_HEADER.size:
+            code, raw_size, size = FRAME_HEADER.unpack_from(self.buffer)
+            if raw_size > MAX_FRAME_BYTES or size > MAX_FRAME_BYTES:
+                raise DumpError("Dump frame too large")
+            if len(self.buffer) < FRAME_HEADER.size + size:
+                break
+            compressed = bytes(self.buffer[FRAME_HEADER.size:FRAME_HEADER.size + size])
+            del self.buffer[:FRAME_HEADER.size + size]
+            if code == 0:
+                self.finished = True
+                if self.buffer:
+                    raise DumpError("Unexpected data after the end of the dump")
+                break
+            frames.append((code, raw_size, compressed))
+        return frames
+
+# Bloques decodificados (tabla, columnas) en el orden del formato: usuario, categorías, cuentas, asientos, líneas
+async def read_frames(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[DumpTable, list[list[str]]]]:
+    reader = FrameReader()
+    current = 0
+    async for chunk in chunks:
+        for code, raw_size, compressed in reader.feed(chunk):
+            table = TABLES_BY_CODE.get(code)
+            if table is None or code < current:
+                raise DumpError(f"Unexpected dump frame (table {code})")
+            current = code
+            yield table, await asyncio.to_thread(decode_frame, table, raw_size, compressed)
+    if not reader.finished:
+        raise DumpError("Truncated dump")
+
+STAGING_SQL = text("""
+CREATE TEMP TABLE dump_journal_line (LIKE journal_line INCLUDING DEFAULTS) ON COMMIT DROP
+""")
+
+# Solo pasan las líneas cuyo asiento, cuenta y categoría son del usuario importado
+INSERT_LINES_SQL = text("""
+INSERT INTO journal_line (id, entry_id, account_id, amount, side, category_id, reconciled_at)
+SELECT s.id, s.entry_id, s.account_id, s.amount, s.side, s.category_id, s.reconciled_at
+FROM dump_journal_line s
+JOIN journal_entry e ON e.id = s.entry_id AND e.user_id = :user_id
+JOIN ledger_account a ON a.id = s.account_id AND a.user_id = :user_id
+LEFT JOIN category c ON c.id = s.category_id
+WHERE s.category_id IS NULL OR c.user_id = :user_id
+""")
+
+FOREIGN_PARENTS_SQL = text("""
+SELECT count(*)
+FROM ledger_account a
+JOIN ledger_account p ON p.id = a.parent_id
+WHERE a.user_id = :user_id AND p.user_id <> :user_id
+""")
+
+# Tabla de cierre de todas las cuentas importadas (cada una con sus ancestros); un ciclo anula la importación
+CLOSURE_SQL = text("""
+WITH RECURSIVE paths (ancestor_id, descendant_id, depth, parent_id) AS (
+    SELECT id, id, 0, parent_id FROM ledger_account WHERE user_id = :user_id
+    UNION ALL
+    SELECT a.id, p.descendant_id, p.depth + 1, a.parent_id
+    FROM paths p
+    JOIN ledger_account a ON a.id = p.parent_id
+) CYCLE ancestor_id SET is_cycle USING visited,
+inserted AS (
+    INSERT INTO ledger_account_closure (ancestor_id, descendant_id, depth)
+    SELECT ancestor_id, descendant_id, depth FROM paths WHERE NOT is_cycle
+    RETURNING 1
+)
+SELECT COALESCE(bool_or(is_cycle), false) FROM paths
+""")
+
+# Registro de eventos (ver app/services/ledger_events.py): las cuentas y los asientos vigentes importados
+ACCOUNT_EVENTS_SQL = text("""
+INSERT INTO ledger_event (user_id, entity, entity_id, action, payload)
+SELECT user_id, 'account', id, action, payload
+FROM (
+    SELECT a.user_id, a.id, 'created' AS action, 0 AS step, a.created_at AS at, jsonb_build_object(
+        'name', a.name, 'kind', a.kind, 'last4', a.last4, 'parent_id', a.parent_id
+    ) AS payload
+    FROM ledger_account a WHERE a.user_id = :user_id
+    UNION ALL
+    SELECT a.user_id, a.id, 'deleted', 1, a.deleted_at, '{}'::jsonb
+    FROM ledger_account a WHERE a.user_id = :user_id AND a.deleted_at IS NOT NULL
+) events
+ORDER BY step, at, id
+""")
+
+ENTRY_EVENTS_SQL = text("""
+INSERT INTO ledger_event (user_id, entity, entity_id, action, payload)
+SELECT e.user_id, 'entry', e.id, 'created', jsonb_build_object(
+    'occurred_at', e.occurred_at,
+    'description', e.description,
+    'lines', COALESCE(
+        jsonb_agg(jsonb_build_object(
+            'entry_id', l.entry_id, 'account_id', l.account_id,
+            'amount', l.amount::text, 'side', l.side, 'category_id', l.category_id
+        ) ORDER BY l.id) FILTER (WHERE l.id IS NOT NULL),
+        '[]'
+    )
+)
+FROM journal_entry e
+LEFT JOIN journal_line l ON l.entry_id = e.id
+WHERE e.user_id = :user_id AND e.deleted_at IS NULL
+GROUP BY e.id
+ORDER BY e.occurred_at, e.id
+""")
+
+# Lee el primer bloque del volcado (el usuario) para saber a quién se importa antes de elegir la base.
+# Devuelve el id, el email y los bloques, empezando por ese mismo
+async def open_dump(
+    chunks: AsyncIterator[bytes],
+) -> tuple[UUID, str, AsyncIterator[tuple[DumpTable, list[list[str]]]]]:
+    frames = read_frames(chunks)
+    first = await anext(frames, None)
+    if first is None or first[0].name != "users" or len(first[1][0]) != 1:
+        raise DumpError("A ledger dump must start with exactly one user")
+    try:
+        user_id = UUID(hex=first[1][0][0])
+    except ValueError:
+        raise DumpError("A ledger dump must start with exactly one user")
+
+    async def replay():
+        yield first
+        async for frame in frames:
+            yield frame
+
+    return user_id, first[1][1][0], replay()
+
+# Importa un volcado completo en una transacción: COPY por tabla a medida que llegan los bloques y,
+# al final, las tablas derivadas (cierre de cuentas, gasto por categoría) y el registro de eventos.
+# Conserva los ids: el usuario no puede existir en el destino
+async def import_dump(
+    db: AsyncSession, user_id: UUID, frames: AsyncIterator[tuple[DumpTable, list[list[str]]]]
+) -> dict:
+    counts = {table.name: 0 for table in TABLES}
+
+    pending = await anext(frames, None)
+    exists = await db.execute(text("SELECT 1 FROM users WHERE id = :user_id"), {"user_id": user_id})
+    if exists.scalar() is not None:
+        raise DumpError("User already exists")
+
+    await db.execute(STAGING_SQL)
+    connection = await (await db.connection()).get_raw_connection()
+    try:
+        async with connection.driver_connection.cursor() as cursor:
+            while pending is not None:
+                table = pending[0]
+                target = "dump_journal_line" if table.name == "journal_line" else table.name
+                async with cursor.copy(f"COPY {target} ({', '.join(table.copy_columns())}) FROM STDIN") as copy:
+                    while pending is not None and pending[0] is table:
+                        columns = pending[1]
+                        await copy.write(await asyncio.to_thread(copy_block, columns, user_id.hex if table.owned else None))
+                        counts[table.name] += len(columns[0])
+                        pending = await anext(frames, None)
+    except psycopg.errors.DataError as exc:
+        raise DumpError(f"Invalid value in dump ({exc.diag.message_primary})")
+    except psycopg.errors.IntegrityError as exc:
+        raise DumpError(f"Dump conflicts with existing data ({exc.diag.constraint_name or exc.sqlstate})")
+
+    params = {"user_id": user_id}
+    inserted = await db.execute(INSERT_LINES_SQL, params)
+    if inserted.rowcount != counts["journal_line"]:
+        raise DumpError("Journal lines reference entries, accounts or categories outside the dump")
+    if (await db.execute(FOREIGN_PARENTS_SQL, params)).scalar():
+        raise DumpError("Accounts reference parents outside the dump")
+    if (await db.execute(CLOSURE_SQL, params)).scalar():
+        raise DumpError("Account hierarchy contains a cycle")
+
+    await apply_user_spend(db, user_id, 1)
+    await apply_user_usage(db, user_id, 1)
+    await refresh_user_fingerprints(db, user_id)
+    events = (await db.execute(ACCOUNT_EVENTS_SQL, params)).rowcount
+    events += (await db.execute(ENTRY_EVENTS_SQL, params)).rowcount
+    for entity in ("user", "account", "entry"):
+        invalidate(db, user_id, entity)
+
+    await db.commit()
+    return {
+        "user_id": user_id,
+        "categories": counts["category"],
+        "accounts": counts["ledger_account"],
+        "entries": counts["journal_entry"],
+        "lines": counts["journal_line"],
+        "events": events,
+    }
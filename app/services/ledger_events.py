@@ -0,0 +1,55 @@
+import json
+from typing import Iterable
+
+from pydantic_core import to_jsonable_python
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+# Eventos pendientes de una transacción: se insertan justo antes del commit, en la misma transacción
+PENDING_KEY = "ledger_events"
+
+LINE_FIELDS = ("entry_id", "account_id", "amount", "side", "category_id")
+
+# Una sola sentencia con un arreglo por columna: con executemany cada fila es un viaje más al driver
+INSERT_EVENTS_SQL = text("""
+INSERT INTO ledger_event (user_id, entity, entity_id, action, payload)
+SELECT * FROM unnest(
+    CAST(:user_ids AS uuid[]), CAST(:entities AS text[]), CAST(:entity_ids AS uuid[]),
+    CAST(:actions AS text[]), CAST(:payloads AS jsonb[])
+)
+""")
+
+# Estado de una línea tal como queda en el registro (montos como texto: no se pierde precisión)
+def line_payload(line) -> dict:
+    return to_jsonable_python({field: getattr(line, field, None) for field in LINE_FIELDS})
+
+# Líneas de un asiento; las filas de bloqueo de un asiento sin líneas no traen cuenta
+def lines_payload(lines: Iterable) -> list[dict]:
+    return [line_payload(line) for line in lines if line.account_id is not None]
+
+def record_event(
+    session: AsyncSession | Session, user_id, entity: str, entity_id, action: str, payload: dict | None = None
+) -> None:
+    target = session.sync_session if isinstance(session, AsyncSession) else session
+    target.info.setdefault(PENDING_KEY, []).append(
+        (str(user_id), entity, str(entity_id), action, json.dumps(to_jsonable_python(payload or {})))
+    )
+
+# Un solo INSERT por transacción. Si falla, falla el commit y no queda el cambio sin su evento
+@event.listens_for(Session, "before_commit")
+def _insert_pending(session: Session) -> None:
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        user_ids, entities, entity_ids, actions, payloads = map(list, zip(*pending))
+        session.execute(INSERT_EVENTS_SQL, {
+            "user_ids": user_ids,
+            "entities": entities,
+            "entity_ids": entity_ids,
+            "actions": actions,
+            "payloads": payloads,
+        })
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,174 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from functools import partial
+from itertools import groupby
+from multiprocessing import get_context
+from typing import Any, Iterable
+
+import psycopg
+from psycopg import sql
+
+from app.core.config import get_settings
+from app.core.sharding import shard_names, shard_url
+
+class ProjectionError(ValueError):
+    pass
+
+@dataclass
+class Event:
+    id: int
+    user_id: str
+    entity: str
+    entity_id: str
+    action: str
+    payload: dict
+
+# Un modelo de lectura que se reconstruye reproduciendo los eventos de cada usuario en orden.
+# El estado es por usuario: los usuarios se reparten entre procesos sin coordinarse
+class Projection:
+    name: str
+    table: str
+    # Columnas de la tabla; rows() entrega tuplas en este orden
+    columns: tuple[str, ...]
+
+    def new_state(self) -> Any:
+        raise NotImplementedError
+
+    def apply(self, state: Any, event: Event) -> None:
+        raise NotImplementedError
+
+    def rows(self, user_id: str, state: Any, last_event_id: int) -> Iterable[tuple]:
+        raise NotImplementedError
+
+# Saldos por cuenta (débitos y créditos de los asientos vigentes)
+class AccountBalances(Projection):
+    name = "account-balances"
+    table = "account_balance_projection"
+    columns = ("user_id", "account_id", "debits", "credits", "last_event_id")
+
+    def new_state(self) -> dict:
+        return {"accounts": {}, "deleted": set()}
+
+    def _add(self, state: dict, line: dict, sign: int) -> None:
+        totals = state["accounts"].setdefault(line["account_id"], [Decimal("0"), Decimal("0")])
+        totals[0 if line["side"] == "D" else 1] += sign * Decimal(line["amount"])
+
+    def apply(self, state: dict, event: Event) -> None:
+        payload = event.payload
+        if event.entity == "account":
+            state["accounts"].setdefault(event.entity_id, [Decimal("0"), Decimal("0")])
+            if event.action == "deleted":
+                state["deleted"].add(event.entity_id)
+            elif event.action == "restored":
+                state["deleted"].discard(event.entity_id)
+        elif event.entity == "entry":
+            # Crear, eliminar y restaurar traen las líneas del asiento; editarlo no cambia saldos
+            sign = {"created": 1, "restored": 1, "deleted": -1}.get(event.action)
+            if sign:
+                for line in payload.get("lines", []):
+                    self._add(state, line, sign)
+        elif event.entity == "line":
+            if event.action == "updated":
+                self._add(state, payload["before"], -1)
+                self._add(state, payload["after"], 1)
+            else:
+                self._add(state, payload, 1 if event.action == "created" else -1)
+
+    def rows(self, user_id: str, state: dict, last_event_id: int) -> Iterable[tuple]:
+        for account_id, (debits, credits) in state["accounts"].items():
+            if account_id not in state["deleted"]:
+                yield (user_id, account_id, debits, credits, last_event_id)
+
+PROJECTIONS: dict[str, Projection] = {projection.name: projection for projection in (AccountBalances(),)}
+
+# Partición de un usuario: la misma expresión en la lectura de eventos y en el borrado de la proyección
+PARTITION_SQL = "(hashtext(user_id::text) & 2147483647) %% %(parts)s = %(part)s"
+
+def _connect(shard: str) -> psycopg.Connection:
+    settings = get_settings()
+    return psycopg.connect(
+        shard_url(shard).replace("postgresql+psycopg://", "postgresql://", 1),
+        options=f"-csearch_path={settings.PG_SCHEMA},public -cstatement_timeout={settings.STATEMENT_TIMEOUT_BACKGROUND_MS}",
+    )
+
+# Se ejecuta en un proceso del pool: reconstruye los usuarios de una partición de un shard en una transacción.
+# REPEATABLE READ: los eventos leídos y el borrado ven la misma instantánea
+def _rebuild_partition(name: str, shard: str, part: int, parts: int) -> dict:
+    projection = PROJECTIONS[name]
+    params = {"part": part, "parts": parts}
+    rows: list[tuple] = []
+    users = events = 0
+
+    with _connect(shard) as connection:
+        connection.isolation_level = psycopg.IsolationLevel.REPEATABLE_READ
+        # Dos reconstrucciones de la misma proyección no se pisan partición a partición
+        connection.execute("SELECT pg_advisory_xact_lock(hashtext(%s), %s)", (projection.table, part))
+
+        with connection.cursor(name=f"events_{part}") as cursor:
+            cursor.itersize = 5000
+            cursor.execute(
+                "SELECT id, user_id::text, entity, entity_id::text, action, payload FROM ledger_event "
+                f"WHERE {PARTITION_SQL} ORDER BY user_id, id",
+                params,
+            )
+            for user_id, user_events in groupby((Event(*row) for row in cursor), key=lambda event: event.user_id):
+                state = projection.new_state()
+                last_event_id = 0
+                for event in user_events:
+                    projection.apply(state, event)
+                    last_event_id = event.id
+                    events += 1
+                rows.extend(projection.rows(user_id, state, last_event_id))
+                users += 1
+
+        connection.execute(
+            sql.SQL("DELETE FROM {} WHERE ").format(sql.Identifier(projection.table)) + sql.SQL(PARTITION_SQL),
+            params,
+        )
+        copy_sql = sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(projection.table), sql.SQL(", ").join(map(sql.Identifier, projection.columns))
+        )
+        with connection.cursor().copy(copy_sql) as copy:
+            for row in rows:
+                copy.write_row(row)
+
+    return {"users": users, "events": events, "rows": len(rows)}
+
+# Reconstruye una proyección desde cero repartiendo los usuarios entre PROJECTION_WORKERS procesos.
+# Cada partición se reemplaza en su propia transacción: los saldos de cada usuario son siempre coherentes
+async def rebuild_projection(name: str) -> dict:
+    if name not in PROJECTIONS:
+        raise ProjectionError(f"Unknown projection: {name}")
+
+    settings = get_settings()
+    workers = settings.PROJECTION_WORKERS or os.cpu_count() or 1
+    # Más particiones que procesos: un usuario con muchos eventos no deja al resto esperando
+    parts = max(settings.PROJECTION_PARTITIONS, workers)
+    # Cada shard tiene sus propios eventos y su propia proyección: se reparten todas sus particiones
+    shards = shard_names()
+    loop = asyncio.get_running_loop()
+
+    # spawn: los procesos no heredan el bucle de eventos ni las conexiones del pool
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, partial(_rebuild_partition, name, shard, part, parts))
+            for shard in shards
+            for part in range(parts)
+        ))
+
+    totals = {
+        "projection": name,
+        "shards": len(shards),
+        "partitions": parts,
+        "workers": workers,
+        "users": 0,
+        "events": 0,
+        "rows": 0,
+    }
+    for result in results:
+        for key, value in result.items():
+            totals[key] += value
+    return totals
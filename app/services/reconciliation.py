@@ -0,0 +1,191 @@
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import Iterable
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.ledger_events import line_payload, record_event
+
+@dataclass
+class StatementItem:
+    index: int
+    occurred_on: date
+    cents: int              # Con signo: positivo entra dinero a la cuenta (igual que la importación)
+    description: str | None
+
+@dataclass
+class LedgerItem:
+    line_id: UUID
+    entry_id: UUID
+    account_id: UUID
+    amount: Decimal
+    side: str
+    category_id: UUID | None
+    occurred_on: date
+    description: str | None
+
+    @property
+    def cents(self) -> int:
+        cents = int(self.amount * 100)
+        return cents if self.side == "D" else -cents
+
+def to_cents(amount: Decimal) -> int:
+    return int((amount * 100).to_integral_value())
+
+# Líneas sin conciliar de la cuenta en la ventana del extracto. Se bloquean los asientos (en orden de id,
+# como en category_spend): dos conciliaciones o una edición de la misma línea no se cruzan
+CANDIDATES_SQL = """
+SELECT
+    l.id AS line_id, l.entry_id, l.account_id, l.amount, l.side, l.category_id,
+    CAST(e.occurred_at AT TIME ZONE 'UTC' AS date) AS occurred_on, e.description
+FROM journal_line l
+JOIN journal_entry e ON e.id = l.entry_id
+WHERE l.account_id = :account_id
+  AND l.reconciled_at IS NULL
+  AND e.deleted_at IS NULL
+  AND e.occurred_at >= :start AND e.occurred_at < :end
+ORDER BY e.id
+{lock}
+"""
+
+MARK_RECONCILED_SQL = text("""
+UPDATE journal_line SET reconciled_at = :reconciled_at WHERE id = ANY(:ids)
+""")
+
+# Índice de candidatos: por monto exacto (centavos con signo) y, dentro de cada monto, ordenados por fecha.
+# Cada línea del extracto cuesta un acceso al diccionario y una búsqueda binaria, no un recorrido del libro
+class CandidateIndex:
+    def __init__(self, candidates: Iterable[LedgerItem]):
+        self.items: dict[int, list[LedgerItem]] = {}
+        for candidate in sorted(candidates, key=lambda item: (item.occurred_on, str(item.line_id))):
+            self.items.setdefault(candidate.cents, []).append(candidate)
+        self.days = {cents: [item.occurred_on.toordinal() for item in items] for cents, items in self.items.items()}
+
+    # Saca y devuelve el candidato de ese monto con la fecha más cercana dentro de la tolerancia
+    # (ante un empate, el más antiguo)
+    def take(self, cents: int, occurred_on: date, tolerance_days: int) -> LedgerItem | None:
+        days = self.days.get(cents)
+        if not days:
+            return None
+        day = occurred_on.toordinal()
+        position = bisect_left(days, day)
+        best = None
+        for i in (position - 1, position):
+            if 0 <= i < len(days) and abs(days[i] - day) <= tolerance_days:
+                if best is None or abs(days[i] - day) < abs(days[best] - day):
+                    best = i
+        if best is None:
+            return None
+        del days[best]
+        return self.items[cents].pop(best)
+
+    def remaining(self) -> list[LedgerItem]:
+        return sorted((item for items in self.items.values() for item in items), key=lambda item: item.occurred_on)
+
+# Primero las coincidencias de la misma fecha y después las más cercanas dentro de la tolerancia:
+# un gasto que se repite a diario no le quita su línea al del día siguiente
+def match_statement(
+    statement: list[StatementItem], candidates: Iterable[LedgerItem], tolerance_days: int
+) -> tuple[list[tuple[StatementItem, LedgerItem]], list[StatementItem], list[LedgerItem]]:
+    index = CandidateIndex(candidates)
+    pending = sorted(statement, key=lambda item: (item.occurred_on, item.index))
+    matches = []
+    for tolerance in sorted({0, tolerance_days}):
+        unmatched = []
+        for item in pending:
+            candidate = index.take(item.cents, item.occurred_on, tolerance)
+            if candidate is None:
+                unmatched.append(item)
+            else:
+                matches.append((item, candidate))
+        pending = unmatched
+    matches.sort(key=lambda match: match[0].index)
+    return matches, sorted(pending, key=lambda item: item.index), index.remaining()
+
+def _utc_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+# Concilia el extracto contra la cuenta: marca las líneas emparejadas en un solo UPDATE (salvo dry_run)
+# e informa lo que quedó sin pareja en ambos lados. Las líneas del libro sin pareja se informan solo
+# dentro del período del extracto; las de los márgenes de tolerancia pueden ser del extracto vecino
+async def reconcile_account(
+    db: AsyncSession,
+    user_id: UUID,
+    account_id: UUID,
+    statement: list[StatementItem],
+    tolerance_days: int,
+    dry_run: bool = False,
+) -> dict:
+    if not statement:
+        return {"matched": [], "unmatched_statement": [], "unmatched_ledger": [], "reconciled": 0}
+
+    first = min(item.occurred_on for item in statement)
+    last = max(item.occurred_on for item in statement)
+    result = await db.execute(
+        text(CANDIDATES_SQL.format(lock="" if dry_run else "FOR NO KEY UPDATE OF e")),
+        {
+            "account_id": account_id,
+            "start": _utc_start(first - timedelta(days=tolerance_days)),
+            "end": _utc_start(last + timedelta(days=tolerance_days + 1)),
+        },
+    )
+    candidates = [LedgerItem(**row._mapping) for row in result]
+
+    matches, unmatched_statement, unmatched_ledger = match_statement(statement, candidates, tolerance_days)
+
+    reconciled = 0
+    if matches and not dry_run:
+        reconciled_at = datetime.now(timezone.utc)
+        await db.execute(MARK_RECONCILED_SQL, {
+            "ids": [line.line_id for _, line in matches],
+            "reconciled_at": reconciled_at,
+        })
+        for _, line in matches:
+            # Conciliar no cambia el saldo: antes y después son la misma línea
+            payload = line_payload(line)
+            record_event(db, user_id, "line", line.line_id, "updated", {
+                "before": payload,
+                "after": payload,
+                "changes": {"reconciled_at": reconciled_at},
+            })
+        reconciled = len(matches)
+        await db.commit()
+
+    return {
+        "matched": [
+            {
+                "statement_index": item.index,
+                "line_id": line.line_id,
+                "entry_id": line.entry_id,
+                "occurred_on": line.occurred_on,
+                "amount": Decimal(line.cents).scaleb(-2),
+                "days_apart": (line.occurred_on - item.occurred_on).days,
+            }
+            for item, line in matches
+        ],
+        "unmatched_statement": [
+            {
+                "statement_index": item.index,
+                "occurred_on": item.occurred_on,
+                "amount": Decimal(item.cents).scaleb(-2),
+                "description": item.description,
+            }
+            for item in unmatched_statement
+        ],
+        "unmatched_ledger": [
+            {
+                "line_id": line.line_id,
+                "entry_id": line.entry_id,
+                "occurred_on": line.occurred_on,
+                "amount": Decimal(line.cents).scaleb(-2),
+                "description": line.description,
+            }
+            for line in unmatched_ledger
+            if first <= line.occurred_on <= last
+        ],
+        "reconciled": reconciled,
+    }
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import db
+from app.core.cache import invalidate
+from app.core.config import get_settings
+from app.core.push import entry_event, stage
+from app.services.account_usage import apply_entry_usage
+
+logger = logging.getLogger(__name__)
+
+# Índice del periodo (desde start_date) en el que cae una fecha, según la frecuencia de la plantilla
+def _period_index(column: str) -> str:
+    return f"""
+        CASE b.frequency
+            WHEN 'daily' THEN ({column} - b.start_date) / b.interval_count
+            WHEN 'weekly' THEN ({column} - b.start_date) / (7 * b.interval_count)
+            WHEN 'monthly' THEN (
+                (EXTRACT(YEAR FROM {column}) - EXTRACT(YEAR FROM b.start_date)) * 12
+                + EXTRACT(MONTH FROM {column}) - EXTRACT(MONTH FROM b.start_date)
+            )::int / b.interval_count
+            ELSE (EXTRACT(YEAR FROM {column}) - EXTRACT(YEAR FROM b.start_date))::int / b.interval_count
+        END"""
+
+# Materializa un lote de plantillas en una sola sentencia:
+# ocurrencias vencidas -> recurring_occurrence (ON CONFLICT = idempotente) -> journal_entry -> journal_line
+MATERIALIZE_BATCH_SQL = text(f"""
+WITH batch AS (
+    SELECT t.id, t.user_id, t.description, t.frequency, t.interval_count, t.start_date,
+           COALESCE(t.materialized_through, t.start_date - 1) AS from_date,
+           LEAST(CAST(:run_date AS date), COALESCE(t.end_date, CAST(:run_date AS date))) AS through_date
+    FROM recurring_template t
+    WHERE t.deleted_at IS NULL
+      AND t.start_date <= :run_date
+      AND COALESCE(t.materialized_through, t.start_date - 1)
+          < LEAST(CAST(:run_date AS date), COALESCE(t.end_date, CAST(:run_date AS date)))
+      -- Plantillas con cuentas eliminadas no generan asientos descuadrados. Quedan fuera del lote sin
+      -- avanzar materialized_through: si se restaura la cuenta o se corrige la plantilla, se generan sus fechas
+      AND NOT EXISTS (
+          SELECT 1 FROM recurring_template_line l
+          JOIN ledger_account a ON a.id = l.account_id
+          WHERE l.template_id = t.id AND a.deleted_at IS NOT NULL
+      )
+    ORDER BY t.id
+    LIMIT :batch_size
+    FOR UPDATE SKIP LOCKED
+),
+due AS (
+    SELECT b.id AS template_id, b.user_id, b.description, occ.occurs_on
+    FROM batch b
+    CROSS JOIN LATERAL generate_series(
+        GREATEST({_period_index("b.from_date")}, 0),
+        {_period_index("b.through_date")}
+    ) AS n
+    CROSS JOIN LATERAL (
+        SELECT (b.start_date + CASE b.frequency
+            WHEN 'daily' THEN make_interval(days => n * b.interval_count)
+            WHEN 'weekly' THEN make_interval(weeks => n * b.interval_count)
+            WHEN 'monthly' THEN make_interval(months => n * b.interval_count)
+            ELSE make_interval(years => n * b.interval_count)
+        END)::date AS occurs_on
+    ) AS occ
+    WHERE occ.occurs_on > b.from_date
+      AND occ.occurs_on <= b.through_date
+),
+occurrences AS (
+    INSERT INTO recurring_occurrence (template_id, occurs_on, entry_id)
+    SELECT template_id, occurs_on, gen_random_uuid() FROM due
+    ON CONFLICT (template_id, occurs_on) DO NOTHING
+    RETURNING template_id, occurs_on, entry_id
+),
+-- La huella (ver app/services/entry_fingerprint.py) sale de las líneas de la plantilla, que son las del asiento
+entries AS (
+    INSERT INTO journal_entry (id, user_id, occurred_at, description, fingerprint)
+    SELECT o.entry_id, d.user_id, o.occurs_on, d.description, (
+        SELECT entry_fingerprint(d.user_id, o.occurs_on, array_agg(entry_fingerprint_line(l.account_id, l.side, l.amount)))
+        FROM recurring_template_line l
+        WHERE l.template_id = o.template_id
+    )
+    FROM occurrences o
+    JOIN due d ON d.template_id = o.template_id AND d.occurs_on = o.occurs_on
+    RETURNING id, user_id, occurred_at, description
+),
+lines AS (
+    INSERT INTO journal_line (entry_id, account_id, amount, side)
+    SELECT o.entry_id, l.account_id, l.amount, l.side
+    FROM occurrences o
+    JOIN recurring_template_line l ON l.template_id = o.template_id
+    RETURNING entry_id, account_id, amount, side
+),
+-- Registro de eventos del libro (ver app/services/ledger_events.py), en la misma sentencia
+events AS (
+    INSERT INTO ledger_event (user_id, entity, entity_id, action, payload)
+    SELECT e.user_id, 'entry', e.id, 'created', jsonb_build_object(
+        'occurred_at', e.occurred_at,
+        'description', e.description,
+        'lines', COALESCE(
+            jsonb_agg(jsonb_build_object(
+                'entry_id', l.entry_id, 'account_id', l.account_id,
+                'amount', l.amount::text, 'side', l.side, 'category_id', NULL
+            )) FILTER (WHERE l.entry_id IS NOT NULL),
+            '[]'
+        )
+    )
+    FROM entries e
+    LEFT JOIN lines l ON l.entry_id = e.id
+    GROUP BY e.user_id, e.id, e.occurred_at, e.description
+    RETURNING id
+),
+marked AS (
+    UPDATE recurring_template t
+    SET materialized_through = b.through_date
+    FROM batch b
+    WHERE t.id = b.id
+    RETURNING t.id
+)
+SELECT
+    (SELECT count(*) FROM marked) AS templates,
+    (SELECT count(*) FROM entries) AS entries,
+    (SELECT count(*) FROM lines) AS lines,
+    -- Para avisar a los suscriptores: asientos nuevos y variación de saldo por (usuario, cuenta)
+    (SELECT json_agg(json_build_object('user_id', user_id, 'id', id)) FROM entries) AS new_entries,
+    (
+        SELECT json_agg(json_build_object('user_id', d.user_id, 'account_id', d.account_id, 'delta', d.delta))
+        FROM (
+            SELECT e.user_id, l.account_id,
+                   sum(CASE WHEN l.side = 'D' THEN l.amount ELSE -l.amount END)::text AS delta
+            FROM lines l
+            JOIN entries e ON e.id = l.entry_id
+            GROUP BY 1, 2
+        ) d
+    ) AS deltas
+""")
+
+# Deja un evento (y una invalidación de caché) por usuario con sus asientos materializados en el lote
+def stage_materialized(session, new_entries: list[dict] | None, deltas: list[dict] | None) -> None:
+    entry_ids: dict[str, list[str]] = defaultdict(list)
+    user_deltas: dict[str, dict[str, Decimal]] = defaultdict(dict)
+    for row in new_entries or []:
+        entry_ids[row["user_id"]].append(row["id"])
+    for row in deltas or []:
+        user_deltas[row["user_id"]][row["account_id"]] = Decimal(row["delta"])
+    for user_id, ids in entry_ids.items():
+        stage(session, user_id, entry_event("created", ids, user_deltas[user_id]))
+        invalidate(session, user_id, "entry")
+
+# Genera las ocurrencias vencidas de los usuarios de un shard, un lote (y una transacción) a la vez
+async def _materialize_shard(session: AsyncSession, run_date: date, batch_size: int) -> dict:
+    totals = {"templates": 0, "entries": 0, "lines": 0}
+    while True:
+        result = await session.execute(
+            MATERIALIZE_BATCH_SQL, {"run_date": run_date, "batch_size": batch_size}
+        )
+        row = result.one()
+        stage_materialized(session, row.new_entries, row.deltas)
+        if row.new_entries:
+            await apply_entry_usage(session, [UUID(entry["id"]) for entry in row.new_entries], 1)
+        await session.commit()
+
+        if row.templates == 0:
+            break
+        totals["templates"] += row.templates
+        totals["entries"] += row.entries
+        totals["lines"] += row.lines
+    return totals
+
+# Genera todas las ocurrencias vencidas de todos los usuarios (todos los shards a la vez)
+async def materialize_due_occurrences(run_date: date | None = None, batch_size: int | None = None) -> dict:
+    run_date = run_date or datetime.now(timezone.utc).date()
+    batch_size = batch_size or get_settings().RECURRING_BATCH_SIZE
+
+    results = await db.for_each_shard(lambda session: _materialize_shard(session, run_date, batch_size))
+    return {key: sum(result[key] for result in results.values()) for key in ("templates", "entries", "lines")}
+
+# Tarea de fondo: materializa periódicamente mientras la app está viva
+async def run_scheduler() -> None:
+    interval = get_settings().RECURRING_INTERVAL_SECONDS
+    while True:
+        try:
+            totals = await materialize_due_occurrences()
+            if totals["entries"]:
+                logger.info("Recurring templates materialized: %s", totals)
+        except Exception:
+            logger.exception("Recurring materialization failed")
+        # Una cancelación que llega durante una operación del driver puede perderse: se respeta aquí
+        if asyncio.current_task().cancelling():
+            raise asyncio.CancelledError
+        await asyncio.sleep(interval)
@@ -0,0 +1,226 @@
+import asyncio
+import io
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+from typing import Hashable
+from uuid import UUID
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+
+# Formatos de exportación de los reportes (además de JSON)
+FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+
+# Secciones de cada reporte: (clave en report["accounts"], título, nombre del importe en cada cuenta)
+REPORTS = {
+    "balance-sheet": {
+        "title": "Balance Sheet",
+        "sections": (("assets", "Assets", "balance"), ("liabilities", "Liabilities", "balance"), ("equity", "Equity", "balance")),
+        "totals": (
+            ("total_assets", "Total assets"),
+            ("total_liabilities", "Total liabilities"),
+            ("total_equity", "Total equity"),
+            ("calculated_equity", "Assets - liabilities"),
+        ),
+    },
+    "income-statement": {
+        "title": "Income Statement",
+        "sections": (("income", "Income", "amount"), ("expenses", "Expenses", "amount")),
+        "totals": (
+            ("total_income", "Total income"),
+            ("total_expenses", "Total expenses"),
+            ("net_income", "Net income"),
+        ),
+    },
+}
+
+# Versión del libro de un usuario: el último evento registrado (toda escritura de cuentas, asientos o líneas
+# agrega uno). Un documento guardado con otra versión ya no se vuelve a pedir
+LEDGER_VERSION_SQL = text("SELECT COALESCE(max(id), 0) FROM ledger_event WHERE user_id = :user_id")
+
+AMOUNT_FORMAT = "#,##0.00"
+PDF_TABLE_ROWS = 40
+
+class RenderBusy(Exception):
+    pass
+
+async def ledger_version(db: AsyncSession, user_id: UUID) -> int:
+    return (await db.execute(LEDGER_VERSION_SQL, {"user_id": user_id})).scalar_one()
+
+# Cuentas de una sección en orden de árbol (cada padre antes que sus hijos) con su profundidad
+def _tree_rows(accounts: list[dict]) -> list[tuple[int, dict]]:
+    ids = {account["id"] for account in accounts}
+    children: dict[str | None, list[dict]] = {}
+    for account in accounts:
+        parent = account["parent_id"] if account["parent_id"] in ids else None
+        children.setdefault(parent, []).append(account)
+
+    rows = []
+    stack = [(0, account) for account in sorted(children.get(None, []), key=lambda a: a["name"], reverse=True)]
+    while stack:
+        depth, account = stack.pop()
+        rows.append((depth, account))
+        for child in sorted(children.get(account["id"], []), key=lambda a: a["name"], reverse=True):
+            stack.append((depth + 1, child))
+    return rows
+
+def _render_xlsx(spec: dict, subtitle: str, report: dict) -> bytes:
+    # write_only: las filas se escriben en streaming y la memoria no crece con el tamaño del reporte
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(spec["title"])
+    sheet.column_dimensions["A"].width = 48
+    sheet.column_dimensions["B"].width = 18
+    sheet.column_dimensions["C"].width = 18
+    bold = Font(bold=True)
+
+    def cell(value, font=None, number=False):
+        written = WriteOnlyCell(sheet, value=value)
+        if font:
+            written.font = font
+        if number:
+            written.number_format = AMOUNT_FORMAT
+        return written
+
+    sheet.append([cell(spec["title"], Font(bold=True, size=14))])
+    sheet.append([subtitle])
+    for key, label, amount in spec["sections"]:
+        sheet.append([])
+        sheet.append([cell(label, bold), cell("Amount", bold), cell("Including subaccounts", bold)])
+        for depth, account in _tree_rows(report["accounts"][key]):
+            sheet.append([
+                "    " * depth + account["name"],
+                cell(account[amount], number=True),
+                cell(account[f"rollup_{amount}"], number=True),
+            ])
+
+    sheet.append([])
+    for key, label in spec["totals"]:
+        sheet.append([cell(label, bold), cell(report["totals"][key], bold, number=True)])
+
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+def _render_pdf(spec: dict, subtitle: str, report: dict) -> bytes:
+    styles = getSampleStyleSheet()
+    story = [Paragraph(spec["title"], styles["Title"]), Paragraph(subtitle, styles["Normal"]), Spacer(1, 12)]
+    table_style = TableStyle([
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("LINEBELOW", (0, 0), (-1, 0), 0.5, colors.black),
+        ("ALIGN", (1, 0), (-1, -1), "RIGHT"),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+    ])
+
+    for key, label, amount in spec["sections"]:
+        header = [label, "Amount", "Including subaccounts"]
+        rows = [
+            [" " * 4 * depth + account["name"], f"{account[amount]:,.2f}", f"{account[f'rollup_{amount}']:,.2f}"]
+            for depth, account in _tree_rows(report["accounts"][key])
+        ]
+        # Tablas de a PDF_TABLE_ROWS filas con la cabecera repetida: partir una sola tabla enorme
+        # entre páginas crece de forma cuadrática con sus filas
+        for start in range(0, max(len(rows), 1), PDF_TABLE_ROWS):
+            story.append(Table([header, *rows[start:start + PDF_TABLE_ROWS]], colWidths=[260, 100, 120], style=table_style))
+        story.append(Spacer(1, 12))
+
+    totals = [[label, f"{report['totals'][key]:,.2f}"] for key, label in spec["totals"]]
+    story.append(Table(totals, colWidths=[260, 100], style=TableStyle([
+        ("FONTNAME", (0, 0), (-1, -1), "Helvetica-Bold"),
+        ("ALIGN", (1, 0), (-1, -1), "RIGHT"),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+    ])))
+
+    output = io.BytesIO()
+    SimpleDocTemplate(output, pagesize=A4, title=spec["title"]).build(story)
+    return output.getvalue()
+
+# Se ejecuta en un proceso del pool: solo recibe y devuelve datos planos (el reporte ya consultado)
+def render_document(name: str, fmt: str, subtitle: str, report: dict) -> bytes:
+    spec = REPORTS[name]
+    if fmt == "xlsx":
+        return _render_xlsx(spec, subtitle, report)
+    return _render_pdf(spec, subtitle, report)
+
+# Pool de procesos acotado, creado con el primer documento. spawn: los procesos no heredan el bucle de
+# eventos ni las conexiones del pool
+_render_pool: ProcessPoolExecutor | None = None
+# Documentos en proceso o esperando turno en el pool
+_pending = 0
+
+def _pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(
+            max_workers=get_settings().REPORT_RENDER_WORKERS, mp_context=get_context("spawn")
+        )
+    return _render_pool
+
+def shutdown_render_pool() -> None:
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+# Genera el documento fuera del bucle de eventos; con la cola llena se rechaza (RenderBusy) en vez de acumular
+async def render(name: str, fmt: str, subtitle: str, report: dict) -> bytes:
+    global _pending
+    if _pending >= get_settings().REPORT_RENDER_MAX_PENDING:
+        raise RenderBusy()
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_pool(), partial(render_document, name, fmt, subtitle, report))
+    finally:
+        _pending -= 1
+
+# Documentos generados, por (usuario, reporte, parámetros, formato, versión del libro). Acotada en bytes:
+# se descartan primero los menos usados. El TTL cubre los reportes que dependen de la hora actual
+class DocumentCache:
+    def __init__(self):
+        self.documents: OrderedDict[Hashable, tuple[float, bytes]] = OrderedDict()
+        self.size = 0
+
+    def get(self, key: Hashable) -> bytes | None:
+        if not get_settings().CACHE_ENABLED:
+            return None
+        entry = self.documents.get(key)
+        if entry is None:
+            return None
+        expires_at, document = entry
+        if expires_at < time.monotonic():
+            self.documents.pop(key)
+            self.size -= len(document)
+            return None
+        self.documents.move_to_end(key)
+        return document
+
+    def set(self, key: Hashable, document: bytes) -> None:
+        settings = get_settings()
+        limit = settings.REPORT_DOCUMENT_CACHE_MB * 1024 * 1024
+        if not settings.CACHE_ENABLED or len(document) > limit:
+            return
+        previous = self.documents.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous[1])
+        self.documents[key] = (time.monotonic() + settings.CACHE_TTL_SECONDS, document)
+        self.size += len(document)
+        while self.size > limit:
+            _, (_, oldest) = self.documents.popitem(last=False)
+            self.size -= len(oldest)
+
+documents = DocumentCache()
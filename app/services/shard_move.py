@@ -0,0 +1,178 @@
+from uuid import UUID
+
+import psycopg
+from psycopg import sql
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import db
+from app.core.cache import invalidate
+from app.core.sharding import (
+    MAIN_SHARD,
+    SET_LOCATION_SQL,
+    SHARD_LOCK_CLASS,
+    USER_LOCK_CLASS,
+    shard_names,
+    sharding_enabled,
+)
+
+class ShardMoveError(ValueError):
+    pass
+
+# Tablas del usuario en orden de dependencias y qué filas le pertenecen (alias t).
+# account_balance_projection no se copia: es derivable de ledger_event y se recalcula al reconstruirla
+MOVE_TABLES = (
+    ("users", "t.id = %(user_id)s"),
+    ("category", "t.user_id = %(user_id)s"),
+    ("ledger_account", "t.user_id = %(user_id)s"),
+    ("ledger_account_closure", "t.descendant_id IN (SELECT id FROM ledger_account WHERE user_id = %(user_id)s)"),
+    ("account_usage_daily", "t.user_id = %(user_id)s"),
+    ("journal_entry", "t.user_id = %(user_id)s"),
+    ("journal_line", "t.entry_id IN (SELECT id FROM journal_entry WHERE user_id = %(user_id)s)"),
+    ("category_spend_monthly", "t.user_id = %(user_id)s"),
+    ("recurring_template", "t.user_id = %(user_id)s"),
+    ("recurring_template_line", "t.template_id IN (SELECT id FROM recurring_template WHERE user_id = %(user_id)s)"),
+    ("recurring_occurrence", "t.template_id IN (SELECT id FROM recurring_template WHERE user_id = %(user_id)s)"),
+    ("import_fingerprint", "t.account_id IN (SELECT id FROM ledger_account WHERE user_id = %(user_id)s)"),
+    ("ledger_account_archive", "t.user_id = %(user_id)s"),
+    ("journal_entry_archive", "t.user_id = %(user_id)s"),
+    ("journal_line_archive", "t.entry_id IN (SELECT id FROM journal_entry_archive WHERE user_id = %(user_id)s)"),
+    # Los eventos reciben ids nuevos en el destino, en el mismo orden
+    ("ledger_event", "t.user_id = %(user_id)s ORDER BY t.id"),
+)
+
+# Columnas que se copian: las generadas y las identidades ALWAYS las asigna el destino
+COLUMNS_SQL = text("""
+SELECT table_name, array_agg(column_name::text ORDER BY ordinal_position) AS columns
+FROM information_schema.columns
+WHERE table_schema = current_schema()
+  AND table_name = ANY(:tables)
+  AND is_generated = 'NEVER'
+  AND identity_generation IS DISTINCT FROM 'ALWAYS'
+GROUP BY table_name
+""")
+
+LOCATE_FOR_UPDATE_SQL = text("SELECT shard, moving FROM user_shard WHERE user_id = :user_id FOR UPDATE")
+DELETE_LOCATION_SQL = text("DELETE FROM user_shard WHERE user_id = :user_id")
+
+EXCLUSIVE_LOCK_SQL = text("SELECT pg_advisory_xact_lock(:lock_class, hashtext(:lock_key))")
+
+USER_EXISTS_SQL = text("SELECT EXISTS (SELECT 1 FROM users WHERE id = :user_id)")
+
+# Borra todas las filas del usuario en un shard. Las líneas van primero: sus cuentas no se borran en cascada.
+# nexaris.purge_user habilita (solo en esta transacción) el borrado de sus eventos
+PURGE_SQL = (
+    text("SELECT set_config('nexaris.purge_user', :user_id, true)"),
+    text("DELETE FROM ledger_event WHERE user_id = CAST(:user_id AS uuid)"),
+    text("DELETE FROM account_balance_projection WHERE user_id = CAST(:user_id AS uuid)"),
+    text("""
+        DELETE FROM journal_line_archive
+        WHERE entry_id IN (SELECT id FROM journal_entry_archive WHERE user_id = CAST(:user_id AS uuid))
+    """),
+    text("DELETE FROM journal_entry_archive WHERE user_id = CAST(:user_id AS uuid)"),
+    text("DELETE FROM ledger_account_archive WHERE user_id = CAST(:user_id AS uuid)"),
+    text("DELETE FROM journal_line WHERE entry_id IN (SELECT id FROM journal_entry WHERE user_id = CAST(:user_id AS uuid))"),
+    text("""
+        DELETE FROM recurring_template_line
+        WHERE template_id IN (SELECT id FROM recurring_template WHERE user_id = CAST(:user_id AS uuid))
+    """),
+    text("DELETE FROM users WHERE id = CAST(:user_id AS uuid)"),
+)
+
+TOMBSTONE_SQL = text("INSERT INTO moved_user (user_id) VALUES (:user_id) ON CONFLICT (user_id) DO UPDATE SET moved_at = now()")
+CLEAR_TOMBSTONE_SQL = text("DELETE FROM moved_user WHERE user_id = :user_id")
+
+async def _purge(session: AsyncSession, user_id: UUID) -> None:
+    for stmt in PURGE_SQL:
+        await session.execute(stmt, {"user_id": str(user_id)})
+
+async def _raw_connection(session: AsyncSession) -> psycopg.AsyncConnection:
+    connection = await (await session.connection()).get_raw_connection()
+    return connection.driver_connection
+
+# Copia las filas del usuario de un shard a otro con COPY binario, tabla por tabla, sin pasar por Python
+async def _copy_user(source: AsyncSession, target: AsyncSession, user_id: UUID) -> dict:
+    result = await source.execute(COLUMNS_SQL, {"tables": [name for name, _ in MOVE_TABLES]})
+    columns = {row.table_name: row.columns for row in result}
+    params = {"user_id": user_id}
+    counts = {}
+
+    source_connection = await _raw_connection(source)
+    target_connection = await _raw_connection(target)
+    async with source_connection.cursor() as reader, target_connection.cursor() as writer:
+        for name, condition in MOVE_TABLES:
+            fields = sql.SQL(", ").join(map(sql.Identifier, columns[name]))
+            copy_out = sql.SQL("COPY (SELECT {} FROM {} t WHERE {}) TO STDOUT (FORMAT binary)").format(
+                sql.SQL(", ").join(sql.Identifier("t", column) for column in columns[name]),
+                sql.Identifier(name),
+                sql.SQL(condition),
+            )
+            copy_in = sql.SQL("COPY {} ({}) FROM STDIN (FORMAT binary)").format(sql.Identifier(name), fields)
+            async with reader.copy(copy_out, params) as rows_out, writer.copy(copy_in) as rows_in:
+                async for data in rows_out:
+                    await rows_in.write(data)
+            counts[name] = writer.rowcount
+    return counts
+
+# Traslada un usuario a otro shard. Pasos (cada uno en su transacción):
+# 1. El directorio lo marca en traslado: las requests nuevas reciben 503 hasta terminar.
+# 2. En el origen se toman exclusivos los locks del usuario y del shard (esperan a las escrituras en curso).
+# 3. El destino borra una copia anterior que hubiera quedado y recibe las filas del usuario.
+# 4. El directorio apunta al destino; el origen borra las filas y deja la marca de trasladado.
+# Devuelve None si el usuario no existe en su shard
+async def move_user(user_id: UUID, target: str, force: bool = False) -> dict | None:
+    if not sharding_enabled():
+        raise ShardMoveError("Sharding is not enabled")
+    if target not in shard_names():
+        raise ShardMoveError(f"Unknown shard: {target}")
+
+    async with db.shard_session(MAIN_SHARD) as directory:
+        row = (await directory.execute(LOCATE_FOR_UPDATE_SQL, {"user_id": user_id})).one_or_none()
+        source = row.shard if row else MAIN_SHARD
+        # force: retoma un traslado que quedó a medias (el flag quedó puesto)
+        if row and row.moving and not force:
+            raise ShardMoveError("User is already being moved")
+        await directory.execute(SET_LOCATION_SQL, {"user_id": user_id, "shard": source, "moving": True})
+        invalidate(directory, user_id, "shard")
+        await directory.commit()
+
+        switched = False
+        try:
+            async with db.shard_session(source) as source_db:
+                await source_db.execute(EXCLUSIVE_LOCK_SQL, {"lock_class": USER_LOCK_CLASS, "lock_key": str(user_id)})
+                await source_db.execute(EXCLUSIVE_LOCK_SQL, {"lock_class": SHARD_LOCK_CLASS, "lock_key": ""})
+                if not (await source_db.execute(USER_EXISTS_SQL, {"user_id": user_id})).scalar():
+                    return None
+
+                counts = {}
+                if source != target:
+                    async with db.shard_session(target) as target_db:
+                        await _purge(target_db, user_id)
+                        await target_db.execute(CLEAR_TOMBSTONE_SQL, {"user_id": user_id})
+                        try:
+                            counts = await _copy_user(source_db, target_db, user_id)
+                        except psycopg.Error as exc:
+                            raise ShardMoveError(f"Copy to {target} failed ({exc.diag.message_primary or exc.sqlstate})")
+                        await target_db.commit()
+
+                await directory.execute(SET_LOCATION_SQL, {"user_id": user_id, "shard": target, "moving": False})
+                invalidate(directory, user_id, "shard")
+                await directory.commit()
+                switched = True
+
+                if source != target:
+                    await _purge(source_db, user_id)
+                    await source_db.execute(TOMBSTONE_SQL, {"user_id": user_id})
+                    await source_db.commit()
+        finally:
+            # Sin cambiar de shard el usuario sigue donde estaba: se quita la marca de traslado
+            if not switched:
+                await directory.rollback()
+                if row is None:
+                    await directory.execute(DELETE_LOCATION_SQL, {"user_id": user_id})
+                else:
+                    await directory.execute(SET_LOCATION_SQL, {"user_id": user_id, "shard": source, "moving": False})
+                invalidate(directory, user_id, "shard")
+                await directory.commit()
+
+    return {"user_id": user_id, "source": source, "target": target, "rows": counts}
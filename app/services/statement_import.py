@@ -0,0 +1,329 @@
+import codecs
+import csv
+import hashlib
+import re
+import unicodedata
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import AsyncIterator, Iterable
+
+from fastapi import UploadFile
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import invalidate
+from app.core.push import entry_event, stage
+from app.models.import_fingerprint import ImportFingerprint
+from app.models.journal_entry import JournalEntry
+from app.models.journal_line import JournalLine
+from app.services.account_usage import apply_entry_usage
+from app.services.entry_fingerprint import refresh_entry_fingerprints
+from app.services.ledger_events import record_event
+
+CHUNK_SIZE = 64 * 1024
+CENT = Decimal("0.01")
+# Errores de parseo que se devuelven en la respuesta (el resto solo se cuenta)
+MAX_REPORTED_ERRORS = 50
+
+class StatementParseError(ValueError):
+    pass
+
+@dataclass
+class Movement:
+    line_number: int
+    occurred_on: date
+    amount: Decimal         # Positivo: entra dinero a la cuenta; negativo: sale
+    description: str
+
+@dataclass
+class CsvColumns:
+    date: str = "date"
+    description: str = "description"
+    amount: str | None = "amount"
+    debit: str | None = None
+    credit: str | None = None
+    date_format: str | None = None
+    delimiter: str = ","
+    decimal_separator: str | None = None    # None: se deduce de cada monto
+
+# Lee el archivo subido por bloques y entrega líneas de texto sin cargarlo entero en memoria
+async def iter_text_lines(upload: UploadFile, encoding: str = "utf-8-sig") -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+        # La última línea puede estar incompleta
+        pending = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+# Monto en centavos exactos: los asientos guardan dos decimales y un monto con fracciones de centavo se
+# redondearía en silencio (o a cero, que la base rechaza)
+def _cents(raw: str, value: str) -> Decimal:
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise StatementParseError(f"Invalid amount: {raw!r}")
+    cents = amount.quantize(CENT)
+    if cents != amount:
+        raise StatementParseError(f"Amount has fractions of a cent: {raw!r}")
+    return cents
+
+# Separador decimal de un monto CSV sin separador configurado. Con los dos separadores, el último es el
+# decimal; uno solo repetido es de miles (1.234.567). Uno solo seguido de exactamente tres dígitos
+# (1.500, 12,345) puede ser de miles o decimal con tres cifras: se rechaza en vez de adivinar
+def _decimal_separator(raw: str, value: str) -> str:
+    separators = set(re.findall(r"[,.]", value))
+    if len(separators) == 2:
+        return value[max(value.rfind(","), value.rfind("."))]
+    if not separators:
+        return "."
+    separator = separators.pop()
+    if value.count(separator) > 1:
+        return "," if separator == "." else "."
+    if re.fullmatch(rf"[1-9]\d{{0,2}}\{separator}\d{{3}}", value):
+        raise StatementParseError(f"Ambiguous amount, set the decimal separator: {raw!r}")
+    return separator
+
+# Monto de una columna CSV: admite símbolos de moneda, separadores de miles y negativos con signo o entre
+# paréntesis. Los separadores de miles deben formar grupos de tres dígitos
+def parse_amount(raw: str, decimal_separator: str | None = None) -> Decimal:
+    value = re.sub(r"[^\d,.\-()+]", "", raw.strip())
+    negative = value.startswith("-") or (value.startswith("(") and value.endswith(")"))
+    value = value.strip("-+()")
+    separator = decimal_separator or _decimal_separator(raw, value)
+    thousands = "," if separator == "." else "."
+    integer, _, fraction = value.partition(separator)
+    if separator in fraction or thousands in fraction:
+        raise StatementParseError(f"Invalid amount: {raw!r}")
+    if thousands in integer:
+        if not re.fullmatch(rf"\d{{1,3}}(\{thousands}\d{{3}})+", integer):
+            raise StatementParseError(f"Invalid amount: {raw!r}")
+        integer = integer.replace(thousands, "")
+    cents = _cents(raw, f"{integer}.{fraction}" if fraction else integer)
+    return -cents if negative else cents
+
+# TRNAMT de OFX: nunca lleva separadores de miles, su único "." o "," es el decimal
+def parse_ofx_amount(raw: str) -> Decimal:
+    value = raw.strip()
+    if not re.fullmatch(r"[+-]?(\d+([.,]\d*)?|[.,]\d+)", value):
+        raise StatementParseError(f"Invalid amount: {raw!r}")
+    return _cents(raw, value.replace(",", "."))
+
+# Un movimiento en cero no se puede registrar (las líneas exigen montos positivos)
+def check_amount(amount: Decimal) -> Decimal:
+    if amount == 0:
+        raise StatementParseError("Zero amount")
+    return amount
+
+def parse_date(raw: str, date_format: str | None = None) -> date:
+    raw = raw.strip()
+    try:
+        if date_format:
+            return datetime.strptime(raw, date_format).date()
+        return datetime.fromisoformat(raw.replace("Z", "+00:00")).date()
+    except ValueError:
+        raise StatementParseError(f"Invalid date: {raw!r}")
+
+# Líneas que se le entregan al lector CSV a medida que llegan del archivo
+class LineFeed:
+    def __init__(self):
+        self.lines: deque[str] = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+# Un solo lector CSV para todo el archivo. Un registro se le entrega completo: si una línea deja comillas
+# abiertas (un campo entre comillas con saltos de línea, p. ej. en el memo) se espera a la que las cierra
+async def parse_csv(lines: AsyncIterator[str], columns: CsvColumns) -> AsyncIterator[Movement | StatementParseError]:
+    header: dict[str, int] | None = None
+    feed = LineFeed()
+    reader = csv.reader(feed, delimiter=columns.delimiter)
+    line_number = record_start = 0
+    quoted = False
+    async for line in lines:
+        line_number += 1
+        if not quoted:
+            if not line.strip():
+                continue
+            record_start = line_number
+        feed.lines.append(line)
+        quoted ^= line.count('"') % 2 == 1
+        if quoted:
+            continue
+        try:
+            row = next(reader)
+        except csv.Error as exc:
+            feed.lines.clear()
+            yield StatementParseError(f"Line {record_start}: {exc}")
+            continue
+
+        if header is None:
+            header = {name.strip().lower(): i for i, name in enumerate(row)}
+            wanted = [columns.date, columns.description] + [
+                c for c in (columns.amount, columns.debit, columns.credit) if c
+            ]
+            missing = [c for c in wanted if c.lower() not in header]
+            if missing or not (columns.amount or columns.debit or columns.credit):
+                raise StatementParseError(f"Missing CSV columns: {', '.join(missing)}")
+            continue
+
+        def cell(name: str | None) -> str:
+            if not name:
+                return ""
+            index = header[name.lower()]
+            return row[index] if index < len(row) else ""
+
+        try:
+            if columns.amount and cell(columns.amount).strip():
+                amount = parse_amount(cell(columns.amount), columns.decimal_separator)
+            else:
+                debit = cell(columns.debit).strip()
+                credit = cell(columns.credit).strip()
+                amount = (
+                    (parse_amount(credit, columns.decimal_separator) if credit else Decimal("0"))
+                    - (parse_amount(debit, columns.decimal_separator) if debit else Decimal("0"))
+                )
+            yield Movement(
+                line_number=record_start,
+                occurred_on=parse_date(cell(columns.date), columns.date_format),
+                amount=check_amount(amount),
+                description=cell(columns.description).strip(),
+            )
+        except StatementParseError as exc:
+            yield StatementParseError(f"Line {record_start}: {exc}")
+
+    if quoted:
+        yield StatementParseError(f"Line {record_start}: Unterminated quoted field")
+
+_OFX_TRANSACTION = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.IGNORECASE | re.DOTALL)
+
+def _ofx_field(block: str, tag: str) -> str:
+    match = re.search(rf"<{tag}>([^<\r\n]*)", block, re.IGNORECASE)
+    return match.group(1).strip() if match else ""
+
+# OFX (SGML o XML): se procesa cada bloque <STMTTRN> en cuanto termina de llegar
+async def parse_ofx(lines: AsyncIterator[str]) -> AsyncIterator[Movement | StatementParseError]:
+    buffer = ""
+    number = 0
+    async for line in lines:
+        buffer += line
+        end = 0
+        for match in _OFX_TRANSACTION.finditer(buffer):
+            end = match.end()
+            number += 1
+            block = match.group(1)
+            try:
+                posted = _ofx_field(block, "DTPOSTED")
+                yield Movement(
+                    line_number=number,
+                    occurred_on=parse_date(posted[:8], "%Y%m%d"),
+                    amount=check_amount(parse_ofx_amount(_ofx_field(block, "TRNAMT"))),
+                    description=_ofx_field(block, "NAME") or _ofx_field(block, "MEMO"),
+                )
+            except StatementParseError as exc:
+                yield StatementParseError(f"Transaction {number}: {exc}")
+        if end:
+            buffer = buffer[end:]
+        elif "<STMTTRN>" not in buffer.upper():
+            # Cabeceras y etiquetas fuera de transacciones no se acumulan
+            buffer = ""
+
+def normalize_description(description: str) -> str:
+    text = unicodedata.normalize("NFKD", description).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+# Huella de cada movimiento: (cuenta, fecha, centavos, descripción normalizada, ordinal).
+# El ordinal distingue movimientos idénticos dentro del mismo extracto
+class Fingerprinter:
+    def __init__(self, account_id: uuid.UUID):
+        self.account_id = account_id
+        self.seen: dict[str, int] = {}
+
+    def __call__(self, movement: Movement) -> bytes:
+        cents = int((movement.amount * 100).to_integral_value())
+        key = f"{self.account_id}|{movement.occurred_on.isoformat()}|{cents}|{normalize_description(movement.description)}"
+        ordinal = self.seen.get(key, 0)
+        self.seen[key] = ordinal + 1
+        return hashlib.sha256(f"{key}|{ordinal}".encode("utf-8")).digest()
+
+# Registra un lote: descarta las huellas ya conocidas y crea los asientos nuevos con inserts multi-fila
+async def post_batch(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    account_id: uuid.UUID,
+    counter_account_id: uuid.UUID,
+    batch: Iterable[tuple[bytes, Movement]],
+) -> int:
+    pending = {fp: (uuid.uuid4(), movement) for fp, movement in batch}
+    if not pending:
+        return 0
+
+    result = await db.execute(
+        pg_insert(ImportFingerprint)
+        .values([
+            {"account_id": account_id, "fingerprint": fp, "entry_id": entry_id}
+            for fp, (entry_id, _) in pending.items()
+        ])
+        .on_conflict_do_nothing()
+        .returning(ImportFingerprint.fingerprint)
+    )
+    new = [pending[fp] for fp in result.scalars().all()]
+
+    if new:
+        await db.execute(insert(JournalEntry), [
+            {
+                "id": entry_id,
+                "user_id": user_id,
+                "occurred_at": movement.occurred_on,
+                "description": movement.description or None,
+            }
+            for entry_id, movement in new
+        ])
+
+        lines = []
+        for entry_id, movement in new:
+            # Entra dinero: débito a la cuenta importada; sale dinero: crédito
+            side, counter_side = ("D", "C") if movement.amount > 0 else ("C", "D")
+            amount = abs(movement.amount)
+            entry_lines = [
+                {"entry_id": entry_id, "account_id": account_id, "amount": amount, "side": side},
+                {"entry_id": entry_id, "account_id": counter_account_id, "amount": amount, "side": counter_side},
+            ]
+            lines.extend(entry_lines)
+            record_event(db, user_id, "entry", entry_id, "created", {
+                "occurred_at": movement.occurred_on,
+                "description": movement.description or None,
+                "lines": [{**line, "category_id": None} for line in entry_lines],
+            })
+        await db.execute(insert(JournalLine), lines)
+        await apply_entry_usage(db, [entry_id for entry_id, _ in new], 1)
+        await refresh_entry_fingerprints(db, [entry_id for entry_id, _ in new])
+
+        # Variación de saldo del lote: lo que entra a la cuenta importada sale de la contrapartida
+        net = sum((movement.amount for _, movement in new), Decimal("0"))
+        stage(db, user_id, entry_event(
+            "imported",
+            [entry_id for entry_id, _ in new],
+            {str(account_id): net, str(counter_account_id): -net},
+        ))
+        invalidate(db, user_id, "entry")
+
+    await db.commit()
+    return len(new)
@@ -0,0 +1,66 @@
+import uuid
+from typing import NamedTuple
+
+import pytest
+
+from app.services.account_usage import UsageIndex, description_key
+
+class UsageRow(NamedTuple):
+    description: str
+    account_id: uuid.UUID
+    name: str
+    kind: str
+    side: str
+    counter_account_id: uuid.UUID | None
+    score: float
+
+BANK, CARD, FOOD, FUN = (uuid.uuid4() for _ in range(4))
+NAMES = {BANK: ("Banco", "asset"), CARD: ("Tarjeta", "liability"), FOOD: ("Comida", "expense"), FUN: ("Ocio", "expense")}
+
+# Un asiento de dos líneas deja una fila por lado, cada una con la otra cuenta como contrapartida
+def entry(description: str, debit: uuid.UUID, credit: uuid.UUID, score: float) -> list[UsageRow]:
+    return [
+        UsageRow(description, debit, *NAMES[debit], "D", credit, score),
+        UsageRow(description, credit, *NAMES[credit], "C", debit, score),
+    ]
+
+@pytest.fixture
+def index() -> UsageIndex:
+    return UsageIndex([
+        *entry("Café Central", FOOD, CARD, 3.0),
+        *entry("CAFE central", FOOD, BANK, 1.5),
+        *entry("Cafetería", FUN, BANK, 1.0),
+        *entry("Supermercado", FOOD, BANK, 4.0),
+    ])
+
+def test_description_key():
+    assert description_key("  Café  Central!! ") == "cafe central"
+    assert description_key("PAGO-Nº 123") == "pago no 123"
+    assert description_key("") == ""
+
+# El prefijo se compara sin acentos ni mayúsculas; las descripciones equivalentes suman su puntaje
+def test_prefix_matches_normalized_descriptions(index):
+    result = index.suggest("CAFÉ", 5)
+    assert [(item["name"], item["score"]) for item in result["accounts"]] == [
+        ("Comida", 4.5), ("Tarjeta", 3.0), ("Banco", 2.5), ("Ocio", 1.0),
+    ]
+    assert [(item["debit_name"], item["credit_name"], item["score"]) for item in result["pairs"]] == [
+        ("Comida", "Tarjeta", 3.0), ("Comida", "Banco", 1.5), ("Ocio", "Banco", 1.0),
+    ]
+    assert [item["name"] for item in index.suggest("cafe cen", 5)["accounts"]] == ["Comida", "Tarjeta", "Banco"]
+    assert index.suggest("zzz", 5) == {"accounts": [], "pairs": []}
+
+# Sin prefijo entra todo el uso; el ranking se guarda por límite
+def test_without_prefix_ranks_everything(index):
+    result = index.suggest(None, 2)
+    assert [item["name"] for item in result["accounts"]] == ["Comida", "Banco"]
+    assert [(item["debit_name"], item["credit_name"]) for item in result["pairs"]] == [("Comida", "Banco"), ("Comida", "Tarjeta")]
+    assert index.suggest("", 2) is result
+    assert len(index.suggest("", 10)["accounts"]) == 4
+
+# Una contrapartida eliminada (sin cuenta en el uso) no forma pares, pero la cuenta sigue sugerida
+def test_pairs_need_a_live_counter_account():
+    index = UsageIndex([UsageRow("Cine", FUN, *NAMES[FUN], "D", None, 2.0)])
+    result = index.suggest("cine", 5)
+    assert [item["account_id"] for item in result["accounts"]] == [FUN]
+    assert result["pairs"] == []
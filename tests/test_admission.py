@@ -0,0 +1,199 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.core import admission, db
+from app.core.admission import CRUD, REPORT, AdmissionController
+
+def controller(limits: dict[str, int], **options) -> AdmissionController:
+    settings = {
+        "report_share": 0.5,
+        "per_user_limit": 4,
+        "queue_budgets": {REPORT: 10, CRUD: 10},
+        "queue_timeout": 0.05,
+        "retry_after": 1,
+    }
+    settings.update(options)
+    return AdmissionController(limits=limits, **settings)
+
+def request(path: str = "/api/v1/journal-entry/x") -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "scheme": "http",
+        "server": ("test", 80),
+        "path": path,
+        "query_string": b"",
+        "headers": [],
+        "client": ("10.0.0.1", 1234),
+    })
+
+def in_use(target: AdmissionController) -> dict[str, int]:
+    return {name: engine.in_use for name, engine in target.engines.items()}
+
+# Cada motor tiene su propio cupo: un shard lleno no frena a los demás
+def test_engines_are_limited_separately():
+    async def scenario():
+        target = controller({"main": 2, "s1": 2})
+        async with target.admit(CRUD, {"s1": 1}), target.admit(CRUD, {"s1": 1}):
+            async with target.admit(CRUD, {"main": 2}):
+                assert in_use(target) == {"main": 2, "s1": 2}
+            with pytest.raises(HTTPException) as exc:
+                async with target.admit(CRUD, {"s1": 1}):
+                    pass
+            assert exc.value.status_code == 503
+        assert in_use(target) == {"main": 0, "s1": 0}
+
+    asyncio.run(scenario())
+
+# Una ruta que recorre todos los shards cobra una conexión en cada uno
+def test_charge_per_engine():
+    async def scenario():
+        target = controller({"main": 3, "s1": 3, "s2": 3})
+        async with target.admit(CRUD, {"main": 1, "s1": 1, "s2": 1}):
+            assert in_use(target) == {"main": 1, "s1": 1, "s2": 1}
+
+    asyncio.run(scenario())
+
+# La reserva pasa al motor de la sesión: el de la reserva inicial queda libre
+def test_ticket_move_releases_previous_engine():
+    async def scenario():
+        target = controller({"main": 1, "s1": 1, "replica": 1})
+        async with target.admit(CRUD, {"main": 1}) as ticket:
+            await ticket.move({"s1": 1})
+            assert in_use(target) == {"main": 0, "s1": 1, "replica": 0}
+            async with target.admit(CRUD, {"main": 1}) as other:
+                await other.move({"replica": 1})
+                assert in_use(target) == {"main": 0, "s1": 1, "replica": 1}
+        assert in_use(target) == {"main": 0, "s1": 0, "replica": 0}
+
+    asyncio.run(scenario())
+
+# El límite por usuario se aplica al asignarlo; un cliente sin usuario se cuenta por IP
+def test_per_user_limit():
+    async def scenario():
+        target = controller({"main": 10}, per_user_limit=2)
+        user_id = uuid.uuid4()
+        async with target.admit(CRUD, {"main": 1}) as first, target.admit(CRUD, {"main": 1}) as second:
+            first.assign(request(), user_id)
+            second.assign(request(), user_id)
+            async with target.admit(CRUD, {"main": 1}) as third:
+                with pytest.raises(HTTPException) as exc:
+                    third.assign(request(), user_id)
+                assert exc.value.status_code == 429
+                third.assign(request(), None)
+                assert target.per_user == {f"user:{user_id}": 2, "client:10.0.0.1": 1}
+        assert target.per_user == {}
+        assert in_use(target) == {"main": 0}
+
+    asyncio.run(scenario())
+
+# Con la cola llena se rechaza de inmediato; con cupo en la cola se espera hasta queue_timeout
+def test_queue_budget_and_timeout():
+    async def scenario():
+        target = controller({"main": 1}, queue_budgets={REPORT: 0, CRUD: 1}, queue_timeout=0.05)
+        async with target.admit(CRUD, {"main": 1}):
+            with pytest.raises(HTTPException) as exc:
+                async with target.admit(REPORT, {"main": 1}):
+                    pass
+            assert (exc.value.status_code, exc.value.detail) == (503, "Server busy, request queue is full")
+            with pytest.raises(HTTPException) as exc:
+                async with target.admit(CRUD, {"main": 1}):
+                    pass
+            assert (exc.value.status_code, exc.value.detail) == (503, "Server busy, queue wait exceeded")
+        assert target.waiting == {REPORT: 0, CRUD: 0}
+
+    asyncio.run(scenario())
+
+# Las búsquedas del usuario y del shard (body, directorio, dueño de la entidad) esperan la admisión:
+# con la base principal sin cupo la request se rechaza sin llegar a consultarla
+def test_user_lookup_runs_after_admission(configure, monkeypatch):
+    lookups = []
+
+    async def request_user(_):
+        lookups.append(admission.controller.engines["main"].in_use)
+        return None
+
+    async def scenario():
+        monkeypatch.setattr(admission, "controller", controller({"main": 1}))
+        monkeypatch.setattr(db, "request_user", request_user)
+        async with admission.controller.admit(CRUD, {"main": 1}):
+            with pytest.raises(HTTPException) as exc:
+                async with db._admitted(request()):
+                    pass
+            assert exc.value.status_code == 503
+        assert lookups == []
+
+        async with db._admitted(request()) as (ticket, user_id, shard):
+            assert (user_id, shard, ticket.user_key) == (None, "main", "client:10.0.0.1")
+        assert lookups == [1]
+
+    asyncio.run(scenario())
+
+# Una request con peso toma todas sus conexiones de una vez: mientras no caben, no retiene ninguna
+def test_weighted_admission_is_atomic():
+    async def scenario():
+        target = controller({"main": 4}, queue_timeout=1)
+        engine = target.engines["main"]
+        order = []
+
+        async def heavy():
+            async with target.admit(REPORT, {"main": 2}):
+                order.append("heavy")
+
+        async with target.admit(CRUD, {"main": 3}):
+            task = asyncio.create_task(heavy())
+            await asyncio.sleep(0.01)
+            assert (engine.in_use, engine.reports_in_use) == (3, 0)
+            async with target.admit(CRUD, {"main": 1}):
+                order.append("light")
+        await task
+        assert order == ["light", "heavy"]
+        assert (engine.in_use, engine.reports_in_use) == (0, 0)
+
+    asyncio.run(scenario())
+
+# Los reportes cobran su peso también en la cuota de reportes; un peso mayor que el límite se cobra como el límite
+def test_reports_are_charged_by_weight():
+    async def scenario():
+        target = controller({"main": 8}, report_share=0.5)
+        engine = target.engines["main"]
+        async with target.admit(REPORT, {"main": 3}):
+            assert (engine.in_use, engine.reports_in_use) == (3, 3)
+            with pytest.raises(HTTPException):
+                async with target.admit(REPORT, {"main": 2}):
+                    pass
+            async with target.admit(CRUD, {"main": 5}):
+                assert (engine.in_use, engine.reports_in_use) == (8, 3)
+        async with target.admit(REPORT, {"main": 20}):
+            assert (engine.in_use, engine.reports_in_use) == (8, 4)
+
+    asyncio.run(scenario())
+
+# Una request cancelada mientras espera o mientras corre no deja conexiones tomadas
+def test_cancelled_requests_release_their_charge():
+    async def scenario():
+        target = controller({"main": 2}, queue_timeout=5)
+        engine = target.engines["main"]
+        started = asyncio.Event()
+
+        async def hold(weight: int):
+            async with target.admit(CRUD, {"main": weight}):
+                started.set()
+                await asyncio.sleep(10)
+
+        running = asyncio.create_task(hold(2))
+        await started.wait()
+        waiting = asyncio.create_task(hold(1))
+        await asyncio.sleep(0.01)
+        assert target.waiting[CRUD] == 1
+        for task in (waiting, running):
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        assert (engine.in_use, target.waiting[CRUD]) == (0, 0)
+
+    asyncio.run(scenario())
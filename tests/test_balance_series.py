@@ -0,0 +1,45 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.services.balance_series import bucket_count, bucket_start, lttb, next_bucket
+
+def series(n: int, seed: int = 7) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=np.float64), np.cumsum(rng.normal(size=n))
+
+# Con menos puntos que el umbral (o un umbral sin tramos intermedios) la serie queda entera
+@pytest.mark.parametrize("n, threshold", [(10, 10), (10, 50), (10, 2), (0, 5)])
+def test_short_series_is_kept(n, threshold):
+    x, y = series(n)
+    assert lttb(x, y, threshold).tolist() == list(range(n))
+
+# threshold puntos crecientes, con el primero y el último, y uno por tramo
+@pytest.mark.parametrize("n, threshold", [(1000, 100), (101, 100), (5, 4), (3651, 365)])
+def test_selects_one_point_per_bucket(n, threshold):
+    x, y = series(n)
+    selected = lttb(x, y, threshold)
+    assert len(selected) == threshold
+    assert (selected[0], selected[-1]) == (0, n - 1)
+    assert np.all(np.diff(selected) > 0)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    assert np.all((selected[1:-1] >= edges[:-1]) & (selected[1:-1] < edges[1:]))
+
+# Los picos y los valles aislados sobreviven a la reducción
+def test_keeps_peaks_and_valleys():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[321], y[777] = 500.0, -800.0
+    selected = lttb(x, y, 20).tolist()
+    assert 321 in selected and 777 in selected
+
+def test_bucket_helpers():
+    assert bucket_start(date(2026, 3, 19), "week") == date(2026, 3, 16)
+    assert bucket_start(date(2026, 3, 19), "month") == date(2026, 3, 1)
+    assert bucket_start(date(2026, 3, 19), "day") == date(2026, 3, 19)
+    assert next_bucket(date(2026, 12, 1), "month") == date(2027, 1, 1)
+    assert next_bucket(date(2026, 3, 16), "week") == date(2026, 3, 23)
+    assert bucket_count(date(2025, 11, 1), date(2026, 2, 1), "month") == 4
+    assert bucket_count(date(2026, 3, 2), date(2026, 3, 16), "week") == 3
+    assert bucket_count(date(2026, 3, 1), date(2026, 3, 31), "day") == 31
@@ -0,0 +1,56 @@
+from datetime import date
+
+import numpy as np
+
+from app.services.forecast import project_balances
+
+# Historia de enero a marzo de 2026 (90 días); los flujos son (cuenta, día de la ventana, centavos)
+HISTORY_START = date(2026, 1, 1)
+HISTORY_DAYS = 90
+
+def forecast(flows: list[tuple[int, int, int]], n_accounts: int, horizon_days: int = 61):
+    account_idx, day_idx, cents = (np.array(column, dtype=np.int64) for column in zip(*flows))
+    return project_balances(account_idx, day_idx, cents, n_accounts, HISTORY_START, HISTORY_DAYS, horizon_days)
+
+def day(month: int, dom: int) -> int:
+    return (date(2026, month, dom) - HISTORY_START).days
+
+def on(result, month: int, dom: int) -> np.ndarray:
+    return result.balances[:, list(result.dates).index(np.datetime64(date(2026, month, dom)))]
+
+# El saldo actual suma el saldo previo (día -1) y los flujos de la ventana
+def test_current_balance_and_dates():
+    result = forecast([(0, -1, 5000), (0, 3, -200), (1, -1, 700), (1, 10, 300), (0, 3, -100)], 2, horizon_days=3)
+    assert result.current.tolist() == [4700, 1000]
+    assert result.dates.tolist() == [date(2026, 4, 1), date(2026, 4, 2), date(2026, 4, 3)]
+
+# Un movimiento que se repite el mismo día de cada mes se proyecta ese día, sin repartirse en la semana
+def test_monthly_pattern_is_projected_on_its_day():
+    result = forecast([(0, -1, 100000), *((0, day(month, 5), -30000) for month in (1, 2, 3))], 1)
+    assert on(result, 4, 4).tolist() == [10000]
+    assert on(result, 4, 5).tolist() == [-20000]
+    assert on(result, 5, 4).tolist() == [-20000]
+    assert on(result, 5, 5).tolist() == [-50000]
+
+# Los patrones de días que no existen en un mes corto caen en su último día
+def test_month_end_receives_missing_days():
+    result = forecast([(0, day(1, 31), 1000), (0, day(3, 31), 1000)], 1)
+    assert on(result, 4, 29).tolist() == [2000]
+    assert on(result, 4, 30).tolist() == [3000]
+    assert on(result, 5, 31).tolist() == [4000]
+
+# Una cuenta con movimientos casi todos los días se proyecta con el promedio por día de la semana
+def test_dense_account_uses_weekday_average():
+    result = forecast([(0, index, 100) for index in range(HISTORY_DAYS)], 1, horizon_days=14)
+    assert result.current.tolist() == [9000]
+    assert result.balances[0].tolist() == [9000 + 100 * (index + 1) for index in range(14)]
+
+# Movimientos sueltos (sin patrón mensual) en una cuenta poco activa: promedio semanal redondeado por día
+def test_irregular_flows_are_spread_by_weekday():
+    # Tres lunes de días del mes distintos con -700: el promedio de los 13 lunes de la historia es -161.54
+    mondays = [index for index in range(HISTORY_DAYS) if date.fromordinal(HISTORY_START.toordinal() + index).weekday() == 0]
+    result = forecast([(0, mondays[1], -700), (0, mondays[5], -700), (0, mondays[10], -700)], 1, horizon_days=7)
+    daily = np.diff(np.concatenate(([result.current[0]], result.balances[0])))
+    weekdays = [value.astype(object).weekday() for value in result.dates]
+    assert [int(amount) for amount, weekday in zip(daily, weekdays) if weekday == 0] == [-162]
+    assert all(amount == 0 for amount, weekday in zip(daily, weekdays) if weekday != 0)
@@ -0,0 +1,136 @@
+import asyncio
+import uuid
+import zlib
+
+import pytest
+
+from app.services.ledger_dump import (
+    END_FRAME,
+    FRAME_HEADER,
+    MAGIC,
+    MAX_FRAME_BYTES,
+    TABLES_BY_CODE,
+    DumpError,
+    FrameReader,
+    copy_block,
+    decode_frame,
+    encode_frame,
+    read_frames,
+)
+
+USERS = TABLES_BY_CODE[1]
+ACCOUNTS = TABLES_BY_CODE[3]
+LINES = TABLES_BY_CODE[5]
+
+# 2026-01-15T12:00:00Z en microsegundos
+STAMP = 1768478400 * 1_000_000
+
+def split(frame: bytes) -> tuple[int, int, bytes]:
+    code, raw_size, size = FRAME_HEADER.unpack_from(frame)
+    assert len(frame) == FRAME_HEADER.size + size
+    return code, raw_size, frame[FRAME_HEADER.size:]
+
+def round_trip(table, rows: list) -> list[list[str]]:
+    code, raw_size, compressed = split(encode_frame(table, rows))
+    assert code == table.code
+    return decode_frame(table, raw_size, compressed)
+
+def rows_of(columns: list[list[str]]) -> list[tuple[str, ...]]:
+    return list(zip(*columns))
+
+# Cada tipo vuelve como campo de COPY: uuid en hexadecimal, fechas ISO en UTC, centavos con dos decimales
+def test_round_trip_as_copy_fields():
+    line_id, entry_id, account_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    rows = [
+        (line_id, entry_id, account_id, 1250, "D", None, None),
+        (uuid.uuid4(), entry_id, account_id, -5, "C", uuid.uuid4(), STAMP + 1),
+    ]
+    decoded = rows_of(round_trip(LINES, rows))
+    assert decoded[0] == (line_id.hex, entry_id.hex, account_id.hex, "12.50", "D", "\\N", "\\N")
+    assert decoded[1][3:5] == ("-0.05", "C")
+    assert decoded[1][6] == "2026-01-15T12:00:00.000001Z"
+
+# Los textos se guardan en un diccionario por grupo y se escapan para COPY; los bool admiten null
+def test_text_and_bool_columns():
+    user_id = uuid.uuid4()
+    rows = [
+        (user_id, "ana@example.com", "Ana\tMaría\\\n", True, STAMP),
+        (uuid.uuid4(), "luis@example.com", "Ana\tMaría\\\n", None, STAMP),
+        (uuid.uuid4(), "sin@example.com", None, False, None),
+    ]
+    decoded = rows_of(round_trip(USERS, rows))
+    assert [row[2] for row in decoded] == ["Ana\\tMaría\\\\\\n", "Ana\\tMaría\\\\\\n", "\\N"]
+    assert [row[3] for row in decoded] == ["t", "\\N", "f"]
+    assert decoded[0][:2] == (user_id.hex, "ana@example.com")
+    assert decoded[2][4] == "\\N"
+
+def test_empty_frame():
+    assert round_trip(ACCOUNTS, []) == [[] for _ in ACCOUNTS.columns]
+
+def test_copy_block_prefixes_user_id():
+    columns = round_trip(TABLES_BY_CODE[2], [(uuid.uuid4(), "Comida", STAMP), (uuid.uuid4(), "Casa", None)])
+    block = copy_block(columns, "u1").decode("utf-8").splitlines()
+    assert [line.split("\t")[0] for line in block] == ["u1", "u1"]
+    assert block[1].endswith("\tCasa\t\\N")
+
+# Bloques dañados: datos comprimidos inválidos, cortados, tamaño declarado distinto o columnas inconsistentes
+def test_corrupt_frames_are_rejected():
+    _, raw_size, compressed = split(encode_frame(USERS, [(uuid.uuid4(), "a@example.com", "A", True, STAMP)]))
+    with pytest.raises(DumpError, match="Corrupt users frame"):
+        decode_frame(USERS, raw_size, b"not zlib data")
+    with pytest.raises(DumpError, match="Corrupt dump frame"):
+        decode_frame(USERS, raw_size, compressed[:-4])
+    with pytest.raises(DumpError, match="Corrupt dump frame"):
+        decode_frame(USERS, raw_size + 1, compressed)
+    with pytest.raises(DumpError, match="Corrupt dump frame"):
+        decode_frame(USERS, raw_size - 1, compressed)
+
+    # Un grupo de cuentas leído como usuarios: las columnas no cuadran
+    _, raw_size, compressed = split(encode_frame(ACCOUNTS, [(uuid.uuid4(), None, "Banco", "asset", None, STAMP, STAMP, None)]))
+    with pytest.raises(DumpError):
+        decode_frame(USERS, raw_size, compressed)
+
+    # Un grupo que declara más filas de las que trae
+    payload = bytearray(zlib.decompress(compressed))
+    payload[0] += 1
+    with pytest.raises(DumpError, match="Corrupt uuid column"):
+        decode_frame(ACCOUNTS, len(payload), zlib.compress(bytes(payload)))
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+def read_all(data: bytes, size: int = 7) -> list:
+    async def collect():
+        return [(table.name, columns) async for table, columns in read_frames(_chunks(data, size))]
+    return asyncio.run(collect())
+
+# Los bloques se separan aunque lleguen en trozos arbitrarios
+def test_read_frames_from_chunks():
+    user = encode_frame(USERS, [(uuid.uuid4(), "a@example.com", "A", True, STAMP)])
+    accounts = encode_frame(ACCOUNTS, [(uuid.uuid4(), None, "Banco", "asset", "1234", STAMP, STAMP, None)])
+    frames = read_all(MAGIC + user + accounts + END_FRAME)
+    assert [name for name, _ in frames] == ["users", "ledger_account"]
+    assert frames[1][1][2] == ["Banco"]
+
+def test_read_frames_rejects_bad_streams():
+    user = encode_frame(USERS, [(uuid.uuid4(), "a@example.com", "A", True, STAMP)])
+    accounts = encode_frame(ACCOUNTS, [])
+    with pytest.raises(DumpError, match="Not a ledger dump"):
+        read_all(b"NXDUMP\x00\x09" + user + END_FRAME)
+    with pytest.raises(DumpError, match="Truncated dump"):
+        read_all(MAGIC + user)
+    with pytest.raises(DumpError, match="Truncated dump"):
+        read_all(MAGIC + user[:-3])
+    with pytest.raises(DumpError, match="Unexpected data after the end"):
+        read_all(MAGIC + user + END_FRAME + b"x")
+    with pytest.raises(DumpError, match=r"Unexpected dump frame \(table 1\)"):
+        read_all(MAGIC + accounts + user + END_FRAME)
+    with pytest.raises(DumpError, match=r"Unexpected dump frame \(table 9\)"):
+        read_all(MAGIC + FRAME_HEADER.pack(9, 0, 0) + END_FRAME)
+
+# El tamaño se comprueba con la cabecera, antes de esperar o descomprimir el bloque
+def test_frame_too_large():
+    reader = FrameReader()
+    with pytest.raises(DumpError, match="Dump frame too large"):
+        reader.feed(MAGIC + FRAME_HEADER.pack(1, MAX_FRAME_BYTES + 1, 10))
@@ -0,0 +1,43 @@
+from decimal import Decimal
+
+import pytest
+
+from app.main import app
+from conftest import create_account, create_entry, create_user, ok, ready_client, requires_primary
+
+pytestmark = requires_primary
+
+@pytest.fixture
+def client(configure):
+    with ready_client(app) as client:
+        yield client
+
+def projected(client, user_id: str) -> dict[str, Decimal]:
+    rows = ok(client.get(f"/api/v1/ledger-event/projections/account-balances/{user_id}"))["data"]
+    return {row["account_id"]: Decimal(str(row["debits"])) - Decimal(str(row["credits"])) for row in rows}
+
+def balances(client, user_id: str) -> dict[str, Decimal]:
+    accounts = ok(client.get(f"/api/v1/ledger-account/user/{user_id}", params={"with_balances": "true"}))["data"]
+    return {account["id"]: Decimal(str(account["balance"])) for account in accounts}
+
+# Las líneas de un asiento eliminado no se editan (como no se borran): al restaurarlo, la reconstrucción
+# da los mismos saldos que las líneas vigentes
+def test_lines_of_deleted_entries_are_not_updated(client):
+    user_id, _ = create_user(client)
+    bank = create_account(client, user_id, "Banco", "asset")
+    food = create_account(client, user_id, "Comida", "expense")
+    entry = create_entry(client, user_id, food, bank, "10.00")
+    line_id = entry["lines"][0]["id"]
+
+    ok(client.delete(f"/api/v1/journal-entry/{entry['id']}"))
+    response = client.put(f"/api/v1/journal-line/{line_id}", json={"amount": "25.00"})
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == "Cannot update line from deleted journal entry"
+    response = client.delete(f"/api/v1/journal-line/{line_id}")
+    assert response.status_code == 400, response.text
+
+    ok(client.post(f"/api/v1/archive/entry/{entry['id']}/restore"))
+    ok(client.get(f"/api/v1/journal-line/{line_id}"))
+    assert balances(client, user_id) == {food: Decimal("10.00"), bank: Decimal("-10.00")}
+    ok(client.post("/api/v1/ledger-event/projections/account-balances/rebuild"))
+    assert projected(client, user_id) == balances(client, user_id)
@@ -0,0 +1,60 @@
+import uuid
+from datetime import date
+from decimal import Decimal
+
+from app.services.reconciliation import LedgerItem, StatementItem, match_statement
+
+ACCOUNT_ID = uuid.uuid4()
+
+def statement(*items: tuple[str, int]) -> list[StatementItem]:
+    return [
+        StatementItem(index=index, occurred_on=date.fromisoformat(day), cents=cents, description=None)
+        for index, (day, cents) in enumerate(items)
+    ]
+
+def line(day: str, amount: str, side: str = "D") -> LedgerItem:
+    return LedgerItem(
+        line_id=uuid.uuid4(), entry_id=uuid.uuid4(), account_id=ACCOUNT_ID, amount=Decimal(amount), side=side,
+        category_id=None, occurred_on=date.fromisoformat(day), description=None,
+    )
+
+def pairs(matches) -> list[tuple[int, str]]:
+    return [(item.index, candidate.occurred_on.isoformat()) for item, candidate in matches]
+
+# El monto se compara con signo: un débito entra a la cuenta, un crédito sale
+def test_matches_by_signed_amount():
+    ledger = [line("2026-03-01", "12.50", "C"), line("2026-03-01", "12.50", "D")]
+    matches, unmatched, remaining = match_statement(statement(("2026-03-01", -1250)), ledger, 3)
+    assert [candidate for _, candidate in matches] == [ledger[0]]
+    assert (unmatched, remaining) == ([], [ledger[1]])
+
+# Primero las parejas de la misma fecha: un gasto diario no le quita su línea al del día siguiente
+def test_same_day_matches_go_first():
+    items = statement(("2026-03-01", 500), ("2026-03-02", 500), ("2026-03-03", 500))
+    ledger = [line("2026-03-02", "5.00"), line("2026-03-03", "5.00")]
+    matches, unmatched, remaining = match_statement(items, ledger, 1)
+    assert pairs(matches) == [(1, "2026-03-02"), (2, "2026-03-03")]
+    assert ([item.index for item in unmatched], remaining) == ([0], [])
+
+# Dentro de la tolerancia gana la fecha más cercana; ante un empate, la más antigua
+def test_closest_date_within_tolerance():
+    ledger = [line("2026-03-01", "9.00"), line("2026-03-05", "9.00"), line("2026-03-04", "9.00")]
+    matches, _, _ = match_statement(statement(("2026-03-03", 900)), ledger, 2)
+    assert pairs(matches) == [(0, "2026-03-04")]
+
+    matches, _, _ = match_statement(statement(("2026-03-03", 900)), [line("2026-03-04", "9.00"), line("2026-03-02", "9.00")], 1)
+    assert pairs(matches) == [(0, "2026-03-02")]
+
+# Fuera de la tolerancia o sin el mismo monto no hay pareja; cada línea del libro se usa una sola vez
+def test_unmatched_on_both_sides():
+    ledger = [line("2026-03-01", "20.00"), line("2026-03-10", "7.00"), line("2026-03-02", "1.00")]
+    items = statement(("2026-03-01", 2000), ("2026-03-01", 2000), ("2026-03-06", 700), ("2026-03-02", 101))
+    matches, unmatched, remaining = match_statement(items, ledger, 3)
+    assert pairs(matches) == [(0, "2026-03-01")]
+    assert [item.index for item in unmatched] == [1, 2, 3]
+    assert [candidate.occurred_on.isoformat() for candidate in remaining] == ["2026-03-02", "2026-03-10"]
+
+# Con tolerancia 0 solo cuentan las fechas exactas
+def test_zero_tolerance():
+    matches, unmatched, remaining = match_statement(statement(("2026-03-02", 300)), [line("2026-03-01", "3.00")], 0)
+    assert (matches, [item.index for item in unmatched], len(remaining)) == ([], [0], 1)
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import db
+from app.core.admission import init_admission
+from app.main import app
+from conftest import REPLICA_URL, create_user, ok, ready_client, requires_primary, requires_replica
+
+# App mínima con las dependencias de lectura: cada ruta dice de dónde leyó
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    db.init_engines()
+    init_admission()
+    yield
+    await db.dispose_engines()
+
+probe = FastAPI(lifespan=lifespan)
+
+@probe.get("/ready")
+def ready():
+    return {"status": "ready"}
+
+def _source(session: AsyncSession) -> str:
+    if db.replica_engine is not None and session.get_bind() is db.replica_engine.sync_engine:
+        return "replica"
+    return "primary"
+
+@probe.get("/read")
+async def read(session: AsyncSession = Depends(db.get_read_db)):
+    await session.execute(text("SELECT 1"))
+    return {"source": _source(session)}
+
+@probe.get("/read-many")
+async def read_many(sessions: list[AsyncSession] = Depends(db.get_read_sessions(3))):
+    await asyncio.gather(*(session.execute(text("SELECT 1")) for session in sessions))
+    return {"sources": [_source(session) for session in sessions]}
+
+def replica_settings() -> dict[str, str]:
+    parts = urlsplit(REPLICA_URL)
+    return {"PG_REPLICA_HOST": parts.hostname or "localhost", "PG_REPLICA_PORT": str(parts.port or 5432)}
+
+def read_source(client, **kwargs) -> str:
+    return ok(client.get("/read", **kwargs))["source"]
+
+# Sin réplica configurada todo se lee del primario
+@requires_primary
+def test_reads_use_primary_without_replica(configure):
+    with ready_client(probe) as client:
+        assert read_source(client) == "primary"
+        assert ok(client.get("/read-many"))["sources"] == ["primary"] * 3
+
+# Réplica al día: las lecturas van a la réplica, también las paralelas
+@requires_replica
+def test_fresh_replica_serves_reads(configure):
+    configure(**replica_settings())
+    with ready_client(probe) as client:
+        assert read_source(client) == "replica"
+        assert ok(client.get("/read-many"))["sources"] == ["replica"] * 3
+
+# Read-your-writes: con una escritura reciente (cabecera o cookie) se lee del primario
+@requires_replica
+def test_recent_write_reads_from_primary(configure):
+    configure(**replica_settings())
+    with ready_client(probe) as client:
+        now = f"{time.time():.3f}"
+        assert read_source(client, headers={db.LAST_WRITE_HEADER: now}) == "primary"
+        client.cookies.set(db.LAST_WRITE_COOKIE, now)
+        assert ok(client.get("/read-many"))["sources"] == ["primary"] * 3
+        client.cookies.clear()
+
+        # Una escritura vieja ya no cuenta
+        old = f"{time.time() - 3600:.3f}"
+        assert read_source(client, headers={db.LAST_WRITE_HEADER: old}) == "replica"
+
+# Réplica desfasada (cualquier retraso supera un máximo negativo): se lee del primario
+@requires_replica
+def test_lagging_replica_falls_back_to_primary(configure):
+    configure(**replica_settings(), PG_REPLICA_MAX_LAG_SECONDS="-1")
+    with ready_client(probe) as client:
+        assert read_source(client) == "primary"
+        assert ok(client.get("/read-many"))["sources"] == ["primary"] * 3
+
+# Réplica caída: las lecturas caen al primario y la app arranca igual
+@requires_primary
+def test_unreachable_replica_falls_back_to_primary(configure):
+    configure(PG_REPLICA_HOST="127.0.0.1", PG_REPLICA_PORT="1")
+    with ready_client(probe) as client:
+        assert read_source(client) == "primary"
+        assert ok(client.get("/read-many"))["sources"] == ["primary"] * 3
+
+    db._replica_lag.update(checked_at=float("-inf"), seconds=0.0)
+    with ready_client(app) as client:
+        user_id, _ = create_user(client)
+        ok(client.get(f"/api/v1/dashboard/{user_id}"))
@@ -0,0 +1,131 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from app.core.sharding import MAIN_SHARD
+from app.main import app
+from conftest import (
+    PRIMARY_URL,
+    SHARD_URLS,
+    connect,
+    create_account,
+    create_entry,
+    create_user,
+    ok,
+    ready_client,
+    requires_shards,
+    shard_location,
+)
+
+pytestmark = requires_shards
+
+def shard_settings() -> dict[str, str]:
+    return {"PG_SHARDS": json.dumps({name: shard_location(url) for name, url in SHARD_URLS.items()})}
+
+@pytest.fixture
+def client(configure):
+    configure(**shard_settings())
+    with ready_client(app) as client:
+        yield client
+
+@pytest.fixture
+def conns():
+    opened = {MAIN_SHARD: connect(PRIMARY_URL), **{name: connect(url) for name, url in SHARD_URLS.items()}}
+    yield opened
+    for conn in opened.values():
+        conn.close()
+
+def count(conn, sql: str, *params) -> int:
+    return conn.execute(sql, params).fetchone()[0]
+
+def user_shard(client, user_id: str) -> str:
+    return ok(client.get(f"/api/v1/shard/user/{user_id}"))["data"]["shard"]
+
+def move(client, user_id: str, target: str) -> dict:
+    return ok(client.post(f"/api/v1/shard/user/{user_id}/move", params={"target": target}))["data"]
+
+def balances(client, user_id: str) -> dict[str, Decimal]:
+    accounts = ok(client.get(f"/api/v1/ledger-account/user/{user_id}", params={"with_balances": "true"}))["data"]
+    return {account["name"]: Decimal(str(account["balance"])) for account in accounts}
+
+# Cada usuario vive en un solo shard (el que dice el directorio) y los listados los juntan todos
+def test_users_live_on_exactly_one_shard(client, conns):
+    users = [create_user(client)[0] for _ in range(6)]
+    for user_id in users:
+        shard = user_shard(client, user_id)
+        assert count(conns[shard], "SELECT count(*) FROM users WHERE id = %s", user_id) == 1
+        assert sum(count(conn, "SELECT count(*) FROM users WHERE id = %s", user_id) for conn in conns.values()) == 1
+
+    listed = {user["id"] for user in ok(client.get("/api/v1/user/get-all-users"))["data"]}
+    assert set(users) <= listed
+
+# Las rutas por id de entidad (cuenta, asiento, línea) se resuelven en el shard del dueño
+def test_entity_routes_follow_the_owner(client, conns):
+    shard = next(iter(SHARD_URLS))
+    user_id, _ = create_user(client)
+    move(client, user_id, shard)
+
+    bank = create_account(client, user_id, "Banco", "asset")
+    salary = create_account(client, user_id, "Sueldo", "income")
+    entry = create_entry(client, user_id, bank, salary, "100.00")
+    assert count(conns[shard], "SELECT count(*) FROM ledger_account WHERE user_id = %s", user_id) == 2
+    assert count(conns[MAIN_SHARD], "SELECT count(*) FROM ledger_account WHERE user_id = %s", user_id) == 0
+
+    ok(client.get(f"/api/v1/ledger-account/{bank}"))
+    ok(client.put(f"/api/v1/ledger-account/{bank}", json={"name": "Banco 2"}))
+    ok(client.get(f"/api/v1/journal-entry/{entry['id']}"))
+    ok(client.get(f"/api/v1/journal-line/{entry['lines'][0]['id']}"))
+    assert balances(client, user_id) == {"Banco 2": Decimal("100.00"), "Sueldo": Decimal("-100.00")}
+
+# Traslado entre shards: las filas pasan al destino, el origen queda vacío y las requests siguen funcionando
+def test_move_relocates_user_rows(client, conns):
+    names = list(SHARD_URLS)
+    user_id, _ = create_user(client)
+    source = user_shard(client, user_id)
+    target = next(name for name in [MAIN_SHARD, *names] if name != source)
+
+    bank = create_account(client, user_id, "Banco", "asset")
+    food = create_account(client, user_id, "Comida", "expense")
+    entry = create_entry(client, user_id, food, bank, "12.50")
+    before = balances(client, user_id)
+
+    result = move(client, user_id, target)
+    assert (result["source"], result["target"]) == (source, target)
+    assert user_shard(client, user_id) == target
+    for table in ("users", "ledger_account", "journal_entry"):
+        column = "id" if table == "users" else "user_id"
+        assert count(conns[source], f"SELECT count(*) FROM {table} WHERE {column} = %s", user_id) == 0
+        assert count(conns[target], f"SELECT count(*) FROM {table} WHERE {column} = %s", user_id) > 0
+
+    assert balances(client, user_id) == before
+    ok(client.get(f"/api/v1/journal-entry/{entry['id']}"))
+    create_entry(client, user_id, food, bank, "1.00")
+    assert count(conns[target], "SELECT count(*) FROM journal_entry WHERE user_id = %s", user_id) == 2
+
+    # Y de vuelta al origen
+    move(client, user_id, source)
+    assert count(conns[target], "SELECT count(*) FROM users WHERE id = %s", user_id) == 0
+    assert balances(client, user_id)["Comida"] == before["Comida"] + 1
+
+# El email es único entre todos los shards, aunque los ids nuevos caigan en shards distintos
+def test_email_is_unique_across_shards(client, conns):
+    _, email = create_user(client)
+    for _ in range(6):
+        response = client.post("/api/v1/user/create-user", json={"email": email, "display_name": "Otro"})
+        assert response.status_code == 400, response.text
+    assert sum(count(conn, "SELECT count(*) FROM users WHERE email = %s", email) for conn in conns.values()) == 1
+
+# Un alta fallida (body inválido o email repetido) no deja al usuario en el directorio
+def test_failed_create_leaves_no_directory_row(client, conns):
+    _, email = create_user(client)
+    before = count(conns[MAIN_SHARD], "SELECT count(*) FROM user_shard")
+    response = client.post("/api/v1/user/create-user", json={"email": "no-es-email", "display_name": "Otro"})
+    assert response.status_code == 422, response.text
+    for _ in range(4):
+        response = client.post("/api/v1/user/create-user", json={"email": email, "display_name": "Otro"})
+        assert response.status_code == 400, response.text
+    assert count(conns[MAIN_SHARD], "SELECT count(*) FROM user_shard") == before
+
+    create_user(client)
+    assert count(conns[MAIN_SHARD], "SELECT count(*) FROM user_shard") == before + 1
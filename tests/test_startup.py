@@ -0,0 +1,47 @@
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core import db
+from app.core.config import get_settings
+from app.main import app
+from conftest import ok, ready_client, requires_primary
+
+# Tiempo máximo de arranque (hasta /ready) que se acepta
+STARTUP_BUDGET_SECONDS = float(os.getenv("TEST_STARTUP_BUDGET_SECONDS", "5"))
+
+# Importar la app no abre conexiones: los motores se crean en el lifespan
+def test_engines_are_created_in_lifespan(configure):
+    assert db.engine is None
+    assert db.engines == {}
+
+# Sin base de datos la app arranca igual, pero /ready responde 503 mientras reintenta el precalentamiento
+def test_ready_is_503_while_database_is_unreachable(configure):
+    configure(PG_HOST="127.0.0.1", PG_PORT="1")
+    with TestClient(app) as client:
+        assert db.engine is not None
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json() == {"status": "warming_up"}
+    assert db.engine is None
+
+# Arranque medido: /ready informa el tiempo hasta tener el pool precalentado
+@requires_primary
+def test_startup_time_and_warm_pool(configure):
+    started = time.perf_counter()
+    with ready_client(app) as client:
+        elapsed = time.perf_counter() - started
+        data = ok(client.get("/ready"))
+        assert data["status"] == "ready"
+        assert 0 < data["startup_seconds"] <= elapsed
+        assert data["startup_seconds"] < STARTUP_BUDGET_SECONDS, f"startup took {data['startup_seconds']}s"
+
+        # Las conexiones del precalentamiento quedan abiertas en el pool
+        settings = get_settings()
+        assert db.engine.pool.checkedin() >= max(1, min(settings.PG_POOL_WARMUP, settings.PG_POOL_SIZE))
+
+        # La primera request ya no paga la conexión
+        started = time.perf_counter()
+        ok(client.get("/api/v1/user/get-all-users"))
+        assert time.perf_counter() - started < STARTUP_BUDGET_SECONDS
@@ -0,0 +1,153 @@
+import asyncio
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app.services.statement_import import (
+    CsvColumns,
+    Movement,
+    StatementParseError,
+    parse_amount,
+    parse_csv,
+    parse_ofx,
+    parse_ofx_amount,
+)
+
+async def _lines(text: str):
+    for line in text.splitlines(keepends=True):
+        yield line
+
+async def _collect(movements) -> list:
+    return [item async for item in movements]
+
+def csv_results(text: str, **columns) -> list:
+    return asyncio.run(_collect(parse_csv(_lines(text), CsvColumns(**columns))))
+
+def ofx_results(text: str) -> list:
+    return asyncio.run(_collect(parse_ofx(_lines(text))))
+
+@pytest.mark.parametrize("raw, expected", [
+    ("100", "100.00"),
+    ("-0.10", "-0.10"),
+    ("1,5", "1.50"),
+    (".5", "0.50"),
+    ("1,234.56", "1234.56"),
+    ("1.234,56", "1234.56"),
+    ("1.234.567", "1234567.00"),
+    ("$1,000,000.00", "1000000.00"),
+    ("(12,50)", "-12.50"),
+    ("+7", "7.00"),
+])
+def test_parse_amount(raw, expected):
+    assert parse_amount(raw) == Decimal(expected)
+
+# Un solo separador seguido de tres dígitos: miles o tres decimales, no se adivina
+@pytest.mark.parametrize("raw", ["-1.500", "12.345", "1,500", "999,999"])
+def test_parse_amount_rejects_ambiguous(raw):
+    with pytest.raises(StatementParseError, match="Ambiguous amount"):
+        parse_amount(raw)
+
+@pytest.mark.parametrize("raw", ["1.2.3", "12,34.5", "1,234,56.7", "1.234,5,6", "", "abc"])
+def test_parse_amount_rejects_malformed(raw):
+    with pytest.raises(StatementParseError, match="Invalid amount"):
+        parse_amount(raw)
+
+@pytest.mark.parametrize("raw", ["0.004", "1234.567", "1,234.567", "0,001"])
+def test_parse_amount_rejects_fractions_of_a_cent(raw):
+    with pytest.raises(StatementParseError, match="fractions of a cent"):
+        parse_amount(raw)
+
+def test_parse_amount_with_explicit_decimal_separator():
+    assert parse_amount("1.500", ",") == Decimal("1500.00")
+    assert parse_amount("1.500", ".") == Decimal("1.50")
+    assert parse_amount("-12.345,67", ",") == Decimal("-12345.67")
+    with pytest.raises(StatementParseError, match="Invalid amount"):
+        parse_amount("1,50", ".")
+    with pytest.raises(StatementParseError, match="fractions of a cent"):
+        parse_amount("12.345", ".")
+
+# OFX no usa separadores de miles: el único separador es el decimal
+@pytest.mark.parametrize("raw, expected", [
+    ("-1.500", "-1.50"),
+    ("12.34", "12.34"),
+    ("-1,5", "-1.50"),
+    ("+7", "7.00"),
+    (" 250 ", "250.00"),
+])
+def test_parse_ofx_amount(raw, expected):
+    assert parse_ofx_amount(raw) == Decimal(expected)
+
+@pytest.mark.parametrize("raw", ["1,234.56", "1.2.3", "12.34-", "abc", ""])
+def test_parse_ofx_amount_rejects_malformed(raw):
+    with pytest.raises(StatementParseError, match="Invalid amount"):
+        parse_ofx_amount(raw)
+
+def test_parse_ofx_amount_rejects_fractions_of_a_cent():
+    with pytest.raises(StatementParseError, match="fractions of a cent"):
+        parse_ofx_amount("12.345")
+
+def test_parse_csv_quoted_multiline_fields():
+    text = (
+        "date,description,amount\n"
+        '2026-01-02,"Café\nmemo de dos líneas",-3.50\n'
+        "\n"
+        '2026-01-03,"Sueldo, enero",1000\n'
+    )
+    assert csv_results(text) == [
+        Movement(line_number=2, occurred_on=date(2026, 1, 2), amount=Decimal("-3.50"), description="Café\nmemo de dos líneas"),
+        Movement(line_number=5, occurred_on=date(2026, 1, 3), amount=Decimal("1000.00"), description="Sueldo, enero"),
+    ]
+
+def test_parse_csv_reports_bad_rows_with_their_line():
+    text = (
+        "date,description,amount\n"
+        "2026-01-02,ambiguo,12.345\n"
+        "2026-01-03,cero,0.00\n"
+        "2026-01-04,centavos,0.004\n"
+        "fecha,mala,1\n"
+        '2026-01-05,bien,"-1,5"\n'
+    )
+    results = csv_results(text)
+    errors = [str(item) for item in results if isinstance(item, StatementParseError)]
+    assert errors == [
+        "Line 2: Ambiguous amount, set the decimal separator: '12.345'",
+        "Line 3: Zero amount",
+        "Line 4: Amount has fractions of a cent: '0.004'",
+        "Line 5: Invalid date: 'fecha'",
+    ]
+    assert [item.amount for item in results if isinstance(item, Movement)] == [Decimal("-1.50")]
+
+def test_parse_csv_decimal_separator_and_debit_credit_columns():
+    text = "fecha;detalle;cargo;abono\n02/01/2026;arriendo;1.500;\n03/01/2026;sueldo;;2.000,50\n"
+    results = csv_results(
+        text, date="fecha", description="detalle", amount=None, debit="cargo", credit="abono",
+        date_format="%d/%m/%Y", delimiter=";", decimal_separator=",",
+    )
+    assert [(item.occurred_on, item.amount) for item in results] == [
+        (date(2026, 1, 2), Decimal("-1500.00")),
+        (date(2026, 1, 3), Decimal("2000.50")),
+    ]
+
+def test_parse_csv_unterminated_quote():
+    results = csv_results('date,description,amount\n2026-01-02,"sin cerrar,1\n2026-01-03,otro,2\n')
+    assert [str(item) for item in results] == ["Line 2: Unterminated quoted field"]
+
+def test_parse_csv_missing_columns():
+    with pytest.raises(StatementParseError, match="Missing CSV columns: amount"):
+        csv_results("date,description,monto\n2026-01-02,x,1\n")
+
+def test_parse_ofx_transactions():
+    text = (
+        "OFXHEADER:100\n<OFX><BANKTRANLIST>\n"
+        "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20260102120000<TRNAMT>-1.500<NAME>Café</STMTTRN>\n"
+        "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20260103<TRNAMT>0.00<MEMO>nada</STMTTRN>\n"
+        "<STMTTRN><DTPOSTED>20260104<TRNAMT>12.345<NAME>x</STMTTRN>\n"
+        "</BANKTRANLIST></OFX>\n"
+    )
+    results = ofx_results(text)
+    assert results[0] == Movement(line_number=1, occurred_on=date(2026, 1, 2), amount=Decimal("-1.50"), description="Café")
+    assert [str(item) for item in results[1:]] == [
+        "Transaction 2: Zero amount",
+        "Transaction 3: Amount has fractions of a cent: '12.345'",
+    ]